@@ -1,14 +1,30 @@
+import json
+
 import streamlit as st
-import pandas as pd
 
-from src.config import get_paths
+from src.config import AppPaths, DTWSettings, get_paths
 from src.storage import (
-    load_raw, load_enriched, save_enriched,
-    load_centers, save_centers, load_meta,
+    load_raw, load_enriched, data_version, save_clustering,
+    load_centers, load_meta, load_customer_state,
+    load_sweep_summary, load_sweep_result, load_backtest, dtw_cache_key, load_distance_cache,
+)
+from src.services import single_flight
+from src.services.clustering_service import apply_cluster_labels, clustering_request_key, similar_customer_table
+from src.services.pipeline import run_pipeline
+from src.services.aggregates import AggregateCube, load_or_build_cube
+from src.services.indexing import CustomerIndex, build_customer_index
+from src.services.memo import versioned
+from src.services import perf
+from src.services.k_sweep import SWEEP_KS, run_saved_k_sweep, sweep_request_key
+from src.services.preprocessing import build_time_series
+from src.ui.sidebar import (
+    sidebar_clustering_controls, sidebar_dtw_controls, sidebar_customer_controls,
+    sidebar_k_sweep_controls, sidebar_running_jobs, sidebar_cache_stats,
+    performance_recorder, sidebar_performance_panel, sidebar_clustering_job, CLUSTERING_JOB,
+    sidebar_sweep_job, SWEEP_JOB,
 )
-from src.services.clustering_service import compute_dtw_clusters, apply_cluster_labels
-from src.ui.sidebar import sidebar_clustering_controls, sidebar_customer_controls
 
+from src.ui.views import view_selector
 from src.ui.tabs.plans_tab import render_plans_tab
 from src.ui.tabs.customer_tab import render_customer_tab
 from src.ui.tabs.recommendation_tab import render_recommendation_tab
@@ -19,75 +35,180 @@ from src.ui.tabs.churn_tab import render_churn_tab
 from src.ui.tabs.prediction_tab import render_prediction_system_tab
 
 
+@st.cache_resource(max_entries=2)
+def load_indexed_dataset(version: str, _paths: AppPaths):
+    # Loaded and indexed once per data version, shared by all reruns and sessions.
+    # The frame is read-only: views are slices of it.
+    df, fmt = load_enriched(_paths)
+    if df is None:
+        return build_customer_index(load_raw(_paths), version=version), None
+    return build_customer_index(df, version=version), fmt
+
+
+@st.cache_resource(max_entries=4)
+def relabeled_index(version: str, sweep_version: str, k: int, _index: CustomerIndex, _cluster_df) -> CustomerIndex:
+    labeled = apply_cluster_labels(_index.df, _cluster_df)
+    return build_customer_index(labeled, version=f"{version}:sweep:{sweep_version}:k{k}")
+
+
+@st.cache_resource(max_entries=4)
+def aggregate_cube(version: str, _index: CustomerIndex, _paths: AppPaths) -> AggregateCube:
+    # cluster x month x plan aggregates of the shown labels, built once per version
+    return load_or_build_cube(_index.df, version, _paths)
+
+
+@st.cache_resource(max_entries=2)
+def load_versioned_customer_state(version: str, _paths: AppPaths):
+    state = load_customer_state(_paths)
+    return versioned(state, version) if state is not None else None
+
+
+@st.cache_resource(max_entries=2)
+def series_cache_key(version: str, window: str, _index: CustomerIndex, _settings: DTWSettings):
+    # key of the shown data's normalized series in the DTW distance cache, and its customer order
+    time_series_data, customer_ids = build_time_series(_index.df)
+    return dtw_cache_key(time_series_data, _settings), customer_ids
+
+
 def main():
     st.set_page_config(page_title="Telecom Behavior Analyzer", layout="wide")
     st.title("Telecom Customer Behavior & Plan Recommendation System")
 
+    # timing spans are recorded only while the Performance panel is on
+    recorder = performance_recorder()
+    perf.activate(recorder)
+    try:
+        with perf.span("app.rerun"):
+            render_app()
+    finally:
+        perf.activate(None)
+        if recorder is not None:
+            recorder.end_run()
+    sidebar_performance_panel(recorder)
+
+
+def render_app():
     paths = get_paths()
 
     # Load artifacts
-    loaded_df, fmt = load_enriched(paths)
+    version = data_version(paths)
+    index, fmt = load_indexed_dataset(version, paths)
     centers = load_centers(paths)
     meta = load_meta(paths)
     saved_k = int(meta["k"]) if meta and "k" in meta else None
 
-    k = sidebar_clustering_controls(paths, saved_k=saved_k)
+    sweep_summary = load_sweep_summary(paths)
+
+    k = sidebar_clustering_controls(paths, saved_k=saved_k, sweep_summary=sweep_summary)
+    saved_dtw = DTWSettings.from_meta(meta.get("dtw")) if meta else None
+    dtw_settings = sidebar_dtw_controls(saved_dtw)
+    run_sweep = sidebar_k_sweep_controls(sweep_summary, running=sidebar_sweep_job() is not None)
 
-    if loaded_df is not None:
-        df = loaded_df
-        df["date"] = pd.to_datetime(df["date"])
+    df = index.df
+    if fmt is not None:
         st.sidebar.success(f"Loaded enriched dataset ({fmt})")
     else:
-        df = load_raw(paths)
         st.sidebar.info("Loaded raw dataset (not enriched yet)")
 
+    # Clustering runs in a worker process: the app keeps showing the current
+    # artifacts and swaps to the new ones when the job has saved them
+    if sidebar_clustering_job() is None:
+        st.sidebar.caption("Scheduled jobs run the same pipeline with `python pipeline.py`.")
         if st.sidebar.button("Run DTW + Save Enriched"):
-            progress = st.progress(0)
-            status = st.text("Running DTW time-series clustering...")
-
-            progress.progress(15)
-            cluster_df, model = compute_dtw_clusters(df, k)
-
-            progress.progress(70)
-            df = apply_cluster_labels(df, cluster_df)
-
-            progress.progress(85)
-            save_centers(model.cluster_centers_, k, paths)
-            fmt_saved, path_saved = save_enriched(df, paths)
-
-            progress.progress(100)
-            status.text("DTW complete. Saved enriched dataset ✅")
-            st.sidebar.success(f"Saved ({fmt_saved}) → {path_saved}")
-
+            flight, started = single_flight.start(
+                clustering_request_key(paths, k, dtw_settings),
+                single_flight.in_worker_process(run_pipeline, paths, k, dtw_settings),
+                description=f"DTW clustering (k={k})",
+            )
+            st.session_state[CLUSTERING_JOB] = flight.key
+            if not started:
+                st.sidebar.info("The same clustering is already running in another session. Following it.")
+
+    # The k-sweep also runs in a worker process, over the saved data
+    window = json.dumps(dtw_settings.metric_params(), sort_keys=True)
+    if run_sweep:
+        flight, started = single_flight.start(
+            sweep_request_key(version, dtw_settings),
+            single_flight.in_worker_process(run_saved_k_sweep, paths, SWEEP_KS, dtw_settings),
+            description=f"k-sweep (k = {SWEEP_KS[0]}…{SWEEP_KS[-1]})",
+        )
+        st.session_state[SWEEP_JOB] = flight.key
+        if not started:
+            st.sidebar.info("The same k-sweep is already running in another session. Following it.")
+
+    # Progress of running jobs (this and other sessions), reload when they finish
+    sidebar_running_jobs()
+
+    # Slider moved away from the saved k: switch to the precomputed sweep result,
+    # if it was fitted on the data shown now with the DTW window selected now
+    sweep_result = None
+    if saved_k != k and sweep_summary is not None and k in set(sweep_summary["k"]):
+        sweep_dtw = DTWSettings.from_meta(sweep_summary.attrs.get("dtw"))
+        if sweep_dtw.metric_params() != dtw_settings.metric_params():
+            st.sidebar.warning(
+                f"The k-sweep result for k={k} was fitted with another DTW window. "
+                "Re-run the k-sweep (or DTW) with the current window to use it."
+            )
+        elif sweep_summary.attrs["version"] != series_cache_key(version, window, index, dtw_settings)[0]:
+            st.sidebar.warning(
+                f"The k-sweep result for k={k} was fitted on older data. "
+                "Re-run the k-sweep to use it."
+            )
+        else:
+            sweep_result = load_sweep_result(k, paths)
+    if sweep_result is not None:
+        sweep_clusters, sweep_centers = sweep_result
+        index = relabeled_index(version, sweep_summary.attrs["version"], k, index, sweep_clusters)
+        df = index.df
+        centers = sweep_centers
+        st.sidebar.info(f"Showing precomputed k-sweep clustering (k={k})")
+
+        if st.sidebar.button(f"Save k={k} as current clustering"):
+            # enriched dataset, centers and meta swapped in together
+            save_clustering(
+                df, centers, k, paths,
+                settings=DTWSettings.from_meta(sweep_summary.attrs.get("dtw")),
+                cluster_sizes=sweep_clusters["dtw_cluster"].value_counts().reindex(range(k), fill_value=0),
+            )
             st.cache_data.clear()
             st.rerun()
 
-    selected_customer, selected_cluster = sidebar_customer_controls(df)
-
-    # Filter customer
-    cust_df = df[df["customer_id"] == selected_customer].sort_values("date")
+    selected_customer, selected_cluster = sidebar_customer_controls(index)
 
-    # Tabs
-    tab_plans, tab_customer, tab_cluster, tab_pred = st.tabs(
+    # Only the selected view is computed; each view is a fragment, so its own
+    # widgets rerun just that view
+    view = view_selector(
         [
             "Plans & Costs",
             "Customer",
             "Cluster",
             "Prediction System",
-        ]
+        ],
+        key="view",
     )
 
-    with tab_plans:
+    if view == "Plans & Costs":
         render_plans_tab()
 
-    with tab_customer:
-        render_customer_tab(cust_df, selected_customer)
+    elif view == "Customer":
+        # customer-to-customer distances are cached by the k-sweep
+        key, customer_ids = series_cache_key(version, window, index, dtw_settings)
+        pairwise = load_distance_cache("pairwise", key, paths)
+        similar = similar_customer_table(pairwise, customer_ids, selected_customer) if pairwise is not None else None
 
-    with tab_cluster:
-        render_cluster_view_tab(df, centers, selected_cluster)
+        # a slice of the (customer, date) sorted table, no scan
+        render_customer_tab(index.customer(selected_customer), selected_customer, similar)
+
+    elif view == "Cluster":
+        cube = aggregate_cube(index.version, index, paths)
+        render_cluster_view_tab(df, centers, selected_cluster, load_versioned_customer_state(version, paths), index, cube)
+
+    else:
+        cube = aggregate_cube(index.version, index, paths)
+        render_prediction_system_tab(centers, cube, load_backtest(paths))
 
-    with tab_pred:
-        render_prediction_system_tab(df, centers)
+    # after the view, so the counters include this run
+    sidebar_cache_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+import argparse
+
+from src.config import get_paths
+from src.dataset import read_csv_records
+from src.services.incremental import append_month
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Append one billing month to the enriched dataset, re-assigning only the affected customers."
+    )
+    parser.add_argument("--input", required=True, help="CSV with the records of one month (raw schema)")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    records = read_csv_records(args.input)
+
+    try:
+        summary = append_month(records, paths)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    print(f"Appended {summary['month']}: {summary['customers']} customers "
+          f"({summary['new_customers']} new, {summary['cluster_changes']} changed cluster) "
+          f"in {summary['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import time
+
+import numpy as np
+
+from src.config import DTWSettings, get_paths
+from src.dataset import read_csv_records
+from src.storage import load_enriched, load_centers, load_meta, save_centers, upsert_enriched, upsert_raw
+from src.services.clustering_service import (
+    apply_cluster_labels,
+    assign_to_saved_centers,
+    changed_customers,
+    customer_history,
+    stored_labels,
+    update_centers_minibatch,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Label new or changed customers with the saved DTW centers (no full refit)."
+    )
+    parser.add_argument("--input", required=True, help="CSV with monthly records (raw schema)")
+    parser.add_argument(
+        "--update-centers", action="store_true",
+        help="Move the saved centers towards their new members (mini-batch barycenter step)",
+    )
+    args = parser.parse_args()
+
+    paths = get_paths()
+    centers = load_centers(paths)
+    meta = load_meta(paths) or {}
+    if centers is None:
+        raise SystemExit("No saved DTW centers found. Run the full clustering once first.")
+
+    settings = DTWSettings.from_meta(meta.get("dtw"))
+    enriched, _ = load_enriched(paths)
+    # same compact dtypes as the stored data, so unchanged records compare equal
+    new_df = read_csv_records(args.input)
+
+    start = time.perf_counter()
+    to_label = changed_customers(new_df, enriched)
+    if len(to_label) == 0:
+        print("No new or changed customers. Nothing to do.")
+        return
+
+    # the new records only extend or correct each customer's stored history
+    rows = customer_history(new_df, enriched, to_label)
+    cluster_df, time_series_data = assign_to_saved_centers(rows, centers, settings)
+    labeled = apply_cluster_labels(rows, cluster_df)
+
+    if args.update_centers:
+        if "cluster_sizes" in meta:
+            sizes = np.asarray(meta["cluster_sizes"])
+        elif enriched is not None and "dtw_cluster" in enriched.columns:
+            per_customer = enriched.drop_duplicates("customer_id")["dtw_cluster"]
+            sizes = np.bincount(per_customer.astype(int), minlength=len(centers))
+        else:
+            sizes = np.zeros(len(centers))
+        centers, sizes = update_centers_minibatch(
+            centers, time_series_data, cluster_df["dtw_cluster"].to_numpy(), sizes, settings,
+            previous_labels=stored_labels(enriched, cluster_df["customer_id"]),
+        )
+        save_centers(centers, len(centers), paths, settings=settings, cluster_sizes=sizes)
+
+    upsert_raw(new_df, paths)
+    fmt, path = upsert_enriched(labeled, paths)
+    elapsed = time.perf_counter() - start
+
+    counts = cluster_df["dtw_cluster"].value_counts().sort_index()
+    print(f"Assigned {len(cluster_df)} customers in {elapsed:.2f}s")
+    print("Customers per cluster:", counts.to_dict())
+    print(f"Saved ({fmt}) → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from src.config import get_paths
+from src.services.backtest import MAX_HORIZON, run_backtest, summarize_backtest
+from src.services.billing import USAGE_COLUMNS
+from src.services.forecasting import MIN_OBSERVATIONS
+from src.storage import load_enriched, save_backtest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rolling-origin backtest of the cluster-only, global and per-customer forecasts."
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-horizon", type=int, default=MAX_HORIZON, help="Months ahead forecast from each origin")
+    parser.add_argument("--min-train", type=int, default=MIN_OBSERVATIONS, help="Months of history before the first origin")
+    parser.add_argument("--metrics", nargs="+", default=USAGE_COLUMNS, choices=USAGE_COLUMNS)
+    args = parser.parse_args()
+
+    paths = get_paths()
+    df, _ = load_enriched(paths, columns=["customer_id", "date", "dtw_cluster"] + list(args.metrics))
+    if df is None:
+        raise SystemExit("No enriched dataset found. Run the DTW clustering first.")
+
+    start = time.perf_counter()
+    try:
+        errors, timings = run_backtest(
+            df,
+            metrics=list(args.metrics),
+            max_horizon=args.max_horizon,
+            min_train=args.min_train,
+            workers=max(1, args.workers),
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - start
+    save_backtest(errors, timings, paths)
+
+    summary = summarize_backtest(errors, by=["target", "metric", "model"])
+    with pd.option_context("display.width", 160, "display.float_format", "{:.2f}".format):
+        print(summary.pivot(index=["target", "metric"], columns="model", values="RMSE"))
+        print()
+        print(timings.groupby("model")["seconds"].sum().rename("fit + forecast seconds"))
+
+    print(f"Backtested {timings['cluster'].nunique()} clusters x {len(args.metrics)} metrics x "
+          f"{int(timings['origins'].iloc[0])} origins x {args.max_horizon} horizons in {elapsed:.2f}s "
+          f"({args.workers} workers)")
+    print(f"Saved → {paths.backtest_dir}")
+
+
+if __name__ == "__main__":
+    main()
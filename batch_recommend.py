@@ -0,0 +1,210 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.config import get_paths
+from src.services.billing import USAGE_COLUMNS, round_decimal, simulate_plans
+from src.services.fleet_recommendation import (
+    CHUNK_CELLS,
+    DEFAULT_HORIZON,
+    cheapest_plans,
+    recommend_fleet_forecast,
+)
+from src.services.plan_catalog import CATALOG_ENV, get_catalog
+from src.services.portfolio import choose_plans, plan_metrics
+from src.services.preprocessing import build_time_series_tensor
+from src.storage import load_raw, load_enriched
+
+
+# Everything the scoring reads; the remaining columns are never loaded
+BATCH_COLUMNS = ["customer_id", "date", "current_plan_type", "dtw_cluster"] + USAGE_COLUMNS
+
+
+def _per_length(values: np.ndarray, lengths: np.ndarray, reduce) -> np.ndarray:
+    # reduce(values[:, :L]) over the step axis for the customers with L
+    # records; each row is reduced contiguously like the customer's own 1-D
+    # series, so sums match the per-customer functions to the last bit
+    out = np.full(values.shape[:1] + values.shape[2:], np.nan)
+    for length in np.unique(lengths):
+        sel = lengths == length
+        out[sel] = reduce(np.ascontiguousarray(np.moveaxis(values[sel, :length], 1, -1)))
+    return out
+
+
+def score_customers(
+    df: pd.DataFrame,
+    months: int = 6,
+    increase_pct: float = 0.25,
+    max_unexpected_increase_rate: float = 0.10,
+    min_months: int = 3,
+) -> pd.DataFrame:
+    # One row per customer, every customer and plan priced at once: the
+    # cost-based ranking of recommend_plans, the churn-aware choice of
+    # recommend_plans_churn_rule_based and the evaluate_before_after metrics
+    catalog = get_catalog()
+    names = np.asarray(catalog.names, dtype=object)
+    ts = build_time_series_tensor(df, features=USAGE_COLUMNS, align="left", dtype=float)
+    usage = ts.values
+    n_records = ts.mask.sum(axis=1)
+    rows = np.arange(len(usage))
+
+    # latest plan (like recommend_fleet_forecast) and first cluster label per customer
+    ids = ts.customer_ids.astype(str)
+    keyed = df.assign(customer_id=df["customer_id"].astype(str)).sort_values(["customer_id", "date"])
+    latest = keyed.drop_duplicates("customer_id", keep="last").set_index("customer_id").reindex(ids)
+    current_plan = latest["current_plan_type"].astype(str).to_numpy()
+    current = catalog.positions(current_plan)
+    known = current >= 0
+    current = np.maximum(current, 0)
+
+    # Cost-based ranking: expected bill from the mean usage of the last `months` records
+    window = np.minimum(n_records, months)
+    steps = np.minimum((n_records - window)[:, None] + np.arange(window.max(initial=0)), usage.shape[1] - 1)
+    recent = usage[rows[:, None], steps]
+    # each column averaged in its own precision (float32 stays float32), like pandas
+    mean_usage = np.column_stack([
+        _per_length(recent[:, :, j].astype(df[c].dtype if df[c].dtype.kind == "f" else float),
+                    window, lambda a: a.mean(axis=-1))
+        for j, c in enumerate(USAGE_COLUMNS)
+    ])
+    sim = simulate_plans(mean_usage, catalog=catalog)
+    cost_bills = sim["expected_bill_eur"]
+    cost_best = cheapest_plans(cost_bills, sim["expected_overusage_eur"])
+    cost_bill = cost_bills[rows, cost_best]
+    cur_bill = np.where(known, cost_bills[rows, current], np.nan)
+
+    # Churn-aware choice and the before / after stability of both plans
+    metrics = plan_metrics(usage, catalog, increase_pct)
+    churn_best, _ = choose_plans(metrics, n_records, max_unexpected_increase_rate, min_months)
+    bills = simulate_plans(usage, catalog=catalog)["expected_bill_eur"]
+
+    def evaluate(plan, ok=True):
+        # evaluate_plan metrics of one plan per customer, NaN where `ok` is False
+        series = bills[rows, :, plan]
+        values = {
+            "avg_bill_eur": (_per_length(series, n_records, lambda a: a.mean(axis=-1)), 2),
+            "bill_std_eur": (_per_length(series, n_records, lambda a: a.std(axis=-1)), 2),
+            "unexpected_increase_rate": (metrics["increases"][rows, plan] / np.maximum(n_records - 1, 1), 3),
+            "overuse_rate": (metrics["overuse"][rows, plan] / n_records, 3),
+        }
+        return {k: round_decimal(np.where(ok, v, np.nan), d) for k, (v, d) in values.items()}
+
+    before = evaluate(current, known)
+    after = evaluate(churn_best)
+
+    out = pd.DataFrame({
+        "customer_id": ts.customer_ids,
+        "current_plan": current_plan,
+        "cost_recommended_plan": names[cost_best],
+        "cost_expected_bill_eur": cost_bill,
+        "cost_expected_savings_eur": round_decimal(cur_bill - cost_bill, 2),
+        "churn_recommended_plan": names[churn_best],
+        "churn_avg_bill_eur": after["avg_bill_eur"],
+        "churn_expected_savings_eur": round_decimal(before["avg_bill_eur"] - after["avg_bill_eur"], 2),
+        "bill_std_before_eur": before["bill_std_eur"],
+        "bill_std_after_eur": after["bill_std_eur"],
+        "unexpected_increase_rate_before": before["unexpected_increase_rate"],
+        "unexpected_increase_rate_after": after["unexpected_increase_rate"],
+        "overuse_rate_before": before["overuse_rate"],
+        "overuse_rate_after": after["overuse_rate"],
+    })
+    if "dtw_cluster" in df.columns:
+        first = keyed.drop_duplicates("customer_id").set_index("customer_id").reindex(ids)
+        out["dtw_cluster"] = first["dtw_cluster"].to_numpy()
+    return out
+
+
+def score_chunk(chunk_df: pd.DataFrame, params: dict) -> pd.DataFrame:
+    return score_customers(chunk_df, **params)
+
+
+def run_batch(df: pd.DataFrame, workers: int, params: dict, chunks_per_worker: int = 4) -> pd.DataFrame:
+    # Customers are split into blocks only to bound memory and to spread them
+    # over the worker processes; each block is scored in one vectorized pass
+    df = df.sort_values(["customer_id", "date"])
+    customer_ids = df["customer_id"].unique()
+
+    # Several chunks per worker so a slow chunk does not stall the pool
+    n_blocks = len(df) * len(get_catalog()) // CHUNK_CELLS + 1
+    n_chunks = max(1, min(len(customer_ids), max(workers * chunks_per_worker, n_blocks)))
+    id_chunks = np.array_split(customer_ids, n_chunks)
+    chunks = [df[df["customer_id"].isin(ids)] for ids in id_chunks]
+
+    if workers <= 1:
+        results = [score_chunk(c, params) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(score_chunk, chunks, [params] * len(chunks)))
+
+    return pd.concat(results, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score every customer with cost-based and churn-aware plan recommendations."
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", type=str, default=None, help="Parquet output path")
+    parser.add_argument("--months", type=int, default=6, help="Months used to estimate expected usage")
+    parser.add_argument("--increase-pct", type=float, default=0.25)
+    parser.add_argument("--max-unexpected-increase-rate", type=float, default=0.10)
+    parser.add_argument("--min-months", type=int, default=3)
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON,
+                        help="Months of forecast usage priced by the forecast-based recommendation")
+    parser.add_argument("--forecast-only", action="store_true",
+                        help="Only the forecast-based recommendation (one vectorized pass, no workers)")
+    parser.add_argument("--plans", type=str, default=None,
+                        help="Plan catalog (.csv / .parquet / .npz) to price instead of the built-in plans")
+    args = parser.parse_args()
+
+    if args.plans:
+        # set in the environment so the worker processes price the same catalog
+        os.environ[CATALOG_ENV] = args.plans
+    try:
+        catalog = get_catalog()
+    except (OSError, ValueError, KeyError) as e:
+        raise SystemExit(f"Could not load plan catalog: {e}")
+
+    paths = get_paths()
+    df, _ = load_enriched(paths, columns=BATCH_COLUMNS)
+    if df is None:
+        df = load_raw(paths, columns=BATCH_COLUMNS)
+
+    params = {
+        "months": args.months,
+        "increase_pct": args.increase_pct,
+        "max_unexpected_increase_rate": args.max_unexpected_increase_rate,
+        "min_months": args.min_months,
+    }
+
+    if not args.forecast_only:
+        # the before / after evaluation prices every customer's current plan
+        missing = sorted(set(df["current_plan_type"].astype(str)) - set(catalog.names))
+        if missing:
+            raise SystemExit(f"Plan catalog is missing current plans {missing}; use --forecast-only.")
+
+    start = time.perf_counter()
+    # Forecast-based recommendation: every customer at once
+    forecast = recommend_fleet_forecast(df, horizon=args.horizon)
+    if args.forecast_only:
+        out = forecast
+    else:
+        out = run_batch(df, workers=max(1, args.workers), params=params)
+        forecast = forecast.drop(columns="current_plan").assign(customer_id=lambda d: d["customer_id"].astype(str))
+        out = out.assign(customer_id=out["customer_id"].astype(str)).merge(forecast, on="customer_id", how="left")
+    elapsed = time.perf_counter() - start
+
+    output = args.output or str(paths.batch_recommendations)
+    out.to_parquet(output, index=False)
+
+    print(f"Scored {len(out)} customers against {len(catalog)} plans in {elapsed:.2f}s "
+          f"({len(out) / max(elapsed, 1e-9):.1f} customers/s, {args.workers} workers)")
+    print(f"Saved → {output}")
+
+
+if __name__ == "__main__":
+    main()
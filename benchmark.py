@@ -0,0 +1,80 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import get_paths
+from src.services.benchmarks import (
+    BENCHMARKS, DTW_CUSTOMERS, K, SAMPLE_CUSTOMERS, SCALES, compare_reports, environment, run_benchmarks,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time and memory-profile the main data functions on synthetic datasets of growing size."
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="Customer counts")
+    parser.add_argument("--functions", nargs="+", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per function")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dtw-customers", type=int, default=DTW_CUSTOMERS, help="Customers clustered by dtw_cluster")
+    parser.add_argument("--sample-customers", type=int, default=SAMPLE_CUSTOMERS,
+                        help="Customers scored by the per-customer functions")
+    parser.add_argument("--k", type=int, default=K)
+    parser.add_argument("--output", type=str, default=None, help="JSON report path")
+    parser.add_argument("--compare", type=str, default=None, help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    report = {
+        "environment": environment(paths.base_dir),
+        "options": {
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "dtw_customers": args.dtw_customers,
+            "sample_customers": args.sample_customers,
+            "k": args.k,
+        },
+    }
+
+    def show(r):
+        memory = f", peak {r['peak_mb']:.1f} MB" if "peak_mb" in r else ""
+        print(f"  {r['scale']:>9,} {r['function']:<34} {r['median_s']:8.3f}s "
+              f"({r['calls']} calls over {r['customers']:,} customers{memory})", flush=True)
+
+    start = time.perf_counter()
+    report["results"] = run_benchmarks(
+        paths.synthetic_dir,
+        scales=args.scales,
+        functions=args.functions,
+        repeat=max(1, args.repeat),
+        memory=not args.no_memory,
+        seed=args.seed,
+        dtw_customers=args.dtw_customers,
+        sample_customers=args.sample_customers,
+        k=args.k,
+        report=show,
+    )
+    elapsed = time.perf_counter() - start
+
+    if args.output:
+        output = Path(args.output)
+    else:
+        paths.benchmark_dir.mkdir(parents=True, exist_ok=True)
+        output = paths.benchmark_dir / f"benchmark-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        old = json.loads(Path(args.compare).read_text())
+        with pd.option_context("display.width", 160, "display.float_format", "{:.2f}".format):
+            print(compare_reports(old, report).to_string(index=False))
+
+    print(f"Benchmarked {len(args.functions)} functions at {len(args.scales)} scales in {elapsed:.2f}s")
+    print(f"Saved → {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse
+import time
+from pathlib import Path
+
+from src.config import get_paths
+from src.services.synthetic import CHUNK_CUSTOMERS, DEFAULT_MONTHS, DEFAULT_START, write_synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write a synthetic dataset with the schema of the monthly CSV export."
+    )
+    parser.add_argument("--customers", type=int, default=10_000)
+    parser.add_argument("--months", type=int, default=DEFAULT_MONTHS)
+    parser.add_argument("--start", type=str, default=DEFAULT_START, help="First month (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-customers", type=int, default=CHUNK_CUSTOMERS, help="Customers generated per chunk")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet",
+                        help="Year-partitioned parquet dataset (read like data/telecom_raw) or one CSV")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Output path (default: data/synthetic/customers-<n>-seed-<seed>[.csv])")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    suffix = ".csv" if args.format == "csv" else ""
+    output = Path(args.output) if args.output else paths.synthetic_dir / f"customers-{args.customers}-seed-{args.seed}{suffix}"
+
+    start = time.perf_counter()
+    try:
+        rows = write_synthetic(
+            output, args.customers,
+            months=args.months,
+            start=args.start,
+            seed=args.seed,
+            chunk_customers=args.chunk_customers,
+            fmt=args.format,
+            report=lambda rows: print(f"  {rows:,} rows generated", flush=True),
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - start
+
+    print(f"Wrote {rows:,} rows ({args.customers:,} customers x {args.months} months) in {elapsed:.2f}s")
+    print(f"Saved → {output}")
+
+
+if __name__ == "__main__":
+    main()
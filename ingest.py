@@ -0,0 +1,39 @@
+import argparse
+from pathlib import Path
+
+from src.config import get_paths
+from src.services.ingest import DEFAULT_CHUNK_ROWS, ingest_csv
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a raw monthly CSV export into the typed, year-partitioned parquet dataset."
+    )
+    parser.add_argument("--input", type=str, default=None, help="CSV export (default: data/telecom_original.csv)")
+    parser.add_argument("--output", type=str, default=None, help="Dataset directory (default: data/telecom_raw)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows converted per chunk")
+    parser.add_argument("--engine", choices=["pyarrow", "pandas"], default=None,
+                        help="CSV reader (default: pyarrow when installed)")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    source = Path(args.input) if args.input else paths.raw_data
+    output = Path(args.output) if args.output else paths.raw_dataset
+
+    try:
+        stats = ingest_csv(
+            source, output,
+            chunk_rows=args.chunk_rows,
+            engine=args.engine,
+            report=lambda rows: print(f"  {rows:,} rows converted", flush=True),
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    print(f"Ingested {stats['rows']:,} rows in {stats['seconds']:.2f}s "
+          f"({stats['rows'] / max(stats['seconds'], 1e-9):,.0f} rows/s)")
+    print(f"Saved → {stats['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from src.config import get_paths
+from src.services.billing import USAGE_COLUMNS
+from src.services.plan_catalog import get_catalog
+from src.services.portfolio import INCREASE_PCT, MAX_UNEXPECTED_INCREASE_RATE, MIN_MONTHS, optimize_portfolio
+from src.storage import load_enriched, load_raw
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Score limit / price changes to the plan catalog against every customer's monthly usage."
+    )
+    parser.add_argument("--limit-scales", type=float, nargs="+", default=[0.8, 1.0, 1.25, 1.5])
+    parser.add_argument("--price-scales", type=float, nargs="+", default=[0.9, 1.0, 1.1])
+    parser.add_argument("--plans", nargs="+", default=None, help="Plans to vary (default: each plan in turn)")
+    parser.add_argument("--joint", action="store_true", help="Scale all plans together instead of one at a time")
+    parser.add_argument("--min-revenue-change-pct", type=float, default=0.0,
+                        help="Candidates losing more revenue than this against the current catalog rank last")
+    parser.add_argument("--increase-pct", type=float, default=INCREASE_PCT)
+    parser.add_argument("--max-unexpected-increase-rate", type=float, default=MAX_UNEXPECTED_INCREASE_RATE)
+    parser.add_argument("--min-months", type=int, default=MIN_MONTHS)
+    parser.add_argument("--top", type=int, default=15, help="Candidates printed")
+    parser.add_argument("--output", type=str, default=None, help="Parquet output path")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    columns = ["customer_id", "date"] + USAGE_COLUMNS
+    df, _ = load_enriched(paths, columns=columns)
+    if df is None:
+        df = load_raw(paths, columns=columns)
+    catalog = get_catalog()
+
+    start = time.perf_counter()
+    try:
+        results = optimize_portfolio(
+            df,
+            limit_scales=args.limit_scales,
+            price_scales=args.price_scales,
+            plans=args.plans,
+            joint=args.joint,
+            catalog=catalog,
+            min_revenue_change_pct=args.min_revenue_change_pct,
+            increase_pct=args.increase_pct,
+            max_unexpected_increase_rate=args.max_unexpected_increase_rate,
+            min_months=args.min_months,
+        )
+    except KeyError as e:
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - start
+
+    output = args.output or str(paths.portfolio_candidates)
+    results.assign(plan_mix=results["plan_mix"].map(json.dumps)).to_parquet(output, index=False)
+
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        print(results.drop(columns="plan_mix").head(args.top).to_string(index=False))
+
+    cells = df["customer_id"].nunique() * df.groupby("customer_id", observed=True).size().max() * len(catalog)
+    print(f"Scored {len(results)} candidate catalogs over {df['customer_id'].nunique()} customers "
+          f"({cells * len(results) / 1e6:.0f}M customer-plan-month cells) in {elapsed:.2f}s")
+    print(f"Saved → {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+
+from src.config import DTWSettings, get_paths
+from src.storage import load_meta, load_pipeline_state
+from src.services.pipeline import STAGES, pipeline_status, run_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the app's artifacts: ingest -> time series -> DTW clustering -> labels -> aggregates. "
+                    "Stages that are still up to date are skipped."
+    )
+    parser.add_argument("--k", type=int, default=None, help="Number of clusters (default: the saved k, else 6)")
+    parser.add_argument("--window", choices=["none", "sakoe_chiba", "itakura"], default=None,
+                        help="DTW warping window (default: the saved one)")
+    parser.add_argument("--radius", type=int, default=None, help="Sakoe-Chiba radius in months")
+    parser.add_argument("--slope", type=float, default=None, help="Itakura max slope")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Parallel DTW jobs (-1 = all cores)")
+    parser.add_argument("--force", choices=STAGES, default=None, help="Re-run this stage and every later one")
+    parser.add_argument("--status", action="store_true", help="Show the last run of every stage and exit")
+    args = parser.parse_args()
+
+    paths = get_paths()
+    if args.status:
+        print(pipeline_status(paths).to_string(index=False))
+        return
+
+    meta = load_meta(paths) or {}
+    saved = DTWSettings.from_meta(meta.get("dtw"))
+    k = args.k if args.k is not None else int(meta.get("k", 6))
+    window = saved.global_constraint if args.window is None else (None if args.window == "none" else args.window)
+    settings = DTWSettings(
+        global_constraint=window,
+        sakoe_chiba_radius=args.radius if args.radius is not None else saved.sakoe_chiba_radius,
+        itakura_max_slope=args.slope if args.slope is not None else saved.itakura_max_slope,
+        n_jobs=args.n_jobs if args.n_jobs is not None else saved.n_jobs,
+    )
+
+    try:
+        results = run_pipeline(
+            paths, k, settings,
+            report=lambda progress, status: print(f"{100 * progress:5.1f}%  {status}", flush=True),
+            force=args.force,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    print()
+    for r in results:
+        print(f"{r['stage']:<12}{r['status']:<12}{r['seconds']:8.2f}s")
+    label = load_pipeline_state(paths)["stages"]["label"]
+    print(f"Saved ({label.get('format', 'parquet')}) → {label.get('path', paths.enriched_dataset)}")
+
+
+if __name__ == "__main__":
+    main()
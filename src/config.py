@@ -1,5 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import Any, Dict, Optional
 
 
 @dataclass(frozen=True)
@@ -7,15 +8,53 @@ class AppPaths:
     base_dir: Path
     data_dir: Path
     raw_data: Path
+    raw_dataset: Path
+    enriched_dataset: Path
     enriched_parquet: Path
     enriched_csv: Path
     centers_file: Path
     meta_file: Path
+    customer_state: Path
+    series_file: Path
+    batch_recommendations: Path
+    portfolio_candidates: Path
+    distance_cache_dir: Path
+    sweep_dir: Path
+    backtest_dir: Path
+    aggregates_dir: Path
+    synthetic_dir: Path
+    benchmark_dir: Path
+    pipeline_dir: Path
 
 
-def get_paths() -> AppPaths:
-    # src/ -> project root
-    base_dir = Path(__file__).resolve().parents[1]
+@dataclass(frozen=True)
+class DTWSettings:
+    global_constraint: Optional[str] = None  # None, "sakoe_chiba" or "itakura"
+    sakoe_chiba_radius: int = 3
+    itakura_max_slope: float = 2.0
+    n_jobs: Optional[int] = None              # joblib convention, -1 = all cores
+
+    def metric_params(self) -> Dict[str, Any]:
+        # tslearn metric_params for the selected warping window
+        if self.global_constraint == "sakoe_chiba":
+            return {"global_constraint": "sakoe_chiba", "sakoe_chiba_radius": int(self.sakoe_chiba_radius)}
+        if self.global_constraint == "itakura":
+            return {"global_constraint": "itakura", "itakura_max_slope": float(self.itakura_max_slope)}
+        return {}
+
+    def to_meta(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_meta(cls, meta: Optional[Dict[str, Any]]) -> "DTWSettings":
+        if not meta:
+            return cls()
+        return cls(**{k: v for k, v in meta.items() if k in cls.__dataclass_fields__})
+
+
+def get_paths(base_dir: Optional[Path] = None) -> AppPaths:
+    # src/ -> project root, unless another base directory is given
+    base_dir = Path(base_dir) if base_dir is not None else Path(__file__).resolve().parents[1]
     data_dir = base_dir / "data"
     data_dir.mkdir(exist_ok=True)
 
@@ -23,8 +62,21 @@ def get_paths() -> AppPaths:
         base_dir=base_dir,
         data_dir=data_dir,
         raw_data=data_dir / "telecom_original.csv",
+        raw_dataset=data_dir / "telecom_raw",
+        enriched_dataset=data_dir / "telecom_enriched",
         enriched_parquet=data_dir / "telecom_enriched.parquet",
         enriched_csv=data_dir / "telecom_enriched.csv",
         centers_file=data_dir / "dtw_cluster_centers.npy",
         meta_file=data_dir / "dtw_meta.json",
+        customer_state=data_dir / "customer_state.parquet",
+        series_file=data_dir / "customer_series.npy",
+        batch_recommendations=data_dir / "batch_recommendations.parquet",
+        portfolio_candidates=data_dir / "portfolio_candidates.parquet",
+        distance_cache_dir=data_dir / "dtw_cache",
+        sweep_dir=data_dir / "k_sweep",
+        backtest_dir=data_dir / "backtest",
+        aggregates_dir=data_dir / "aggregates",
+        synthetic_dir=data_dir / "synthetic",
+        benchmark_dir=data_dir / "benchmarks",
+        pipeline_dir=data_dir / "pipeline",
     )
@@ -0,0 +1,230 @@
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+
+from .services.perf import timed
+
+# Compact in-memory types of the monthly records. Everything else (e.g. extra
+# columns added by later steps) is stored as it comes.
+SCHEMA: Dict[str, str] = {
+    "customer_id": "category",
+    "year": "int16",
+    "month": "int16",
+    "current_plan_type": "category",
+    "base_price_eur": "float64",
+    "data_limit_mb": "int32",
+    "voice_limit_min": "int32",
+    "sms_limit": "int32",
+    "roaming_limit_mb": "int32",
+    "roaming_limit_min": "int32",
+    "data_usage_mb": "float32",
+    "voice_minutes": "float32",
+    "sms_count": "int32",
+    "roaming_data_mb": "float32",
+    "roaming_minutes": "float32",
+    "bill_amount_eur": "float64",
+    "overuse_flag": "bool",
+    "churn_event": "bool",
+    "dtw_cluster": "int16",
+}
+
+DATE_FORMAT = "%m/%d/%Y"
+
+# Rows per parquet row group. Files are sorted by customer, so each row group
+# covers a narrow customer_id range and customer filters skip the others.
+ROW_GROUP_ROWS = 50_000
+
+
+@timed
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    if "date" in out.columns and out["date"].dtype != "datetime64[ns]":
+        out["date"] = pd.to_datetime(out["date"]).astype("datetime64[ns]")
+
+    for col, dtype in SCHEMA.items():
+        if col not in out.columns:
+            continue
+        if dtype == "category":
+            # sorted, observed-only categories keep factorize / sort orders the
+            # same as with plain strings
+            values = out[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(str).astype("category")
+            values = values.cat.remove_unused_categories()
+            out[col] = values.cat.reorder_categories(sorted(values.cat.categories))
+        elif str(out[col].dtype) != dtype:
+            out[col] = out[col].astype(dtype)
+    return out
+
+
+@timed
+def read_csv_records(
+    path: Path,
+    columns: Optional[List[str]] = None,
+    chunksize: Optional[int] = None,
+):
+    # Monthly records CSV with declared dtypes; flags arrive as 0/1 and become
+    # bool in apply_schema. Dates in another format are parsed by apply_schema.
+    # With chunksize, an iterator of typed chunks instead of one frame.
+    dtypes = {c: ("int8" if t == "bool" else t) for c, t in SCHEMA.items()}
+    usecols = None
+    if columns is not None:
+        # columns the file does not have are skipped, not an error
+        wanted = set(columns)
+        dtypes = {c: t for c, t in dtypes.items() if c in wanted}
+        usecols = lambda c: c in wanted
+    df = pd.read_csv(
+        path,
+        usecols=usecols,
+        dtype=dtypes,
+        parse_dates=["date"],
+        date_format=DATE_FORMAT,
+        chunksize=chunksize,
+    )
+    if chunksize is not None:
+        return _typed_chunks(df)
+    return apply_schema(df)
+
+
+def merge_records(existing: Optional[pd.DataFrame], rows: pd.DataFrame) -> pd.DataFrame:
+    # `existing` with the (customer, month) records of `rows` added, replacing
+    # the stored record of the same customer and month
+    if existing is None or existing.empty:
+        merged = rows
+    else:
+        def record_keys(df):
+            return pd.MultiIndex.from_arrays([df["customer_id"].astype(str), df["date"]])
+
+        keep = existing[~record_keys(existing).isin(record_keys(rows))]
+        merged = pd.concat([keep, rows], ignore_index=True)
+    merged = merged.sort_values(["customer_id", "date"]).reset_index(drop=True)
+    return apply_schema(merged)
+
+
+def _typed_chunks(reader) -> Iterator[pd.DataFrame]:
+    with reader:
+        for chunk in reader:
+            yield apply_schema(chunk)
+
+
+def _year_dir(root: Path, year: int) -> Path:
+    return root / f"year={int(year)}"
+
+
+def dataset_years(root: Path) -> List[int]:
+    if not root.is_dir():
+        return []
+    return sorted(int(p.name.split("=", 1)[1]) for p in root.glob("year=*") if p.is_dir())
+
+
+def available_columns(path: Path, columns: Optional[List[str]]) -> Optional[List[str]]:
+    # requested columns that a parquet file actually has
+    import pyarrow.parquet as pq
+
+    if columns is None:
+        return None
+    names = set(pq.read_schema(path).names)
+    return [c for c in columns if c in names]
+
+
+def write_partition(df: pd.DataFrame, path: Path) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = df.sort_values(["customer_id", "date"]).reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # pandas picks the smallest code width per frame; one width for all files
+    # keeps the partitions concatenable
+    schema = pa.schema([
+        f.with_type(pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+        for f in table.schema
+    ])
+    table = table.cast(schema)
+    pq.write_table(table, path, row_group_size=ROW_GROUP_ROWS)
+
+
+def write_dataset_chunks(chunks: Iterable[pd.DataFrame], root: Path) -> int:
+    # One directory per year and one file per (chunk, year), built next to `root`
+    # and swapped in at the end: readers see either the old or the new dataset,
+    # never a mix. Only one chunk is in memory at a time. Returns rows written.
+    root = Path(root)
+    tmp = root.with_name(f".{root.name}.{uuid.uuid4().hex}")
+    rows = 0
+    try:
+        for i, chunk in enumerate(chunks):
+            chunk = apply_schema(chunk)
+            year = chunk["date"].dt.year if "date" in chunk.columns else chunk["year"]
+            for y, part in chunk.groupby(year.to_numpy(), sort=True):
+                _year_dir(tmp, y).mkdir(parents=True, exist_ok=True)
+                write_partition(part, _year_dir(tmp, y) / f"part-{i}.parquet")
+            rows += len(chunk)
+        tmp.mkdir(exist_ok=True)
+        swap_dir(tmp, root)
+    finally:
+        if tmp.exists():
+            shutil.rmtree(tmp)
+    return rows
+
+
+def write_dataset(df: pd.DataFrame, root: Path) -> None:
+    write_dataset_chunks([df], root)
+
+
+def append_dataset(df: pd.DataFrame, root: Path) -> None:
+    # Adds one new file per year next to the existing ones; nothing already on
+    # disk is rewritten, so the cost depends only on the appended rows.
+    root = Path(root)
+    df = apply_schema(df)
+    for y, part in df.groupby(df["date"].dt.year.to_numpy(), sort=True):
+        _year_dir(root, y).mkdir(parents=True, exist_ok=True)
+        path = _year_dir(root, y) / f"part-{uuid.uuid4().hex}.parquet"
+        tmp = path.with_suffix(".tmp")
+        try:
+            write_partition(part, tmp)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+
+def swap_dir(new: Path, target: Path) -> None:
+    old = target.with_name(f".{target.name}.old.{uuid.uuid4().hex}")
+    if target.exists():
+        os.replace(target, old)
+    os.replace(new, target)
+    if old.exists():
+        shutil.rmtree(old)
+
+
+@timed
+def read_dataset(
+    root: Path,
+    columns: Optional[List[str]] = None,
+    years: Optional[Iterable[int]] = None,
+    customers: Optional[Iterable[str]] = None,
+) -> pd.DataFrame:
+    # Only the requested year directories and columns are read; a customer filter
+    # additionally skips row groups through their customer_id statistics.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    root = Path(root)
+    wanted = dataset_years(root) if years is None else sorted(set(int(y) for y in years))
+    files = [f for y in wanted for f in sorted(_year_dir(root, y).glob("*.parquet"))]
+
+    filters = None
+    if customers is not None:
+        filters = [("customer_id", "in", [str(c) for c in customers])]
+
+    if not files:
+        return pd.DataFrame(columns=columns or [])
+
+    columns = available_columns(files[0], columns)
+    tables = [pq.read_table(f, columns=columns, filters=filters) for f in files]
+
+    table = pa.concat_tables(tables, promote_options="default")
+    return apply_schema(table.to_pandas())
@@ -0,0 +1,138 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import AppPaths
+from src.services.billing import USAGE_COLUMNS
+from src.services.perf import timed
+from src.storage import load_aggregates, save_aggregates
+
+# Cluster x month x current plan x metric statistics of the monthly records.
+# Rollup rows over all clusters and/or all plans have <NA> in that key, so a
+# cluster series, the global series and plan splits are all plain lookups.
+CUBE_METRICS = USAGE_COLUMNS + ["bill_amount_eur", "overuse_flag", "churn_event"]
+QUANTILES = [0.25, 0.5, 0.75, 0.9]
+GROUPINGS = [
+    ["cluster", "month", "plan"],
+    ["cluster", "month"],
+    ["month", "plan"],
+    ["month"],
+]
+UNCLUSTERED = -1
+
+
+@dataclass(frozen=True)
+class AggregateCube:
+    table: pd.DataFrame  # cluster, month, plan, metric, count, sum, sumsq, min, max, p25, p50, p75, p90
+    version: str
+
+    @property
+    def cache_key(self) -> tuple:
+        # identifies the cube in memoized calls (src/services/memo.py)
+        return ("cube", self.version)
+
+    def _rows(self, metric: str, cluster=None, plan=None) -> pd.DataFrame:
+        t = self.table
+        mask = t["metric"] == metric
+        mask &= t["cluster"].isna() if cluster is None else t["cluster"] == int(cluster)
+        mask &= t["plan"].isna() if plan is None else t["plan"] == plan
+        return t[mask.fillna(False).to_numpy(dtype=bool)]
+
+    def series(self, metric: str, cluster=None, plan=None, stat: str = "mean") -> pd.Series:
+        # monthly statistic of one cluster (None = all customers) and plan (None = all plans)
+        rows = self._rows(metric, cluster, plan)
+        if stat == "mean":
+            values = rows["sum"] / rows["count"]
+        elif stat == "std":
+            mean = rows["sum"] / rows["count"]
+            values = np.sqrt(np.maximum(rows["sumsq"] / rows["count"] - mean ** 2, 0.0))
+        else:
+            values = rows[stat]
+        s = pd.Series(values.to_numpy(dtype=float), index=pd.DatetimeIndex(rows["month"]), name=metric)
+        s.index.name = "month"
+        return s.sort_index()
+
+    def mean(self, metric: str, cluster=None, plan=None, last_months: Optional[int] = None) -> float:
+        # record-weighted mean over all months, or over the last `last_months` months
+        rows = self._rows(metric, cluster, plan).sort_values("month")
+        if last_months is not None:
+            rows = rows.tail(last_months)
+        count = rows["count"].sum()
+        return float(rows["sum"].sum() / count) if count else float("nan")
+
+    def months(self, cluster=None) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.series(CUBE_METRICS[0], cluster).index)
+
+    def clusters(self) -> np.ndarray:
+        return np.sort(self.table["cluster"].dropna().unique().astype(int))
+
+    def plan_counts(self, cluster=None, month=None) -> pd.Series:
+        # records per current plan in one month (default: the cluster's latest)
+        t = self.table
+        mask = (t["metric"] == CUBE_METRICS[0]) & t["plan"].notna()
+        mask &= t["cluster"].isna() if cluster is None else t["cluster"] == int(cluster)
+        rows = t[mask.fillna(False).to_numpy(dtype=bool)]
+        if rows.empty:
+            return pd.Series(dtype=int, name="count")
+        month = rows["month"].max() if month is None else pd.Timestamp(month)
+        rows = rows[rows["month"] == month]
+        return rows.set_index("plan")["count"].sort_values(ascending=False)
+
+
+def cube_key(version: str) -> str:
+    # file-name friendly key of a dataset version (sweep versions contain ':')
+    return hashlib.sha1(version.encode()).hexdigest()[:16]
+
+
+@timed
+def build_cube(df: pd.DataFrame, version: str, cluster_col: str = "dtw_cluster") -> AggregateCube:
+    # One pass per grouping set over the monthly records
+    if cluster_col in df.columns:
+        cluster = df[cluster_col].astype("Int16").fillna(UNCLUSTERED)
+    else:
+        cluster = pd.Series(UNCLUSTERED, index=df.index, dtype="Int16")
+    values = pd.DataFrame({m: df[m].to_numpy(dtype=float) for m in CUBE_METRICS}, index=df.index)
+    keys = {
+        "cluster": cluster,
+        "month": pd.DatetimeIndex(df["date"]).to_period("M").to_timestamp(),
+        "plan": df["current_plan_type"].astype(str),
+    }
+
+    parts = []
+    for grouping in GROUPINGS:
+        g = values.groupby([keys[k] for k in grouping], observed=True, sort=True)
+        stats = {
+            "count": g.count(),
+            "sum": g.sum(),
+            "sumsq": (values ** 2).groupby([keys[k] for k in grouping], observed=True, sort=True).sum(),
+            "min": g.min(),
+            "max": g.max(),
+        }
+        for q in QUANTILES:
+            stats[f"p{int(q * 100)}"] = g.quantile(q)
+        part = pd.concat({name: s.stack() for name, s in stats.items()}, axis=1)
+        part.index = part.index.set_names(grouping + ["metric"])
+        parts.append(part.reset_index())
+
+    table = pd.concat(parts, ignore_index=True)
+    table["cluster"] = table["cluster"].astype("Int16")
+    table["plan"] = table["plan"].astype("string")
+    table["count"] = table["count"].astype(np.int64)
+    table = table[["cluster", "month", "plan", "metric", "count", "sum", "sumsq", "min", "max"]
+                  + [f"p{int(q * 100)}" for q in QUANTILES]]
+    return AggregateCube(table=table, version=version)
+
+
+@timed
+def load_or_build_cube(df: pd.DataFrame, version: str, paths: AppPaths, cluster_col: str = "dtw_cluster") -> AggregateCube:
+    # Built once per dataset version and persisted in data/aggregates/
+    key = cube_key(version)
+    table = load_aggregates(key, paths)
+    if table is not None:
+        return AggregateCube(table=table, version=version)
+    cube = build_cube(df, version, cluster_col)
+    save_aggregates(cube.table, key, paths)
+    return cube
@@ -0,0 +1,182 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.services.billing import USAGE_COLUMNS
+from src.services.forecasting import MIN_OBSERVATIONS, fit_seasonal_trend_batch
+from src.services.preprocessing import build_time_series_tensor
+
+# Models, each scored on two targets:
+#   cluster  - trained on the cluster's monthly mean (the prediction tab)
+#   global   - trained on the monthly mean of all customers (the prediction tab)
+#   customer - one model per customer
+# target "cluster_mean" is the cluster's monthly mean (per-customer forecasts
+# are averaged), target "customer" is each customer's own usage.
+MODELS = ["cluster", "global", "customer"]
+TARGETS = ["cluster_mean", "customer"]
+MAX_HORIZON = 12
+
+
+def _mean_series(values: np.ndarray) -> np.ndarray:
+    # monthly mean over customers, NaN for months nobody has a record
+    counts = np.sum(~np.isnan(values), axis=0)
+    sums = np.nansum(values, axis=0)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _train_window(values: np.ndarray, origin: int) -> np.ndarray:
+    # months before the origin only
+    out = np.array(values, dtype=float)
+    out[..., origin:] = np.nan
+    return out
+
+
+def backtest_cluster(
+    customers: np.ndarray,
+    global_mean: np.ndarray,
+    origins: List[int],
+    max_horizon: int = MAX_HORIZON,
+) -> Tuple[np.ndarray, dict]:
+    # customers (n, T): calendar series of one cluster and one metric.
+    # Returns error sums (targets, models, origins, horizons, [count, abs, squared])
+    # and the fit + forecast seconds spent per model.
+    target = _mean_series(customers)
+    T = len(target)
+    sums = np.zeros((len(TARGETS), len(MODELS), len(origins), max_horizon, 3))
+    seconds = dict.fromkeys(MODELS, 0.0)
+
+    def score(t, m, i, forecast, actual):
+        # forecast / actual (..., H); NaN pairs are skipped
+        err = forecast - actual
+        ok = ~np.isnan(err)
+        sums[t, m, i, :, 0] += ok.reshape(-1, max_horizon).sum(axis=0)
+        sums[t, m, i, :, 1] += np.where(ok, np.abs(err), 0.0).reshape(-1, max_horizon).sum(axis=0)
+        sums[t, m, i, :, 2] += np.where(ok, err ** 2, 0.0).reshape(-1, max_horizon).sum(axis=0)
+
+    for i, origin in enumerate(origins):
+        h = min(max_horizon, T - origin)
+        actual_mean = np.full(max_horizon, np.nan)
+        actual_mean[:h] = target[origin:origin + h]
+
+        start = time.perf_counter()
+        cluster_fc = fit_seasonal_trend_batch(_train_window(target, origin), steps=max_horizon).forecast
+        seconds["cluster"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        global_fc = fit_seasonal_trend_batch(_train_window(global_mean, origin), steps=max_horizon).forecast
+        seconds["global"] += time.perf_counter() - start
+
+        # only customers active in the last training month can forecast the
+        # months right after it; they are the customers every model is scored on
+        start = time.perf_counter()
+        active = np.flatnonzero(~np.isnan(customers[:, origin - 1]))
+        own_fc = fit_seasonal_trend_batch(_train_window(customers[active], origin), steps=max_horizon).forecast
+        seconds["customer"] += time.perf_counter() - start
+        fitted = ~np.isnan(own_fc[:, 0])
+        own_fc, active = own_fc[fitted], active[fitted]
+
+        actual_own = np.full((len(active), max_horizon), np.nan)
+        actual_own[:, :h] = customers[active, origin:origin + h]
+
+        bottom_up = own_fc.mean(axis=0) if len(active) else np.full(max_horizon, np.nan)
+        for m, (mean_fc, cust_fc) in enumerate([(cluster_fc, cluster_fc), (global_fc, global_fc), (bottom_up, own_fc)]):
+            score(0, m, i, mean_fc, actual_mean)
+            score(1, m, i, np.broadcast_to(cust_fc, actual_own.shape), actual_own)
+
+    return sums, seconds
+
+
+def _run_task(task: dict) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    sums, seconds = backtest_cluster(
+        task["customers"], task["global_mean"], task["origins"], task["max_horizon"]
+    )
+    n_targets, n_models, O, H, _ = sums.shape
+    grid = pd.MultiIndex.from_product(
+        [TARGETS, MODELS, task["origin_months"], np.arange(1, H + 1)],
+        names=["target", "model", "origin", "horizon"],
+    ).to_frame(index=False)
+    flat = sums.reshape(-1, 3)
+    errors = grid.assign(
+        metric=task["metric"],
+        cluster=task["cluster"],
+        n=flat[:, 0].astype(int),
+        abs_error=flat[:, 1],
+        sq_error=flat[:, 2],
+    )
+    errors = errors[errors["n"] > 0]
+
+    timings = pd.DataFrame({
+        "metric": task["metric"],
+        "cluster": task["cluster"],
+        "model": MODELS,
+        "customers": len(task["customers"]),
+        "origins": O,
+        "seconds": [seconds[m] for m in MODELS],
+    })
+    return errors, timings
+
+
+def run_backtest(
+    df: pd.DataFrame,
+    cluster_col: str = "dtw_cluster",
+    metrics: List[str] = USAGE_COLUMNS,
+    max_horizon: int = MAX_HORIZON,
+    min_train: int = MIN_OBSERVATIONS,
+    workers: Optional[int] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # Every cluster x metric x rolling origin (first origin after min_train
+    # months, last one with a month left to forecast) x horizon 1..max_horizon.
+    # Returns error sums per target, model, origin and horizon (see
+    # summarize_backtest) and the time spent per model.
+    if cluster_col not in df.columns:
+        raise ValueError("Backtesting compares cluster models: run the DTW clustering first.")
+
+    ts = build_time_series_tensor(df, features=metrics, align="calendar", dtype=float)
+    labels = (
+        df.groupby(df["customer_id"].astype(str), observed=True)[cluster_col].first()
+        .reindex(ts.customer_ids.astype(str))
+        .to_numpy()
+    )
+
+    T = len(ts.months)
+    origins = list(range(min_train, T))
+    if not origins:
+        raise ValueError(f"Backtesting needs more than {min_train} months of history.")
+
+    tasks = []
+    for j, metric in enumerate(metrics):
+        values = ts.values[:, :, j]
+        global_mean = _mean_series(values)
+        for cluster in np.unique(labels[~pd.isna(labels)]).astype(int):
+            tasks.append({
+                "metric": metric,
+                "cluster": int(cluster),
+                "customers": values[labels == cluster],
+                "global_mean": global_mean,
+                "origins": origins,
+                "origin_months": ts.months[origins],
+                "max_horizon": max_horizon,
+            })
+
+    if workers == 1:
+        results = [_run_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_task, tasks))
+
+    errors = pd.concat([r[0] for r in results], ignore_index=True)
+    errors = errors[["metric", "cluster", "target", "model", "origin", "horizon", "n", "abs_error", "sq_error"]]
+    timings = pd.concat([r[1] for r in results], ignore_index=True)
+    return errors, timings
+
+
+def summarize_backtest(errors: pd.DataFrame, by: Optional[List[str]] = None) -> pd.DataFrame:
+    # MAE / RMSE over all rolling origins (and customers, for the customer target)
+    by = by or ["metric", "cluster", "target", "model", "horizon"]
+    out = errors.groupby(by)[["n", "abs_error", "sq_error"]].sum().reset_index()
+    out["MAE"] = out["abs_error"] / out["n"]
+    out["RMSE"] = np.sqrt(out["sq_error"] / out["n"])
+    return out.drop(columns=["abs_error", "sq_error"])
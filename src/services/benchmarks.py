@@ -0,0 +1,199 @@
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.dataset import read_dataset
+from src.services.aggregates import build_cube
+from src.services.dtw_clustering import dtw_cluster
+from src.services.preprocessing import build_time_series
+from src.services.synthetic import write_synthetic
+from src.ui.tabs.churn_dashboard import cluster_churn_dashboard
+from src.ui.tabs.evaluation import evaluate_before_after
+from src.ui.tabs.recommendation import recommend_plans_churn_rule_based
+
+# Scales are customer counts of the synthetic dataset (36 months each).
+# DTW clustering and the per-customer functions run on a sample of customers:
+# DTW k-means is quadratic in the series length and slow far below 1M
+# customers, and the per-customer functions cost the same at every scale
+# except for finding the customer's rows.
+SCALES = [10_000, 100_000, 1_000_000]
+DTW_CUSTOMERS = 2_000
+SAMPLE_CUSTOMERS = 200
+K = 6
+
+# name -> prepare(df, options) -> (timed call, calls per run, customers it covers)
+Prepared = Tuple[Callable[[], object], int, int]
+
+
+def _sample_ids(df: pd.DataFrame, n: int, seed: int = 0) -> np.ndarray:
+    ids = df["customer_id"].unique()
+    rng = np.random.default_rng(seed)
+    return rng.choice(np.asarray(ids), size=min(n, len(ids)), replace=False)
+
+
+def _customer_frames(df: pd.DataFrame, n: int) -> List[pd.DataFrame]:
+    sample = df[df["customer_id"].isin(_sample_ids(df, n))]
+    return [g for _, g in sample.groupby("customer_id", observed=True, sort=False)]
+
+
+def _with_clusters(df: pd.DataFrame, k: int) -> pd.DataFrame:
+    # random labels: the dashboard cost does not depend on which clustering it shows
+    if "dtw_cluster" in df.columns:
+        return df
+    codes = df["customer_id"].cat.codes.to_numpy() if isinstance(df["customer_id"].dtype, pd.CategoricalDtype) \
+        else pd.factorize(df["customer_id"])[0]
+    labels = np.random.default_rng(0).integers(0, k, size=codes.max() + 1)
+    return df.assign(dtw_cluster=labels[codes].astype(np.int16))
+
+
+def _prepare_build_time_series(df, opts) -> Prepared:
+    return lambda: build_time_series(df), 1, df["customer_id"].nunique()
+
+
+def _prepare_dtw_cluster(df, opts) -> Prepared:
+    series, ids = build_time_series(df[df["customer_id"].isin(_sample_ids(df, opts["dtw_customers"]))])
+    # compile the numba DTW kernels outside the timed runs
+    dtw_cluster(series[: 2 * opts["k"]], k=opts["k"])
+    return lambda: dtw_cluster(series, k=opts["k"]), 1, len(ids)
+
+
+def _prepare_cluster_churn_dashboard(df, opts) -> Prepared:
+    labeled = _with_clusters(df, opts["k"])
+    return lambda: cluster_churn_dashboard(labeled), 1, df["customer_id"].nunique()
+
+
+def _prepare_build_cube(df, opts) -> Prepared:
+    labeled = _with_clusters(df, opts["k"])
+    return lambda: build_cube(labeled, version="benchmark"), 1, df["customer_id"].nunique()
+
+
+def _prepare_recommend_plans_churn_rule_based(df, opts) -> Prepared:
+    frames = _customer_frames(df, opts["sample_customers"])
+    return lambda: [recommend_plans_churn_rule_based(g) for g in frames], len(frames), len(frames)
+
+
+def _prepare_evaluate_before_after(df, opts) -> Prepared:
+    frames = _customer_frames(df, opts["sample_customers"])
+    plans = [(str(g["current_plan_type"].iloc[0]), "Standard") for g in frames]
+    return (
+        lambda: [evaluate_before_after(g, cur, rec) for g, (cur, rec) in zip(frames, plans)],
+        len(frames),
+        len(frames),
+    )
+
+
+BENCHMARKS: Dict[str, Callable[[pd.DataFrame, dict], Prepared]] = {
+    "build_time_series": _prepare_build_time_series,
+    "dtw_cluster": _prepare_dtw_cluster,
+    "cluster_churn_dashboard": _prepare_cluster_churn_dashboard,
+    "recommend_plans_churn_rule_based": _prepare_recommend_plans_churn_rule_based,
+    "evaluate_before_after": _prepare_evaluate_before_after,
+    # the cluster/month series of the cluster tabs (formerly make_monthly_series)
+    "build_cube": _prepare_build_cube,
+}
+
+
+def measure(fn: Callable[[], object], repeat: int = 1, memory: bool = True) -> dict:
+    # wall times of `repeat` runs, then one more run under tracemalloc for the
+    # peak of Python and NumPy allocations (tracing slows the run, so it is not timed)
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    out = {"seconds": seconds, "median_s": float(np.median(seconds))}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            out["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    return out
+
+
+def synthetic_dataset(root: Path, customers: int, seed: int = 0, report=None) -> Path:
+    # generated once per (customers, seed) and reused by later runs
+    path = Path(root) / f"customers-{customers}-seed-{seed}"
+    if not path.is_dir():
+        write_synthetic(path, customers, seed=seed, report=report)
+    return path
+
+
+def _git_commit(cwd: Path) -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def environment(base_dir: Path) -> dict:
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(base_dir),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def run_benchmarks(
+    dataset_root: Path,
+    scales: List[int] = SCALES,
+    functions: Optional[List[str]] = None,
+    repeat: int = 1,
+    memory: bool = True,
+    seed: int = 0,
+    dtw_customers: int = DTW_CUSTOMERS,
+    sample_customers: int = SAMPLE_CUSTOMERS,
+    k: int = K,
+    report: Optional[Callable[[dict], None]] = None,
+) -> List[dict]:
+    # One result per scale x function; each scale's dataset is loaded once
+    opts = {"dtw_customers": dtw_customers, "sample_customers": sample_customers, "k": k}
+    results = []
+    for customers in scales:
+        path = synthetic_dataset(dataset_root, customers, seed)
+        start = time.perf_counter()
+        df = read_dataset(path)
+        load_s = time.perf_counter() - start
+
+        for name in functions or list(BENCHMARKS):
+            fn, calls, covered = BENCHMARKS[name](df, opts)
+            result = {
+                "function": name,
+                "scale": customers,
+                "rows": len(df),
+                "customers": covered,
+                "calls": calls,
+                "load_s": load_s,
+                **measure(fn, repeat=repeat, memory=memory),
+            }
+            result["per_call_ms"] = 1000 * result["median_s"] / max(calls, 1)
+            results.append(result)
+            if report is not None:
+                report(result)
+        del df
+    return results
+
+
+def compare_reports(old: dict, new: dict) -> pd.DataFrame:
+    # median time and peak memory of the same function and scale in two reports
+    key = ["function", "scale"]
+    cols = key + ["per_call_ms", "peak_mb"]
+    a = pd.DataFrame(old["results"]).reindex(columns=cols)
+    b = pd.DataFrame(new["results"]).reindex(columns=cols)
+    out = a.merge(b, on=key, suffixes=("_old", "_new"))
+    out["time_ratio"] = out["per_call_ms_new"] / out["per_call_ms_old"]
+    out["memory_ratio"] = out["peak_mb_new"] / out["peak_mb_old"]
+    return out
@@ -0,0 +1,106 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.services.plan_catalog import USAGE_COLUMNS, PlanCatalog, get_catalog
+from src.services.perf import timed
+from src.services.preprocessing import build_time_series_tensor
+
+
+def round_decimal(values: np.ndarray, digits: int = 2) -> np.ndarray:
+    # Elementwise Python round(): the exact binary value is rounded, so 2.675
+    # (stored as 2.67499...) gives 2.67 where np.round gives 2.68. Only the
+    # values within float error of a tie are rounded one by one.
+    values = np.asarray(values, dtype=float)
+    scale = 10.0 ** digits
+    scaled = values * scale
+    out = np.round(scaled) / scale
+    frac = np.abs(scaled - np.floor(scaled) - 0.5)
+    near_tie = np.flatnonzero(frac <= 1e-9 * np.maximum(np.abs(scaled), 1.0))
+    flat = out.reshape(-1)
+    flat[near_tie] = [round(float(v), digits) for v in values.reshape(-1)[near_tie]]
+    return out
+
+
+def simulate_bill_tensor(
+    usage: np.ndarray,
+    limits: np.ndarray,
+    base: np.ndarray,
+    rates: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    # usage (..., 5) -> arrays of shape (..., P). Matches the scalar bill to the
+    # cent: base + extra data + extra voice + ... summed in that order, rounded
+    # like Python's round()
+    usage = np.asarray(usage, dtype=float)
+    shape = usage.shape[:-1] + (len(base),)
+
+    total = np.broadcast_to(np.asarray(base, dtype=float), shape).copy()
+    overusage = np.zeros(shape)
+    overuse = np.zeros(shape, dtype=bool)
+    # one pass per usage metric keeps peak memory at a few (..., P) arrays
+    for j in range(len(rates)):
+        over = np.maximum(usage[..., j, None] - limits[:, j], 0.0)
+        extra = over * rates[j]
+        total += extra
+        overusage += extra
+        overuse |= over > 0
+
+    return {
+        "expected_bill_eur": round_decimal(total, 2),
+        "expected_overusage_eur": round_decimal(overusage, 2),
+        "overuse_flag": overuse,
+    }
+
+
+def simulate_plans(
+    usage: np.ndarray,
+    plan_names: Optional[List[str]] = None,
+    catalog: Optional[PlanCatalog] = None,
+) -> Dict[str, np.ndarray]:
+    # usage (..., 5) priced under every plan of the catalog (or the named ones)
+    catalog = (catalog or get_catalog()).subset(plan_names)
+    return simulate_bill_tensor(usage, catalog.limits, catalog.base, catalog.rates)
+
+
+def usage_matrix(df: pd.DataFrame) -> np.ndarray:
+    # column_stack avoids building an intermediate sub-frame
+    return np.column_stack([df[c].to_numpy(dtype=float) for c in USAGE_COLUMNS])
+
+
+@timed
+def simulate_customer_bills(
+    cust_df: pd.DataFrame,
+    plan_names: Optional[List[str]] = None,
+    catalog: Optional[PlanCatalog] = None,
+):
+    # Monthly bills and overuse flags of one customer, as (months x plans) frames
+    g = cust_df.sort_values("date")
+    catalog = (catalog or get_catalog()).subset(plan_names)
+    names = catalog.names
+    sim = simulate_plans(usage_matrix(g), catalog=catalog)
+
+    index = g["date"].values
+    bills = pd.DataFrame(sim["expected_bill_eur"], index=index, columns=names)
+    overuse = pd.DataFrame(sim["overuse_flag"], index=index, columns=names)
+    return bills, overuse
+
+
+def fleet_usage_tensor(df: pd.DataFrame):
+    # (customers, months, 5) usage tensor on the calendar grid; missing months are NaN
+    ts = build_time_series_tensor(df, features=USAGE_COLUMNS, align="calendar", dtype=np.float64)
+    return ts.values, ts.customer_ids, ts.months
+
+
+@timed
+def simulate_fleet_bills(
+    df: pd.DataFrame,
+    plan_names: Optional[List[str]] = None,
+    catalog: Optional[PlanCatalog] = None,
+):
+    # Whole-base pricing: (customers, months, plans) bill and overuse tensors,
+    # NaN bills / False flags where a customer has no record for the month
+    usage, customer_ids, dates = fleet_usage_tensor(df)
+    catalog = (catalog or get_catalog()).subset(plan_names)
+    sim = simulate_plans(usage, catalog=catalog)
+    return sim, customer_ids, dates, catalog.names
@@ -1,20 +1,207 @@
+import json
+from typing import Optional, Tuple
+
+import numpy as np
 import pandas as pd
-import streamlit as st
+from tslearn.barycenters import dtw_barycenter_averaging
+from tslearn.metrics import cdist_dtw
 
+from src.config import AppPaths, DTWSettings
+from src.dataset import merge_records
+from src.storage import dtw_cache_key, load_distance_cache, save_distance_cache
 from src.services.preprocessing import build_time_series
-from src.services.dtw_clustering import dtw_cluster
+from src.services.dtw_clustering import assign_to_centers, dtw_cluster, fill_pairwise_dtw, similar_customers
+from src.services.perf import timed
+
+# one customer-to-center file per fitted k: room for a few sweeps of k = 3…10
+CENTER_CACHE_KEEP = 32
 
 
-@st.cache_data
-def compute_dtw_clusters(df: pd.DataFrame, k: int):
+@timed
+def cluster_customers(df: pd.DataFrame, k: int, settings: Optional[DTWSettings] = None):
     time_series_data, customer_ids = build_time_series(df)
-    labels, model = dtw_cluster(time_series_data, k=k)
+    labels, model = dtw_cluster(time_series_data, k=k, settings=settings)
     cluster_df = pd.DataFrame({"customer_id": customer_ids, "dtw_cluster": labels})
     return cluster_df, model
 
 
+def clustering_request_key(paths: AppPaths, k: int, settings: DTWSettings) -> str:
+    # Identical clustering requests: same raw data, same k, same DTW window
+    source = paths.raw_dataset if paths.raw_dataset.is_dir() else paths.raw_data
+    stat = source.stat()
+    window = json.dumps(settings.metric_params(), sort_keys=True)
+    return f"dtw:{source.name}:{stat.st_size}:{stat.st_mtime_ns}:k={int(k)}:{window}"
+
+
+@timed
 def apply_cluster_labels(df: pd.DataFrame, cluster_df: pd.DataFrame) -> pd.DataFrame:
     out = df.copy()
     cid_to_cluster = dict(zip(cluster_df["customer_id"], cluster_df["dtw_cluster"]))
     out["dtw_cluster"] = out["customer_id"].map(cid_to_cluster)
     return out
+
+
+def _comparable(col: pd.Series) -> pd.Series:
+    # same values must hash the same whatever the on-disk dtype (ns/us dates, int/float, str/category)
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.astype("datetime64[ns]").astype("int64")
+    if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+        return col.astype(float)
+    return col.astype(str)
+
+
+def _record_hashes(df: pd.DataFrame, columns: list) -> pd.Series:
+    # hash of each record, indexed by (customer, month)
+    frame = pd.DataFrame({c: _comparable(df[c]) for c in columns})
+    row_hash = pd.util.hash_pandas_object(frame, index=False)
+    row_hash.index = pd.MultiIndex.from_arrays([df["customer_id"].astype(str), _comparable(df["date"])])
+    return row_hash[~row_hash.index.duplicated(keep="last")]
+
+
+def changed_customers(new_df: pd.DataFrame, enriched_df: Optional[pd.DataFrame]) -> np.ndarray:
+    # customers of new_df with a month that is missing from, or differs from,
+    # the enriched dataset; their other stored months are not compared
+    if enriched_df is None or enriched_df.empty:
+        return new_df["customer_id"].astype(str).unique()
+
+    columns = [c for c in new_df.columns if c in enriched_df.columns and c != "dtw_cluster"]
+    new_hash = _record_hashes(new_df, columns)
+    stored = enriched_df[enriched_df["customer_id"].isin(new_df["customer_id"].unique())]
+    old_hash = _record_hashes(stored, columns).reindex(new_hash.index)
+
+    changed = (old_hash.isna() | (old_hash != new_hash)).to_numpy()
+    return new_hash.index.get_level_values(0)[changed].unique().to_numpy()
+
+
+def customer_history(
+    new_df: pd.DataFrame,
+    enriched_df: Optional[pd.DataFrame],
+    customer_ids: np.ndarray,
+) -> pd.DataFrame:
+    # All records of these customers: their stored months with the records of
+    # new_df merged in, so they are labeled from their whole series (their
+    # previous labels are dropped)
+    rows = new_df[new_df["customer_id"].astype(str).isin(customer_ids)]
+    stored = None
+    if enriched_df is not None:
+        stored = enriched_df[enriched_df["customer_id"].astype(str).isin(customer_ids)]
+        stored = stored.drop(columns="dtw_cluster", errors="ignore")
+    return merge_records(stored, rows.drop(columns="dtw_cluster", errors="ignore"))
+
+
+def stored_labels(enriched_df: Optional[pd.DataFrame], customer_ids) -> np.ndarray:
+    # Current cluster of each customer in the enriched data, -1 if not labeled yet
+    if enriched_df is None or "dtw_cluster" not in enriched_df.columns:
+        return np.full(len(customer_ids), -1)
+    labels = enriched_df.drop_duplicates("customer_id")
+    labels = labels.set_index(labels["customer_id"].astype(str))["dtw_cluster"]
+    return labels.reindex(pd.Index(customer_ids).astype(str)).fillna(-1).to_numpy(dtype=int)
+
+
+def customer_center_distances(
+    time_series_data: np.ndarray,
+    centers: np.ndarray,
+    settings: DTWSettings,
+    paths: AppPaths,
+) -> np.ndarray:
+    # (customers, k) DTW distances, memory-mapped from the cache when available
+    key = dtw_cache_key(time_series_data, settings, centers)
+    cached = load_distance_cache("centers", key, paths)
+    if cached is not None:
+        return cached
+
+    def fill(out):
+        out[:] = cdist_dtw(time_series_data, centers, n_jobs=settings.n_jobs, **settings.metric_params())
+
+    shape = (len(time_series_data), len(centers))
+    return save_distance_cache("centers", key, shape, fill, paths, dtype=np.float64, keep=CENTER_CACHE_KEEP)
+
+
+def customer_pairwise_distances(
+    time_series_data: np.ndarray,
+    settings: DTWSettings,
+    paths: AppPaths,
+) -> np.ndarray:
+    # Condensed customer-to-customer DTW distances, memory-mapped from the cache when available
+    key = dtw_cache_key(time_series_data, settings)
+    cached = load_distance_cache("pairwise", key, paths)
+    if cached is not None:
+        return cached
+
+    def fill(out):
+        fill_pairwise_dtw(out, time_series_data, settings.metric_params(), settings.n_jobs)
+
+    n = len(time_series_data)
+    return save_distance_cache("pairwise", key, (n * (n - 1) // 2,), fill, paths)
+
+
+def similar_customer_table(
+    pairwise: np.ndarray,
+    customer_ids: np.ndarray,
+    customer_id,
+    top: int = 5,
+) -> pd.DataFrame:
+    # The `top` customers with the closest usage series to customer_id, read
+    # from condensed pairwise distances in the order of customer_ids
+    ids = np.asarray(customer_ids).astype(str)
+    i = int(np.flatnonzero(ids == str(customer_id))[0])
+    idx, dists = similar_customers(pairwise, len(ids), i, top=top)
+    return pd.DataFrame({"customer_id": ids[idx], "dtw_distance": dists})
+
+
+def assign_to_saved_centers(
+    df: pd.DataFrame,
+    centers: np.ndarray,
+    settings: Optional[DTWSettings] = None,
+):
+    # Label customers by nearest saved DTW center, without refitting
+    settings = settings or DTWSettings()
+    time_series_data, customer_ids = build_time_series(df)
+    labels, dists, _ = assign_to_centers(
+        time_series_data,
+        centers,
+        metric_params=settings.metric_params(),
+        n_jobs=settings.n_jobs,
+    )
+    cluster_df = pd.DataFrame({
+        "customer_id": customer_ids,
+        "dtw_cluster": labels,
+        "dtw_distance": dists,
+    })
+    return cluster_df, time_series_data
+
+
+def update_centers_minibatch(
+    centers: np.ndarray,
+    time_series_data: np.ndarray,
+    labels: np.ndarray,
+    cluster_sizes: np.ndarray,
+    settings: Optional[DTWSettings] = None,
+    previous_labels: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Mini-batch k-means step: move each center towards the DBA barycenter of its
+    # new members, weighted by how many customers the center already represents.
+    # Customers already counted in cluster_sizes (previous_labels >= 0, -1 for new
+    # ones) leave their old cluster first and join with their current label, so
+    # the sizes stay the number of customers per cluster.
+    settings = settings or DTWSettings()
+    centers = centers.copy()
+    sizes = np.asarray(cluster_sizes, dtype=float).copy()
+    if previous_labels is not None:
+        previous = np.asarray(previous_labels, dtype=int)
+        np.subtract.at(sizes, previous[previous >= 0], 1)
+        sizes = np.maximum(sizes, 0)
+
+    for c in np.unique(labels):
+        batch = time_series_data[labels == c]
+        barycenter = dtw_barycenter_averaging(
+            batch,
+            barycenter_size=centers.shape[1],
+            init_barycenter=centers[c],
+            metric_params=settings.metric_params() or None,
+        )
+        eta = len(batch) / (sizes[c] + len(batch))
+        centers[c] = (1.0 - eta) * centers[c] + eta * barycenter
+        sizes[c] += len(batch)
+
+    return centers, sizes
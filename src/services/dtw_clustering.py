@@ -1,11 +1,260 @@
+from typing import Callable, Optional
+
+import numpy as np
+from joblib import Parallel, delayed
+from numba import njit
 from tslearn.clustering import TimeSeriesKMeans
+from tslearn.clustering.utils import _check_no_empty_cluster
+from tslearn.metrics import cdist_dtw, itakura_mask, sakoe_chiba_mask
+
+from src.config import DTWSettings
+
+MAX_ITER = 10
+
+
+def window_mask(sz1: int, sz2: int, metric_params: dict) -> np.ndarray:
+    # (sz1, sz2) boolean mask of the alignments allowed by the warping window
+    constraint = metric_params.get("global_constraint")
+    if constraint == "sakoe_chiba":
+        return np.asarray(sakoe_chiba_mask(sz1, sz2, radius=metric_params["sakoe_chiba_radius"]), dtype=bool)
+    if constraint == "itakura":
+        return np.asarray(itakura_mask(sz1, sz2, max_slope=metric_params["itakura_max_slope"]), dtype=bool)
+    return np.ones((sz1, sz2), dtype=bool)
+
+
+@njit(nogil=True, cache=True)
+def _dtw_early_abandon(s1, s2, mask, max_cost):
+    # Same recursion as tslearn's dtw(), but gives up (returns inf) once every
+    # cell of a row costs more than max_cost: no warping path can beat it anymore.
+    l1 = s1.shape[0]
+    l2 = s2.shape[0]
+    cum_sum = np.full((l1 + 1, l2 + 1), np.inf)
+    cum_sum[0, 0] = 0.0
+
+    for i in range(l1):
+        row_min = np.inf
+        for j in range(l2):
+            if mask[i, j]:
+                dist = 0.0
+                for d in range(s1.shape[1]):
+                    diff = s1[i, d] - s2[j, d]
+                    dist += diff * diff
+                dist += min(cum_sum[i, j + 1], cum_sum[i + 1, j], cum_sum[i, j])
+                cum_sum[i + 1, j + 1] = dist
+                row_min = min(row_min, dist)
+        if row_min > max_cost:
+            return np.inf
+    return np.sqrt(cum_sum[l1, l2])
+
+
+def keogh_envelopes(centers: np.ndarray, metric_params: dict):
+    # lower/upper envelope of each center over the warping window, shape (k, sz, d)
+    sz = centers.shape[1]
+    mask = window_mask(sz, sz, metric_params)[None, :, :, None]
+    c = centers[:, None, :, :]
+    lower = np.where(mask, c, np.inf).min(axis=2)
+    upper = np.where(mask, c, -np.inf).max(axis=2)
+    return lower, upper
+
+
+def lb_keogh(X: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    # Multivariate LB_Keogh, a lower bound of tslearn's dtw() for every (series, center)
+    if X.shape[1] != lower.shape[1]:
+        # the bound needs equal lengths; other series are never pruned
+        return np.zeros((X.shape[0], lower.shape[0]))
+    x = X[:, None, :, :]
+    excess = np.maximum(x - upper[None], 0.0) + np.maximum(lower[None] - x, 0.0)
+    lb = np.sqrt(np.sum(excess ** 2, axis=(2, 3)))
+    # NaN-padded (ragged) series have no valid bound: never prune them
+    lb[np.isnan(lb)] = 0.0
+    return lb
+
+
+def _assign_chunk(X, centers, lower, upper, metric_params):
+    lb = lb_keogh(X, lower, upper)
+    labels = np.zeros(len(X), dtype=int)
+    best = np.full(len(X), np.inf)
+    n_dtw = 0
+
+    # ragged series are NaN-padded at the end: align only their valid prefix
+    lengths = (~np.isnan(X).any(axis=2)).sum(axis=1)
+    centers = np.ascontiguousarray(centers, dtype=float)
+    masks = {}
+
+    for i in range(len(X)):
+        n = int(lengths[i])
+        if n not in masks:
+            masks[n] = window_mask(n, centers.shape[1], metric_params)
+        x = np.ascontiguousarray(X[i, :n], dtype=float)
+
+        # visit centers from the most to the least promising bound and stop as
+        # soon as the bound can no longer beat the best full DTW seen so far
+        for c in np.argsort(lb[i], kind="stable"):
+            if lb[i, c] >= best[i]:
+                break
+            d = _dtw_early_abandon(x, centers[c], masks[n], best[i] ** 2)
+            n_dtw += 1
+            if d < best[i]:
+                best[i] = d
+                labels[i] = c
+
+    return labels, best, n_dtw
+
+
+def assign_to_centers(
+    X: np.ndarray,
+    centers: np.ndarray,
+    metric_params: Optional[dict] = None,
+    n_jobs: Optional[int] = None,
+    chunk_size: int = 256,
+):
+    # Nearest-center DTW assignment with LB_Keogh pruning.
+    # Returns labels, DTW distance to the assigned center, number of full DTW computed.
+    metric_params = metric_params or {}
+    lower, upper = keogh_envelopes(centers, metric_params)
+    chunks = [X[i:i + chunk_size] for i in range(0, len(X), chunk_size)]
 
-def dtw_cluster(time_series_data, k=6):
-    model = TimeSeriesKMeans(
+    if n_jobs in (None, 1) or len(chunks) == 1:
+        results = [_assign_chunk(c, centers, lower, upper, metric_params) for c in chunks]
+    else:
+        # the DTW kernel releases the GIL, so threads run it on all cores
+        results = Parallel(n_jobs=n_jobs, prefer="threads")(
+            delayed(_assign_chunk)(c, centers, lower, upper, metric_params) for c in chunks
+        )
+
+    if not results:
+        return np.zeros(0, dtype=int), np.zeros(0), 0
+    labels = np.concatenate([r[0] for r in results])
+    dists = np.concatenate([r[1] for r in results])
+    n_dtw = int(sum(r[2] for r in results))
+    return labels, dists, n_dtw
+
+
+class PrunedTimeSeriesKMeans(TimeSeriesKMeans):
+    # TimeSeriesKMeans whose DTW assignment step skips centers ruled out by LB_Keogh.
+    # Barycenter updates and initialisation are tslearn's own.
+    # on_iteration(assignments so far, inertia) is called after every assignment
+    # step: once per k-means iteration, plus the final labelling.
+    on_iteration: Optional[Callable[[int, float], None]] = None
+
+    def fit(self, X, y=None):
+        self.dtw_computed_ = 0
+        self.dtw_candidates_ = 0
+        self.assignments_ = 0
+        return super().fit(X, y)
+
+    def _assign(self, X, update_class_attributes=True):
+        if self.metric != "dtw":
+            return super()._assign(X, update_class_attributes)
+
+        labels, dists, n_dtw = assign_to_centers(
+            X,
+            self.cluster_centers_,
+            metric_params=self._get_metric_params(),
+            n_jobs=self.n_jobs,
+        )
+        self.dtw_computed_ = getattr(self, "dtw_computed_", 0) + n_dtw
+        self.dtw_candidates_ = getattr(self, "dtw_candidates_", 0) + len(X) * self.n_clusters
+
+        if update_class_attributes:
+            self.labels_ = labels
+            _check_no_empty_cluster(self.labels_, self.n_clusters)
+            # same squared inertia as tslearn's _compute_inertia
+            self.inertia_ = float(np.mean(dists ** 2))
+            self.assignments_ = getattr(self, "assignments_", 0) + 1
+            if self.on_iteration is not None:
+                self.on_iteration(self.assignments_, self.inertia_)
+        return labels
+
+
+def dtw_cluster(
+    time_series_data,
+    k=6,
+    settings: Optional[DTWSettings] = None,
+    on_iteration: Optional[Callable[[int, float], None]] = None,
+):
+    settings = settings or DTWSettings()
+    model = PrunedTimeSeriesKMeans(
         n_clusters=k,
         metric="dtw",
-        max_iter=10,
-        random_state=42
+        max_iter=MAX_ITER,
+        random_state=42,
+        metric_params=settings.metric_params() or None,
+        n_jobs=settings.n_jobs,
     )
+    model.on_iteration = on_iteration
     labels = model.fit_predict(time_series_data)
     return labels, model
+
+
+def condensed_index(n: int, i: int) -> np.ndarray:
+    # positions of all pairs (i, j), j != i, in a condensed (upper triangle) vector
+    j = np.arange(n)
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    idx = n * lo - lo * (lo + 1) // 2 + (hi - lo - 1)
+    return np.delete(idx, i)
+
+
+def fill_pairwise_dtw(
+    out: np.ndarray,
+    X: np.ndarray,
+    metric_params: Optional[dict] = None,
+    n_jobs: Optional[int] = None,
+    block_size: int = 128,
+) -> None:
+    # Condensed customer-to-customer DTW distances, written block by block into `out`
+    metric_params = metric_params or {}
+    n = len(X)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        block = cdist_dtw(X[start:stop], X[start:], n_jobs=n_jobs, **metric_params)
+        for r, i in enumerate(range(start, stop)):
+            pos = n * i - i * (i + 1) // 2
+            out[pos:pos + n - i - 1] = block[r, i - start + 1:]
+
+
+def similar_customers(condensed: np.ndarray, n: int, i: int, top: int = 5):
+    # indices and DTW distances of the `top` customers closest to customer i
+    others = np.delete(np.arange(n), i)
+    d = np.asarray(condensed[condensed_index(n, i)])
+    order = np.argsort(d, kind="stable")[:top]
+    return others[order], d[order]
+
+
+def dtw_silhouette_score(condensed: np.ndarray, labels: np.ndarray) -> float:
+    # Exact silhouette from cached pairwise distances, one customer row at a time
+    labels = np.asarray(labels)
+    n = len(labels)
+    clusters, counts = np.unique(labels, return_counts=True)
+    if len(clusters) < 2:
+        return 0.0
+
+    pos = np.searchsorted(clusters, labels)
+    scores = np.zeros(n)
+    for i in range(n):
+        d = np.insert(np.asarray(condensed[condensed_index(n, i)], dtype=float), i, 0.0)
+        mean_d = np.bincount(pos, weights=d, minlength=len(clusters))
+        own = pos[i]
+        if counts[own] < 2:
+            continue
+        a = mean_d[own] / (counts[own] - 1)
+        mean_d = mean_d / counts
+        b = np.min(np.delete(mean_d, own))
+        scores[i] = (b - a) / max(a, b) if max(a, b) > 0 else 0.0
+    return float(scores.mean())
+
+
+def center_silhouette_score(center_dists: np.ndarray, labels: np.ndarray) -> float:
+    # Simplified silhouette: distance to own center vs nearest other center
+    d = np.asarray(center_dists, dtype=float)
+    labels = np.asarray(labels)
+    if d.shape[1] < 2 or len(labels) == 0:
+        return 0.0
+    rows = np.arange(len(labels))
+    a = d[rows, labels]
+    other = d.copy()
+    other[rows, labels] = np.inf
+    b = other.min(axis=1)
+    denom = np.maximum(a, b)
+    s = np.divide(b - a, denom, out=np.zeros_like(a), where=denom > 0)
+    return float(s.mean())
@@ -0,0 +1,100 @@
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.services.billing import USAGE_COLUMNS, simulate_plans
+from src.services.forecasting import forecast_customers
+from src.services.perf import timed
+from src.services.plan_catalog import PlanCatalog, get_catalog
+
+DEFAULT_HORIZON = 12
+# customers x horizon x plans cells priced per block, bounds the temporary arrays
+CHUNK_CELLS = 20_000_000
+
+
+def forecast_usage(df: pd.DataFrame, horizon: int = DEFAULT_HORIZON) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Customer ids (N,), forecast usage (N, horizon, 5) and a flag for the customers
+    # whose history is too short for the trend model; those keep their mean usage
+    # for every month, like the trailing-mean recommendation.
+    customer_ids, fit = forecast_customers(df, steps=horizon, metrics=USAGE_COLUMNS)
+    usage = np.clip(fit.forecast.transpose(0, 2, 1), 0.0, None)
+
+    fallback = np.isnan(usage).any(axis=(1, 2))
+    if fallback.any():
+        means = (
+            df.groupby(df["customer_id"].astype(str), observed=True)[USAGE_COLUMNS].mean()
+            .reindex(customer_ids.astype(str)[fallback])
+            .to_numpy(dtype=float)
+        )
+        usage[fallback] = means[:, None, :]
+    return customer_ids, usage, fallback
+
+
+def forecast_plan_bills(
+    usage: np.ndarray,
+    catalog: Optional[PlanCatalog] = None,
+    chunk_cells: int = CHUNK_CELLS,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Price every forecast month under every plan: total bill, overage cost and
+    # months with overuse over the horizon, each (N, plans)
+    catalog = catalog or get_catalog()
+    n_plans = len(catalog)
+    bills = np.zeros((len(usage), n_plans))
+    overusage = np.zeros((len(usage), n_plans))
+    overuse_months = np.zeros((len(usage), n_plans), dtype=int)
+    chunk_customers = max(1, chunk_cells // max(usage.shape[1] * n_plans, 1))
+    for start in range(0, len(usage), chunk_customers):
+        block = slice(start, start + chunk_customers)
+        sim = simulate_plans(usage[block], catalog=catalog)
+        bills[block] = sim["expected_bill_eur"].sum(axis=1)
+        overusage[block] = sim["expected_overusage_eur"].sum(axis=1)
+        overuse_months[block] = sim["overuse_flag"].sum(axis=1)
+    return bills, overusage, overuse_months
+
+
+def cheapest_plans(bills: np.ndarray, overusage: np.ndarray) -> np.ndarray:
+    # per row: lowest bill, then lowest overage cost, then plan order
+    low = bills == bills.min(axis=1, keepdims=True)
+    return np.where(low, overusage, np.inf).argmin(axis=1)
+
+
+@timed
+def recommend_fleet_forecast(
+    df: pd.DataFrame,
+    horizon: int = DEFAULT_HORIZON,
+    catalog: Optional[PlanCatalog] = None,
+) -> pd.DataFrame:
+    # One row per customer: the plan with the lowest forecast bill over the next
+    # `horizon` months (ties go to the lower overage cost) and the saving
+    # against the current plan
+    catalog = catalog or get_catalog()
+    names = catalog.names
+    customer_ids, usage, fallback = forecast_usage(df, horizon)
+    bills, overusage, overuse_months = forecast_plan_bills(usage, catalog)
+
+    best = cheapest_plans(bills, overusage)
+    rows = np.arange(len(customer_ids))
+
+    current = (
+        df.sort_values("date")
+        .drop_duplicates("customer_id", keep="last")
+        .assign(customer_id=lambda d: d["customer_id"].astype(str))
+        .set_index("customer_id")["current_plan_type"]
+        .astype(str)
+        .reindex(customer_ids.astype(str))
+    )
+    current_idx = catalog.positions(current.to_numpy())
+    known = current_idx >= 0
+    current_bill = np.where(known, bills[rows, np.maximum(current_idx, 0)], np.nan)
+
+    return pd.DataFrame({
+        "customer_id": customer_ids,
+        "current_plan": current.to_numpy(),
+        "forecast_recommended_plan": np.asarray(names, dtype=object)[best],
+        "forecast_bill_eur": np.round(bills[rows, best], 2),
+        "forecast_current_plan_bill_eur": np.round(current_bill, 2),
+        "forecast_savings_eur": np.round(current_bill - bills[rows, best], 2),
+        "forecast_overuse_months": overuse_months[rows, best],
+        "forecast_from_mean_usage": fallback,
+    })
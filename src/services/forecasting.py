@@ -0,0 +1,105 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.services.billing import USAGE_COLUMNS
+from src.services.preprocessing import build_time_series_tensor
+
+# Linear trend + one 12-month harmonic, fitted on the observed values of each
+# series in order (t = 0..n-1), as in the prediction tab
+SEASON_MONTHS = 12.0
+MIN_OBSERVATIONS = 6
+
+
+def design_matrix(t: np.ndarray) -> np.ndarray:
+    # (len(t), 4): intercept, trend, sin, cos
+    t = np.asarray(t, dtype=float)
+    return np.column_stack(
+        [
+            np.ones_like(t),
+            t,
+            np.sin(2 * np.pi * t / SEASON_MONTHS),
+            np.cos(2 * np.pi * t / SEASON_MONTHS),
+        ]
+    )
+
+
+def _pattern_groups(observed: np.ndarray) -> np.ndarray:
+    # group number of each row's missing-value pattern; the bit-packed
+    # pattern is one uint64 per row for series of up to 64 steps
+    packed = np.packbits(observed, axis=1)
+    width = -(-packed.shape[1] // 8) * 8
+    keys = np.ascontiguousarray(np.pad(packed, ((0, 0), (0, width - packed.shape[1])))).view(np.uint64)
+    if keys.shape[1] == 1:
+        _, group = np.unique(keys[:, 0], return_inverse=True)
+    else:
+        _, group = np.unique(keys, axis=0, return_inverse=True)
+    return group.ravel()
+
+
+@dataclass(frozen=True)
+class SeasonalTrendFit:
+    coef: np.ndarray       # (..., 4) NaN where a series has fewer than MIN_OBSERVATIONS values
+    n_obs: np.ndarray      # (...) observed values per series
+    residuals: np.ndarray  # (..., T) in-sample errors, NaN where no value
+    rmse: np.ndarray       # (...) in-sample RMSE
+    forecast: np.ndarray   # (..., steps) values after the last observation of each series
+
+
+def fit_seasonal_trend_batch(
+    values: np.ndarray,
+    steps: int = 12,
+    min_obs: int = MIN_OBSERVATIONS,
+) -> SeasonalTrendFit:
+    # Fit every series of `values` (time on the last axis, NaN = missing) at once.
+    # Series with the same missing-value pattern share one design matrix, so there
+    # is one pseudo-inverse per pattern and one matrix multiply for all its series.
+    values = np.asarray(values, dtype=float)
+    lead, T = values.shape[:-1], values.shape[-1]
+    Y = values.reshape(-1, T)
+    observed = ~np.isnan(Y)
+    n_obs = observed.sum(axis=1)
+
+    coef = np.full((len(Y), 4), np.nan)
+    residuals = np.full((len(Y), T), np.nan)
+    forecast = np.full((len(Y), steps), np.nan)
+
+    group = _pattern_groups(observed)
+    order = np.argsort(group, kind="stable")
+    bounds = np.flatnonzero(np.diff(group[order])) + 1
+    for rows in np.split(order, bounds) if len(order) else []:
+        cols = np.flatnonzero(observed[rows[0]])
+        k = len(cols)
+        if k < min_obs:
+            continue
+        X = design_matrix(np.arange(k))
+        y = Y[np.ix_(rows, cols)]
+        beta = y @ np.linalg.pinv(X).T
+        coef[rows] = beta
+        residuals[np.ix_(rows, cols)] = y - beta @ X.T
+        forecast[rows] = beta @ design_matrix(np.arange(k, k + steps)).T
+
+    fitted = ~np.isnan(coef[:, 0])
+    rmse = np.full(len(Y), np.nan)
+    rmse[fitted] = np.sqrt(np.nanmean(residuals[fitted] ** 2, axis=1))
+
+    return SeasonalTrendFit(
+        coef=coef.reshape(lead + (4,)),
+        n_obs=n_obs.reshape(lead),
+        residuals=residuals.reshape(lead + (T,)),
+        rmse=rmse.reshape(lead),
+        forecast=forecast.reshape(lead + (steps,)),
+    )
+
+
+def forecast_customers(
+    df: pd.DataFrame,
+    steps: int = 12,
+    metrics: List[str] = USAGE_COLUMNS,
+) -> Tuple[np.ndarray, SeasonalTrendFit]:
+    # Next `steps` months of every metric for every customer:
+    # customer ids (N,) and a fit whose arrays are (N, metrics, ...)
+    ts = build_time_series_tensor(df, features=metrics, align="left", dtype=float)
+    return ts.customer_ids, fit_seasonal_trend_batch(ts.values.transpose(0, 2, 1), steps=steps)
@@ -0,0 +1,184 @@
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from tslearn.preprocessing import TimeSeriesScalerMeanVariance
+
+from src.config import AppPaths, DTWSettings
+from src.dataset import apply_schema
+from src.storage import (
+    append_enriched, append_raw, ensure_enriched_dataset, load_centers, load_customer_state,
+    load_enriched, load_meta, load_series, save_customer_state,
+)
+from src.services.dtw_clustering import assign_to_centers
+from src.services.preprocessing import TIME_SERIES_FEATURES, _month_number, build_time_series_tensor
+from src.ui.tabs.churn_dashboard import INCREASE_THRESHOLDS, increase_count_column
+
+# Extra steps added to the series tensor when a customer outgrows it, so
+# that months can be written in place for a year before the file is rebuilt
+GROW_STEPS = 12
+
+
+def _pct_increase(prev: np.ndarray, curr: np.ndarray) -> np.ndarray:
+    # same formula as the churn dashboard
+    return (curr - prev) / np.maximum(prev, 1e-6)
+
+
+def build_customer_state(df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    # Running totals per customer and the raw left-aligned series tensor,
+    # built once from the full history
+    ts = build_time_series_tensor(df, features=TIME_SERIES_FEATURES, align="left")
+    codes = pd.Categorical(df["customer_id"].astype(str), categories=ts.customer_ids.astype(str)).codes
+    order = np.lexsort((df["date"].to_numpy(), codes))
+    codes = codes[order]
+    n = len(ts.customer_ids)
+
+    bills = df["bill_amount_eur"].to_numpy(dtype=float)[order]
+    last = np.r_[np.flatnonzero(codes[1:] != codes[:-1]), len(codes) - 1]
+    same = codes[1:] == codes[:-1]
+    pct = _pct_increase(bills[:-1], bills[1:])
+
+    state = pd.DataFrame({
+        "customer_id": ts.customer_ids.astype(str),
+        "months": np.bincount(codes, minlength=n),
+        "bill_sum": np.bincount(codes, weights=bills, minlength=n),
+        "overuse_months": np.bincount(codes, weights=df["overuse_flag"].to_numpy(dtype=float)[order], minlength=n),
+        "churned": np.bincount(codes, weights=df["churn_event"].to_numpy(dtype=float)[order], minlength=n) > 0,
+        "last_bill": bills[last],
+        "last_date": df["date"].to_numpy()[order][last],
+    })
+    for t in INCREASE_THRESHOLDS:
+        state[increase_count_column(t)] = np.bincount(codes[1:], weights=(pct > t) & same, minlength=n).astype(int)
+
+    if "dtw_cluster" in df.columns:
+        state["dtw_cluster"] = df["dtw_cluster"].to_numpy()[order][last].astype(int)
+    state["dtw_distance"] = np.nan
+    return state, ts.values
+
+
+def _load_or_build_state(paths: AppPaths):
+    state = load_customer_state(paths)
+    series = load_series(paths, writable=True)
+    if state is not None and series is not None and len(series) >= len(state):
+        return state, series
+
+    # first append after a full clustering run: one pass over the history
+    df, _ = load_enriched(paths)
+    if df is None or "dtw_cluster" not in df.columns:
+        raise ValueError("No clustered enriched dataset found. Run the full clustering once first.")
+    state, series = build_customer_state(df)
+    save_customer_state(state, paths, series=series)
+    return load_customer_state(paths), load_series(paths, writable=True)
+
+
+def _validate_month(records: pd.DataFrame, state: pd.DataFrame) -> pd.Timestamp:
+    month = _month_number(records)
+    if len(np.unique(month)) != 1:
+        raise ValueError("append_month expects the records of exactly one month.")
+    if records["customer_id"].duplicated().any():
+        raise ValueError("append_month expects at most one record per customer.")
+
+    date = records["date"].iloc[0]
+    known = state.set_index("customer_id")["last_date"]
+    last = known.reindex(records["customer_id"].astype(str)).to_numpy()
+    stale = ~pd.isna(last) & (pd.DatetimeIndex(last).to_period("M") >= date.to_period("M"))
+    if stale.any():
+        raise ValueError(
+            f"{int(stale.sum())} customers already have records for {date:%Y-%m} or later. "
+            f"Use assign_clusters.py to correct past months."
+        )
+    return date
+
+
+def append_month(
+    records: pd.DataFrame,
+    paths: AppPaths,
+    settings: Optional[DTWSettings] = None,
+) -> dict:
+    # Add one month of records: extend the affected customers' series, re-normalize
+    # and re-assign only them, update their running totals and append the rows.
+    start = time.perf_counter()
+    centers = load_centers(paths)
+    if centers is None:
+        raise ValueError("No saved DTW centers found. Run the full clustering once first.")
+    if settings is None:
+        settings = DTWSettings.from_meta((load_meta(paths) or {}).get("dtw"))
+    if not ensure_enriched_dataset(paths):
+        raise ValueError("No enriched dataset found. Run the full clustering once first.")
+
+    records = apply_schema(records)
+    state, series = _load_or_build_state(paths)
+    date = _validate_month(records, state)
+
+    # rows of the affected customers; new customers go at the end
+    customer_ids = records["customer_id"].astype(str).to_numpy()
+    index = pd.Index(state["customer_id"])
+    rows = index.get_indexer(customer_ids)
+    is_new = rows < 0
+    rows[is_new] = len(state) + np.arange(int(is_new.sum()))
+    if is_new.any():
+        new = pd.DataFrame({"customer_id": customer_ids[is_new]})
+        state = pd.concat([state, new], ignore_index=True)
+        for col, fill in [("months", 0), ("bill_sum", 0.0), ("overuse_months", 0.0), ("churned", False)]:
+            state[col] = state[col].fillna(fill)
+        for t in INCREASE_THRESHOLDS:
+            state[increase_count_column(t)] = state[increase_count_column(t)].fillna(0).astype(int)
+        state["months"] = state["months"].astype(int)
+        state["churned"] = state["churned"].astype(bool)
+
+    lengths = state["months"].to_numpy(dtype=int)
+    steps = lengths[rows]
+
+    # extend the series in place, or rebuild the file with room to grow
+    rebuilt = None
+    if len(state) > series.shape[0] or steps.max() >= series.shape[1]:
+        grown = np.full(
+            (len(state), max(series.shape[1], int(steps.max()) + GROW_STEPS), series.shape[2]),
+            np.nan,
+            dtype=series.dtype,
+        )
+        grown[:series.shape[0], :series.shape[1]] = series
+        series = rebuilt = grown
+    series[rows, steps] = records[TIME_SERIES_FEATURES].to_numpy(dtype=series.dtype)
+    if rebuilt is None:
+        series.flush()
+
+    # normalize the affected customers over their valid steps only
+    X = np.array(series[rows], dtype=np.float32)
+    X[np.arange(X.shape[1])[None, :] > steps[:, None]] = np.nan
+    X = TimeSeriesScalerMeanVariance().fit_transform(X)
+    labels, dists, _ = assign_to_centers(
+        X, centers, metric_params=settings.metric_params(), n_jobs=settings.n_jobs
+    )
+
+    # running totals used by the churn dashboard
+    bills = records["bill_amount_eur"].to_numpy(dtype=float)
+    prev = state["last_bill"].to_numpy(dtype=float)[rows]
+    pct = _pct_increase(prev, bills)
+    for t in INCREASE_THRESHOLDS:
+        col = increase_count_column(t)
+        state.loc[rows, col] = state[col].to_numpy()[rows] + ((pct > t) & ~is_new)
+    state.loc[rows, "months"] = steps + 1
+    state.loc[rows, "bill_sum"] = state["bill_sum"].to_numpy()[rows] + bills
+    state.loc[rows, "overuse_months"] = state["overuse_months"].to_numpy()[rows] + records["overuse_flag"].to_numpy(dtype=float)
+    state.loc[rows, "churned"] = state["churned"].to_numpy()[rows] | records["churn_event"].to_numpy(dtype=bool)
+    state.loc[rows, "last_bill"] = bills
+    state.loc[rows, "last_date"] = date
+    previous = state["dtw_cluster"].to_numpy()[rows]
+    state.loc[rows, "dtw_cluster"] = labels
+    state.loc[rows, "dtw_distance"] = dists
+    state["dtw_cluster"] = state["dtw_cluster"].astype(int)
+
+    # the raw dataset too, so that a full clustering run keeps the new month
+    append_raw(records, paths)
+    append_enriched(records.assign(dtw_cluster=labels), paths)
+    save_customer_state(state, paths, series=rebuilt)
+
+    return {
+        "month": f"{date:%Y-%m}",
+        "customers": len(records),
+        "new_customers": int(is_new.sum()),
+        "cluster_changes": int(np.sum(~is_new & (previous != labels))),
+        "seconds": time.perf_counter() - start,
+    }
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.services.memo import versioned
+from src.services.perf import timed
+
+
+@dataclass(frozen=True)
+class CustomerIndex:
+    # Table sorted by (cluster, customer, date) plus row offsets, so that a
+    # customer or a whole cluster is one contiguous slice of `df`.
+    df: pd.DataFrame
+    customer_ids: np.ndarray      # sorted customer ids
+    customer_start: np.ndarray    # first row of each customer in df
+    customer_stop: np.ndarray     # one past its last row
+    customer_labels: np.ndarray   # cluster of each customer (-1 when unclustered)
+    clusters: np.ndarray          # sorted cluster labels present in df
+    cluster_start: np.ndarray     # first row of each cluster in df
+    cluster_stop: np.ndarray
+    version: Optional[str] = None  # dataset version; views of a versioned index are memoizable
+
+    def _view(self, start: int, stop: int, view: tuple) -> pd.DataFrame:
+        out = self.df.iloc[int(start):int(stop)]
+        if self.version is not None:
+            versioned(out, self.version, view)
+        return out
+
+    def _customer_pos(self, customer_id) -> Optional[int]:
+        pos = int(np.searchsorted(self.customer_ids, str(customer_id)))
+        if pos < len(self.customer_ids) and self.customer_ids[pos] == str(customer_id):
+            return pos
+        return None
+
+    def customer(self, customer_id) -> pd.DataFrame:
+        # records of one customer, sorted by date
+        pos = self._customer_pos(customer_id)
+        if pos is None:
+            return self._view(0, 0, ("customer", str(customer_id)))
+        return self._view(self.customer_start[pos], self.customer_stop[pos], ("customer", str(customer_id)))
+
+    def _cluster_pos(self, cluster) -> Optional[int]:
+        pos = int(np.searchsorted(self.clusters, cluster))
+        if pos < len(self.clusters) and self.clusters[pos] == cluster:
+            return pos
+        return None
+
+    def cluster(self, cluster) -> pd.DataFrame:
+        # records of every customer of one cluster
+        pos = self._cluster_pos(cluster)
+        if pos is None:
+            return self._view(0, 0, ("cluster", int(cluster)))
+        return self._view(self.cluster_start[pos], self.cluster_stop[pos], ("cluster", int(cluster)))
+
+    def cluster_customers(self, cluster) -> np.ndarray:
+        return self.customer_ids[self.customer_labels == cluster]
+
+
+@timed
+def build_customer_index(
+    df: pd.DataFrame,
+    cluster_col: str = "dtw_cluster",
+    version: Optional[str] = None,
+) -> CustomerIndex:
+    # One sort at load time; every later customer / cluster view is a slice.
+    codes, customer_ids = pd.factorize(df["customer_id"].astype(str), sort=True)
+    customer_ids = np.asarray(customer_ids, dtype=object)
+    n_customers = len(customer_ids)
+
+    # a customer's label is the one of its first record, so its rows stay together
+    if cluster_col in df.columns and df[cluster_col].notna().any():
+        first = np.full(n_customers, len(codes))
+        np.minimum.at(first, codes, np.arange(len(codes)))
+        labels = df[cluster_col].to_numpy()[first]
+        customer_labels = np.where(pd.isna(labels), -1, labels).astype(int)
+    else:
+        customer_labels = np.full(n_customers, -1)
+
+    row_labels = customer_labels[codes]
+    order = np.lexsort((df["date"].to_numpy(), codes, row_labels))
+    sorted_df = df.take(order).reset_index(drop=True)
+    if version is not None:
+        versioned(sorted_df, version)
+    codes, row_labels = codes[order], row_labels[order]
+
+    block_start = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    customer_start = np.zeros(n_customers, dtype=np.int64)
+    customer_start[codes[block_start]] = block_start
+    customer_stop = customer_start + np.bincount(codes, minlength=n_customers)
+
+    clusters = np.unique(customer_labels[customer_labels >= 0])
+    return CustomerIndex(
+        df=sorted_df,
+        customer_ids=customer_ids,
+        customer_start=customer_start,
+        customer_stop=customer_stop,
+        customer_labels=customer_labels,
+        clusters=clusters,
+        cluster_start=np.searchsorted(row_labels, clusters, side="left"),
+        cluster_stop=np.searchsorted(row_labels, clusters, side="right"),
+        version=version,
+    )
@@ -0,0 +1,132 @@
+import csv
+import time
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+import pandas as pd
+
+from src.dataset import DATE_FORMAT, SCHEMA, read_csv_records, write_dataset_chunks
+
+# Column layout of the monthly exports (telecom_original.csv)
+RAW_COLUMNS = [
+    "customer_id",
+    "date",
+    "year",
+    "month",
+    "current_plan_type",
+    "base_price_eur",
+    "data_limit_mb",
+    "voice_limit_min",
+    "sms_limit",
+    "roaming_limit_mb",
+    "roaming_limit_min",
+    "data_usage_mb",
+    "voice_minutes",
+    "sms_count",
+    "roaming_data_mb",
+    "roaming_minutes",
+    "bill_amount_eur",
+    "overuse_flag",
+    "churn_event",
+]
+
+DEFAULT_CHUNK_ROWS = 200_000
+
+
+def read_header(path: Path) -> List[str]:
+    with open(path, newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def validate_columns(columns: List[str]) -> None:
+    missing = [c for c in RAW_COLUMNS if c not in columns]
+    unexpected = [c for c in columns if c not in RAW_COLUMNS]
+    if missing or unexpected:
+        raise ValueError(
+            f"CSV does not match the telecom_original.csv schema "
+            f"(missing: {missing or 'none'}, unexpected: {unexpected or 'none'})"
+        )
+
+
+def _row_bytes(path: Path, sample: int = 1 << 16) -> float:
+    # average line length of the first few KB, to size byte-based read blocks
+    with open(path, "rb") as f:
+        head = f.read(sample)
+    return len(head) / max(head.count(b"\n"), 1)
+
+
+def estimate_rows(path: Path) -> int:
+    # rows of a CSV export from its size, for progress reporting
+    return max(1, int(Path(path).stat().st_size / _row_bytes(path)) - 1)
+
+
+def _arrow_chunks(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    arrow_types = {
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "int16": pa.int16(),
+        "int32": pa.int32(),
+        "float32": pa.float32(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+    }
+    column_types = {c: arrow_types[t] for c, t in SCHEMA.items() if c in RAW_COLUMNS}
+    column_types["date"] = pa.timestamp("ns")
+
+    block_size = max(1 << 20, int(chunk_rows * _row_bytes(path)))
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types,
+            timestamp_parsers=[DATE_FORMAT],
+            include_columns=RAW_COLUMNS,
+        ),
+    )
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def _pandas_chunks(path: Path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    yield from read_csv_records(path, columns=RAW_COLUMNS, chunksize=chunk_rows)
+
+
+def iter_csv_chunks(path: Path, chunk_rows: int = DEFAULT_CHUNK_ROWS, engine: Optional[str] = None):
+    # Typed record chunks of about chunk_rows rows. engine: "pyarrow", "pandas"
+    # or None (pyarrow when it is installed).
+    if engine is None:
+        try:
+            import pyarrow.csv  # noqa: F401
+            engine = "pyarrow"
+        except ImportError:
+            engine = "pandas"
+    if engine == "pyarrow":
+        return _arrow_chunks(path, chunk_rows)
+    if engine == "pandas":
+        return _pandas_chunks(path, chunk_rows)
+    raise ValueError(f"Unknown engine: {engine!r}")
+
+
+def ingest_csv(
+    path: Path,
+    root: Path,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    engine: Optional[str] = None,
+    report: Optional[Callable[[int], None]] = None,
+) -> dict:
+    # Stream a raw export into the partitioned dataset at `root`, one chunk in memory at a time
+    validate_columns(read_header(path))
+    start = time.perf_counter()
+
+    def chunks():
+        rows = 0
+        for chunk in iter_csv_chunks(path, chunk_rows, engine):
+            rows += len(chunk)
+            if report is not None:
+                report(rows)
+            yield chunk
+
+    rows = write_dataset_chunks(chunks(), root)
+    return {"rows": rows, "seconds": time.perf_counter() - start, "output": str(root)}
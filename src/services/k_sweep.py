@@ -0,0 +1,123 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import AppPaths, DTWSettings
+from src.storage import (
+    dtw_cache_key, load_distance_cache, load_enriched, load_raw, save_sweep_result, save_sweep_summary,
+)
+from src.services.clustering_service import customer_center_distances, customer_pairwise_distances
+from src.services.preprocessing import build_time_series
+from src.services.dtw_clustering import center_silhouette_score, dtw_cluster, dtw_silhouette_score
+
+# Customer-to-customer distances (and the exact silhouette) only up to this many
+# customers: n * (n - 1) / 2 DTW computations, shared by every k of the sweep
+PAIRWISE_MAX_CUSTOMERS = 2_000
+# k values fitted by the sweep in the app
+SWEEP_KS = range(3, 11)
+
+Report = Callable[[float, str], None]
+
+
+def fit_k(
+    time_series_data: np.ndarray,
+    k: int,
+    settings: DTWSettings,
+    paths: AppPaths,
+    pairwise_key: Optional[str] = None,
+) -> dict:
+    start = time.perf_counter()
+    labels, model = dtw_cluster(time_series_data, k=k, settings=settings)
+    fit_seconds = time.perf_counter() - start
+
+    # cheap silhouette: k distances per customer instead of all pairs
+    center_dists = customer_center_distances(time_series_data, model.cluster_centers_, settings, paths)
+    # exact one from the cached pairwise distances, read from the memmap in place
+    pairwise = load_distance_cache("pairwise", pairwise_key, paths) if pairwise_key else None
+
+    return {
+        "k": int(k),
+        "labels": labels,
+        "centers": model.cluster_centers_,
+        "inertia": float(model.inertia_),
+        "silhouette": center_silhouette_score(center_dists, labels),
+        "dtw_silhouette": dtw_silhouette_score(pairwise, labels) if pairwise is not None else None,
+        "n_iter": int(model.n_iter_),
+        "fit_seconds": round(fit_seconds, 2),
+    }
+
+
+def run_k_sweep(
+    df: pd.DataFrame,
+    ks: Iterable[int],
+    settings: DTWSettings,
+    paths: AppPaths,
+    workers: Optional[int] = None,
+    report: Optional[Report] = None,
+) -> pd.DataFrame:
+    # Fit every k in its own worker process and store each result as a versioned
+    # artifact. report(progress, status) gets the overall progress in [0, 1].
+    report = report or (lambda progress, status: None)
+    time_series_data, customer_ids = build_time_series(df)
+    version = dtw_cache_key(time_series_data, settings)
+    ks = [int(k) for k in ks]
+
+    # computed once (or read from the cache) and shared by every k; stored under
+    # the same key as the sweep version
+    pairwise_key = None
+    if len(time_series_data) <= PAIRWISE_MAX_CUSTOMERS:
+        report(0.0, "Customer-to-customer distances")
+        customer_pairwise_distances(time_series_data, settings, paths)
+        pairwise_key = version
+
+    # the DTW work inside each fit stays single-threaded: the pool owns the cores
+    fit_settings = DTWSettings(**{**settings.to_meta(), "n_jobs": None})
+    start = 0.3 if pairwise_key else 0.0
+    report(start, f"Fitting k = {ks[0]}…{ks[-1]}")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        fits = pool.map(
+            fit_k,
+            [time_series_data] * len(ks),
+            ks,
+            [fit_settings] * len(ks),
+            [paths] * len(ks),
+            [pairwise_key] * len(ks),
+        )
+        for r in fits:
+            results.append(r)
+            report(start + (1.0 - start) * len(results) / len(ks), f"k={r['k']} fitted")
+
+    summary = []
+    for r in results:
+        cluster_df = pd.DataFrame({"customer_id": customer_ids, "dtw_cluster": r["labels"]})
+        stats = {key: r[key] for key in ("k", "inertia", "silhouette", "dtw_silhouette", "n_iter", "fit_seconds")}
+        save_sweep_result(version, r["k"], cluster_df, r["centers"], paths)
+        summary.append(stats)
+
+    save_sweep_summary(version, summary, settings, paths)
+    return pd.DataFrame(summary)
+
+
+def run_saved_k_sweep(
+    paths: AppPaths,
+    ks: Iterable[int],
+    settings: DTWSettings,
+    report: Optional[Report] = None,
+) -> pd.DataFrame:
+    # The sweep over the dataset the app shows (enriched, else raw), loaded here
+    # so a worker process gets only the paths
+    df, _ = load_enriched(paths)
+    if df is None:
+        df = load_raw(paths)
+    return run_k_sweep(df, ks, settings, paths, report=report)
+
+
+def sweep_request_key(version: str, settings: DTWSettings) -> str:
+    # Identical sweeps: same data version, same DTW window
+    window = json.dumps(settings.metric_params(), sort_keys=True)
+    return f"k-sweep:{version}:{window}"
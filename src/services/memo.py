@@ -0,0 +1,208 @@
+import functools
+import inspect
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Process-wide memoization of tab-level computations. Entries are keyed by the
+# dataset version and view of every DataFrame argument plus the other call
+# parameters; frames without a version (e.g. ad-hoc filters) are never cached.
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def versioned(df: pd.DataFrame, version: str, view: tuple = ("all",)) -> pd.DataFrame:
+    # Mark a frame (or an iloc[start:stop] slice of a marked frame, see
+    # CustomerIndex) as the given view of a dataset version
+    start = int(df.index[0]) if len(df) else 0
+    df.attrs["dataset_version"] = version
+    df.attrs["view"] = tuple(view) + (start, start + len(df))
+    return df
+
+
+def _frame_key(df: pd.DataFrame) -> tuple:
+    version = df.attrs.get("dataset_version")
+    view = df.attrs.get("view")
+    if version is None or view is None:
+        raise _Uncacheable
+    # derived frames inherit attrs: only the exact rows the view describes qualify
+    start, stop = view[-2:]
+    if len(df) != stop - start:
+        raise _Uncacheable
+    if len(df) and not (df.index[0] == start and df.index[-1] == stop - 1):
+        raise _Uncacheable
+    return ("frame", version, view, tuple(df.columns))
+
+
+def _freeze(value: Any):
+    if isinstance(value, pd.DataFrame):
+        return _frame_key(value)
+    if hasattr(value, "cache_key"):
+        # versioned artifacts (e.g. the aggregate cube) name themselves
+        return value.cache_key
+    if value is None or isinstance(value, (str, bytes, bool, int, float, np.integer, np.floating)):
+        return value
+    if isinstance(value, dict):
+        return ("dict",) + tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return ("set",) + tuple(sorted(_freeze(v) for v in value))
+    if isinstance(value, np.ndarray) and value.size <= 4096:
+        return ("array", value.shape, str(value.dtype), value.tobytes())
+    raise _Uncacheable
+
+
+def _sizeof(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _copy(value: Any):
+    # callers get their own copy, so mutating a result never corrupts the cache
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_copy(v) for v in value)
+    return value
+
+
+class MemoCache:
+    # LRU bounded by total estimated bytes and by number of entries
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, name: str, field: str) -> None:
+        stats = self._stats.setdefault(name, {"hits": 0, "misses": 0, "bypassed": 0, "evictions": 0})
+        stats[field] += 1
+
+    def get(self, name: str, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count(name, "misses")
+                return False, None
+            self._entries.move_to_end(key)
+            self._count(name, "hits")
+            return True, entry[0]
+
+    def put(self, name: str, key: tuple, value: Any) -> None:
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._count(evicted_key[0], "evictions")
+
+    def bypass(self, name: str) -> None:
+        with self._lock:
+            self._count(name, "bypassed")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [{"function": name, **counts} for name, counts in sorted(self._stats.items())]
+            sizes: Dict[str, list] = {}
+            for key, (_, size) in self._entries.items():
+                sizes.setdefault(key[0], []).append(size)
+        out = pd.DataFrame(rows, columns=["function", "hits", "misses", "bypassed", "evictions"])
+        out["entries"] = out["function"].map(lambda f: len(sizes.get(f, []))).astype(int)
+        out["bytes"] = out["function"].map(lambda f: sum(sizes.get(f, []))).astype(int)
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+
+_cache = MemoCache()
+
+
+def memoize(
+    fn: Optional[Callable] = None,
+    *,
+    cache: Optional[MemoCache] = None,
+    resolve: Optional[Dict[str, Callable[[], Any]]] = None,
+):
+    # @memoize on a function whose DataFrame arguments come from a versioned
+    # dataset; any other call runs the function unchanged. `resolve` maps
+    # arguments that default to None to a lookup (e.g. catalog=get_catalog) run
+    # before the key is built, so the value the call uses is part of the key.
+    def decorate(f: Callable):
+        name = f"{f.__module__}.{f.__qualname__}"
+        signature = inspect.signature(f) if resolve else None
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if resolve:
+                bound = signature.bind(*args, **kwargs)
+                for arg, lookup in resolve.items():
+                    if bound.arguments.get(arg) is None:
+                        bound.arguments[arg] = lookup()
+                args, kwargs = bound.args, bound.kwargs
+
+            store = cache or _cache
+            try:
+                key = (name, _freeze(args), _freeze(kwargs))
+            except _Uncacheable:
+                store.bypass(name)
+                return f(*args, **kwargs)
+
+            found, value = store.get(name, key)
+            if not found:
+                value = f(*args, **kwargs)
+                store.put(name, key, value)
+            return _copy(value)
+
+        wrapper.uncached = f
+        return wrapper
+
+    return decorate(fn) if fn is not None else decorate
+
+
+def memo_stats() -> pd.DataFrame:
+    return _cache.stats()
+
+
+def memo_nbytes() -> int:
+    return _cache.nbytes
+
+
+def clear_memo() -> None:
+    _cache.clear()
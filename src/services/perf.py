@@ -0,0 +1,147 @@
+import functools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Timing spans around the hot paths (storage, services, tab rendering).
+# Spans are only recorded on a thread that has a Recorder activated: the
+# Streamlit script thread of a session with the Performance panel open.
+# Everywhere else @timed costs one thread-local lookup.
+
+MAX_RUNS = 200
+_local = threading.local()
+
+
+class Recorder:
+    # Spans of the last MAX_RUNS reruns of one session
+    def __init__(self, max_runs: int = MAX_RUNS):
+        self.runs: deque = deque(maxlen=max_runs)
+        self._origin = time.perf_counter()
+        self._spans: Optional[list] = None
+        self._depth = 0
+
+    def begin_run(self) -> None:
+        self._spans = []
+        self._depth = 0
+        self.runs.append({"started": time.time(), "spans": self._spans})
+
+    def end_run(self) -> None:
+        self._spans = None
+
+    def _record(self, name: str, start: float, seconds: float, depth: int) -> None:
+        if self._spans is not None:
+            self._spans.append((name, start - self._origin, seconds, depth))
+
+    def last_run(self) -> pd.DataFrame:
+        # time per span name in the latest complete run
+        spans = self.runs[-1]["spans"] if self.runs else []
+        df = pd.DataFrame(spans, columns=["span", "start", "seconds", "depth"])
+        out = df.groupby("span").agg(calls=("seconds", "size"), total_ms=("seconds", "sum"))
+        out["total_ms"] *= 1000
+        return out.sort_values("total_ms", ascending=False)
+
+    def summary(self) -> pd.DataFrame:
+        # per span name: time per rerun (summed over calls) and its percentiles
+        # over the session's reruns
+        per_run: Dict[str, List[float]] = {}
+        for run in self.runs:
+            totals: Dict[str, float] = {}
+            for name, _, seconds, _ in run["spans"]:
+                totals[name] = totals.get(name, 0.0) + seconds
+            for name, total in totals.items():
+                per_run.setdefault(name, []).append(total * 1000)
+
+        rows = []
+        for name, values in per_run.items():
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            rows.append((name, len(values), p50, p90, p99, max(values)))
+        out = pd.DataFrame(rows, columns=["span", "runs", "p50_ms", "p90_ms", "p99_ms", "max_ms"])
+        return out.sort_values("p50_ms", ascending=False).reset_index(drop=True)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "runs": [
+                {
+                    "started": run["started"],
+                    "spans": [
+                        {"name": n, "start_ms": s * 1000, "duration_ms": d * 1000, "depth": depth}
+                        for n, s, d, depth in run["spans"]
+                    ],
+                }
+                for run in self.runs
+            ],
+            "summary": self.summary().to_dict(orient="records"),
+        })
+
+    def to_chrome_trace(self) -> str:
+        # Trace Event Format: open in chrome://tracing or https://ui.perfetto.dev;
+        # each rerun is its own track
+        events = []
+        for i, run in enumerate(self.runs):
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": i, "args": {"name": f"rerun {i}"}})
+            for name, start, seconds, _ in run["spans"]:
+                events.append({
+                    "name": name,
+                    "cat": name.split(".", 1)[0],
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": i,
+                    "ts": start * 1e6,
+                    "dur": seconds * 1e6,
+                })
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+def activate(recorder: Optional[Recorder]) -> None:
+    # record this thread's spans into `recorder` (None: stop recording)
+    _local.recorder = recorder
+
+
+def active() -> Optional[Recorder]:
+    return getattr(_local, "recorder", None)
+
+
+@contextmanager
+def span(name: str):
+    recorder = getattr(_local, "recorder", None)
+    if recorder is None:
+        yield
+        return
+    depth = recorder._depth
+    recorder._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder._depth = depth
+        recorder._record(name, start, time.perf_counter() - start, depth)
+
+
+def timed(fn: Optional[Callable] = None, *, name: Optional[str] = None):
+    # @timed: a span around every call, named <module>.<function> unless `name` is given
+    def decorate(f: Callable):
+        label = name or f"{f.__module__.rsplit('.', 1)[-1]}.{f.__qualname__}"
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            recorder = getattr(_local, "recorder", None)
+            if recorder is None:
+                return f(*args, **kwargs)
+            depth = recorder._depth
+            recorder._depth += 1
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                recorder._depth = depth
+                recorder._record(label, start, time.perf_counter() - start, depth)
+
+        return wrapper
+
+    return decorate(fn) if fn is not None else decorate
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import AppPaths, DTWSettings
+from src.storage import (
+    aggregates_file, atomic_write, data_version, fingerprint, load_enriched, load_pipeline_state,
+    load_raw, save_clustering, save_pipeline_state,
+)
+from src.services import perf
+from src.services.aggregates import cube_key, load_or_build_cube
+from src.services.clustering_service import apply_cluster_labels
+from src.services.dtw_clustering import MAX_ITER, dtw_cluster
+from src.services.ingest import estimate_rows, ingest_csv
+from src.services.preprocessing import build_time_series
+
+# ingest -> timeseries -> cluster -> label -> aggregates, the artifacts the app
+# reads. Each stage records in data/pipeline/state.json a key of its inputs and
+# a fingerprint of its outputs; while both still match the stage is skipped, so
+# a failed or repeated run resumes at the first stage that is out of date.
+# The raw dataset also receives the months added by append_month.py and
+# assign_clusters.py: the later stages are keyed by its contents, and it is
+# re-ingested only when the CSV export itself changes.
+STAGES = ["ingest", "timeseries", "cluster", "label", "aggregates"]
+# share of the overall progress per stage
+WEIGHTS = {"ingest": 0.10, "timeseries": 0.05, "cluster": 0.70, "label": 0.10, "aggregates": 0.05}
+
+Report = Callable[[float, str], None]
+
+
+def checkpoint_files(paths: AppPaths) -> Dict[str, Path]:
+    d = paths.pipeline_dir
+    return {
+        "series": d / "series.npy",
+        "customer_ids": d / "customer_ids.npy",
+        "clusters": d / "clusters.parquet",
+        "centers": d / "centers.npy",
+    }
+
+
+def _key(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+
+class _Run:
+    # inputs of one pipeline run; the raw records are loaded at most once
+    def __init__(self, paths: AppPaths, k: int, settings: DTWSettings, stages: dict):
+        self.paths = paths
+        self.k = int(k)
+        self.settings = settings
+        self.stages = stages
+        self.files = checkpoint_files(paths)
+        self._raw: Optional[pd.DataFrame] = None
+
+    def raw(self, step: Report) -> pd.DataFrame:
+        if self._raw is None:
+            step(0.0, "loading records")
+            self._raw = load_raw(self.paths)
+        return self._raw
+
+    def output(self, stage: str) -> Optional[str]:
+        return self.stages.get(stage, {}).get("output")
+
+
+def _stage_key(stage: str, run: _Run) -> str:
+    if stage == "ingest":
+        return fingerprint([run.paths.raw_data])
+    if stage == "timeseries":
+        return _key(fingerprint([run.paths.raw_dataset]))
+    if stage == "cluster":
+        return _key(run.output("timeseries"), run.k, run.settings.metric_params())
+    if stage == "label":
+        return _key(run.output("cluster"), fingerprint([run.paths.raw_dataset]), run.settings.to_meta())
+    return data_version(run.paths)
+
+
+def _stage_outputs(stage: str, run: _Run) -> List[Path]:
+    paths, files = run.paths, run.files
+    if stage == "ingest":
+        return [paths.raw_dataset]
+    if stage == "timeseries":
+        return [files["series"], files["customer_ids"]]
+    if stage == "cluster":
+        return [files["clusters"], files["centers"]]
+    if stage == "label":
+        return [paths.enriched_dataset, paths.enriched_parquet, paths.enriched_csv, paths.centers_file, paths.meta_file]
+    return [aggregates_file(cube_key(data_version(paths)), paths)]
+
+
+def _newest_file(root: Path) -> int:
+    return max((f.stat().st_mtime_ns for f in root.rglob("*.parquet")), default=0)
+
+
+def _up_to_date(stage: str, run: _Run, key: str, previous: Optional[dict]) -> bool:
+    if stage == "ingest":
+        # appended months change the dataset, not the export it was ingested from
+        paths = run.paths
+        if not paths.raw_dataset.is_dir():
+            return False
+        if previous:
+            return previous.get("key") == key
+        # ingested (or extended) outside the pipeline: kept unless the export is newer
+        return not paths.raw_data.exists() or _newest_file(paths.raw_dataset) >= paths.raw_data.stat().st_mtime_ns
+    return bool(previous) and previous.get("key") == key \
+        and previous.get("output") == fingerprint(_stage_outputs(stage, run))
+
+
+def _ingest(run: _Run, step: Report) -> dict:
+    source = run.paths.raw_data
+    if not source.exists():
+        if not run.paths.raw_dataset.is_dir():
+            raise ValueError(f"No raw data found: {source} does not exist and nothing was ingested yet.")
+        step(1.0, "no CSV export, keeping the ingested dataset")
+        return {}
+    total = estimate_rows(source)
+    stats = ingest_csv(
+        source, run.paths.raw_dataset,
+        report=lambda rows: step(min(rows / total, 1.0), f"{rows:,} rows converted"),
+    )
+    return {"rows": stats["rows"]}
+
+
+def _timeseries(run: _Run, step: Report) -> dict:
+    df = run.raw(step)
+    step(0.5, f"building the series of {df['customer_id'].nunique():,} customers")
+    series, customer_ids = build_time_series(df)
+
+    run.paths.pipeline_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(run.files["series"], lambda p: np.save(p, series))
+    atomic_write(run.files["customer_ids"], lambda p: np.save(p, np.asarray(customer_ids, dtype=str)))
+    return {"customers": len(customer_ids), "steps": int(series.shape[1])}
+
+
+def _cluster(run: _Run, step: Report) -> dict:
+    series = np.load(run.files["series"], allow_pickle=False)
+    customer_ids = np.load(run.files["customer_ids"], allow_pickle=False)
+    step(0.0, f"DTW k-means (k={run.k}) over {len(customer_ids):,} customers")
+
+    def iteration(n: int, inertia: float) -> None:
+        # at most MAX_ITER k-means iterations, then one final labelling pass
+        step(n / (MAX_ITER + 1), f"iteration {min(n, MAX_ITER)}/{MAX_ITER}, inertia {inertia:.4f}")
+
+    labels, model = dtw_cluster(series, k=run.k, settings=run.settings, on_iteration=iteration)
+
+    cluster_df = pd.DataFrame({"customer_id": customer_ids.astype(object), "dtw_cluster": labels})
+    atomic_write(run.files["clusters"], lambda p: cluster_df.to_parquet(p, index=False))
+    atomic_write(run.files["centers"], lambda p: np.save(p, model.cluster_centers_))
+    return {"k": run.k, "inertia": float(model.inertia_), "n_iter": int(model.n_iter_)}
+
+
+def _label(run: _Run, step: Report) -> dict:
+    df = run.raw(step)
+    cluster_df = pd.read_parquet(run.files["clusters"])
+    centers = np.load(run.files["centers"], allow_pickle=False)
+
+    step(0.3, "applying cluster labels")
+    labeled = apply_cluster_labels(df, cluster_df)
+
+    step(0.6, "saving centers and enriched dataset")
+    fmt, path = save_clustering(
+        labeled, centers, run.k, run.paths,
+        settings=run.settings,
+        cluster_sizes=cluster_df["dtw_cluster"].value_counts().reindex(range(run.k), fill_value=0),
+    )
+    return {"format": fmt, "path": path}
+
+
+def _aggregates(run: _Run, step: Report) -> dict:
+    # the cube the app looks up for the enriched dataset's version
+    step(0.0, "loading enriched dataset")
+    df, _ = load_enriched(run.paths)
+    step(0.5, "building cluster x month x plan aggregates")
+    load_or_build_cube(df, data_version(run.paths), run.paths)
+    return {}
+
+
+RUNNERS: Dict[str, Callable[[_Run, Report], dict]] = {
+    "ingest": _ingest,
+    "timeseries": _timeseries,
+    "cluster": _cluster,
+    "label": _label,
+    "aggregates": _aggregates,
+}
+
+
+def pipeline_status(paths: AppPaths) -> pd.DataFrame:
+    # last recorded run of every stage
+    stages = load_pipeline_state(paths).get("stages", {})
+    rows = []
+    for s in STAGES:
+        rec = stages.get(s, {})
+        details = {k: v for k, v in rec.items() if k not in ("key", "output", "seconds", "finished")}
+        rows.append({
+            "stage": s,
+            "finished": rec.get("finished", "never"),
+            "seconds": rec.get("seconds"),
+            "details": ", ".join(f"{k}={v}" for k, v in details.items()),
+        })
+    return pd.DataFrame(rows)
+
+
+def run_pipeline(
+    paths: AppPaths,
+    k: int,
+    settings: Optional[DTWSettings] = None,
+    report: Optional[Report] = None,
+    force: Optional[str] = None,
+) -> List[dict]:
+    # Run the out-of-date stages (and every stage from `force` on). report(progress, status)
+    # gets the overall progress in [0, 1]. Returns one row per stage: ran or up to date, seconds.
+    settings = settings or DTWSettings()
+    report = report or (lambda progress, status: None)
+    if force is not None and force not in STAGES:
+        raise ValueError(f"Unknown stage: {force!r} (stages: {', '.join(STAGES)})")
+
+    state = load_pipeline_state(paths)
+    stages = state.setdefault("stages", {})
+    run = _Run(paths, k, settings, stages)
+    results = []
+    done = 0.0
+
+    for i, name in enumerate(STAGES):
+        weight = WEIGHTS[name]
+
+        def step(fraction: float, status: str, done=done, weight=weight, i=i, name=name) -> None:
+            report(done + weight * min(max(fraction, 0.0), 1.0), f"[{i + 1}/{len(STAGES)}] {name}: {status}")
+
+        key = _stage_key(name, run)
+        previous = stages.get(name)
+        forced = force is not None and i >= STAGES.index(force)
+        if not forced and _up_to_date(name, run, key, previous):
+            step(1.0, "up to date")
+            results.append({"stage": name, "status": "up to date", "seconds": 0.0})
+        else:
+            step(0.0, "starting")
+            start = time.perf_counter()
+            with perf.span(f"pipeline.{name}"):
+                info = RUNNERS[name](run, step)
+            seconds = time.perf_counter() - start
+            # checkpoint: recorded only once the stage's outputs are complete
+            stages[name] = {
+                "key": key,
+                "output": fingerprint(_stage_outputs(name, run)),
+                "seconds": round(seconds, 3),
+                "finished": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                **info,
+            }
+            save_pipeline_state(state, paths)
+            step(1.0, f"done in {seconds:.1f}s")
+            results.append({"stage": name, "status": "ran", "seconds": seconds})
+        done += weight
+
+    return results
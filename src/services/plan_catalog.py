@@ -0,0 +1,175 @@
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.services.memo import clear_memo
+from src.ui.tabs.plans import COSTS, PLAN_LIMITS
+
+# Usage columns, the plan limit they are checked against and the overage rate
+# they are billed at, in the same order (the last axis of every limits array)
+USAGE_COLUMNS = [
+    "data_usage_mb",
+    "voice_minutes",
+    "sms_count",
+    "roaming_data_mb",
+    "roaming_minutes",
+]
+LIMIT_KEYS = [
+    "data_limit_mb",
+    "voice_limit_min",
+    "sms_limit",
+    "roaming_limit_mb",
+    "roaming_limit_min",
+]
+COST_KEYS = [
+    "extra_data_per_mb",
+    "extra_voice_per_min",
+    "extra_sms_per_unit",
+    "extra_roaming_mb",
+    "extra_roaming_min",
+]
+
+# Set to a .csv / .parquet / .npz file to price against another catalog
+CATALOG_ENV = "TELECOM_PLAN_CATALOG"
+
+
+def plan_dtype(name_len: int) -> np.dtype:
+    return np.dtype([
+        ("name", f"U{max(int(name_len), 1)}"),
+        ("base_price_eur", "f8"),
+        ("limits", "f8", (len(LIMIT_KEYS),)),
+    ])
+
+
+@dataclass(frozen=True)
+class PlanCatalog:
+    # One structured record per plan; plans["limits"] is the (P, 5) limits
+    # matrix and rates the overage price of each usage metric
+    plans: np.ndarray
+    rates: np.ndarray
+
+    @cached_property
+    def names(self) -> List[str]:
+        return self.plans["name"].tolist()
+
+    @property
+    def base(self) -> np.ndarray:
+        return self.plans["base_price_eur"]
+
+    @property
+    def limits(self) -> np.ndarray:
+        return self.plans["limits"]
+
+    @cached_property
+    def _positions(self) -> Dict[str, int]:
+        return {name: i for i, name in enumerate(self.names)}
+
+    @cached_property
+    def cache_key(self) -> tuple:
+        # identifies the catalog in memoized calls (src/services/memo.py)
+        h = hashlib.sha1(self.plans.tobytes())
+        h.update(self.rates.tobytes())
+        return ("plans", h.hexdigest())
+
+    def __len__(self) -> int:
+        return len(self.plans)
+
+    def positions(self, names: Sequence[str]) -> np.ndarray:
+        # row of each plan name, -1 for names not in the catalog
+        return np.array([self._positions.get(str(n), -1) for n in names], dtype=int)
+
+    def subset(self, names: Optional[Sequence[str]]) -> "PlanCatalog":
+        if names is None:
+            return self
+        pos = self.positions(names)
+        if (pos < 0).any():
+            missing = [n for n, p in zip(names, pos) if p < 0]
+            raise KeyError(f"Unknown plans: {missing}")
+        return PlanCatalog(plans=self.plans[pos], rates=self.rates)
+
+    def plan(self, name: str) -> dict:
+        # one plan in the PLAN_LIMITS layout
+        row = self.plans[self._positions[name]]
+        return {
+            **{k: float(v) for k, v in zip(LIMIT_KEYS, row["limits"])},
+            "base_price_eur": float(row["base_price_eur"]),
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        out = pd.DataFrame(self.limits, columns=LIMIT_KEYS)
+        out.insert(0, "base_price_eur", self.base)
+        out.insert(0, "plan", self.names)
+        return out
+
+    def costs(self) -> Dict[str, float]:
+        return dict(zip(COST_KEYS, self.rates.tolist()))
+
+
+def catalog_from_frame(plans: pd.DataFrame, costs: Dict[str, float] = COSTS) -> PlanCatalog:
+    # plans: one row per plan with "plan", "base_price_eur" and the LIMIT_KEYS columns
+    missing = [c for c in ["plan", "base_price_eur"] + LIMIT_KEYS if c not in plans.columns]
+    if missing:
+        raise ValueError(f"Plan catalog is missing columns: {missing}")
+    names = plans["plan"].astype(str).to_numpy()
+    if len(set(names)) != len(names):
+        raise ValueError("Plan catalog has duplicate plan names.")
+
+    out = np.zeros(len(plans), dtype=plan_dtype(max((len(n) for n in names), default=1)))
+    out["name"] = names
+    out["base_price_eur"] = plans["base_price_eur"].to_numpy(dtype=float)
+    out["limits"] = plans[LIMIT_KEYS].to_numpy(dtype=float)
+    return PlanCatalog(plans=out, rates=np.array([costs[k] for k in COST_KEYS], dtype=float))
+
+
+def catalog_from_dicts(
+    plan_limits: Dict[str, dict] = PLAN_LIMITS,
+    costs: Dict[str, float] = COSTS,
+) -> PlanCatalog:
+    plans = pd.DataFrame.from_dict(plan_limits, orient="index").rename_axis("plan").reset_index()
+    return catalog_from_frame(plans, costs)
+
+
+def load_catalog(path: Path, costs: Dict[str, float] = COSTS) -> PlanCatalog:
+    # .npz written by save_catalog (plans + rates), or a .csv / .parquet plan
+    # table priced with `costs`
+    path = Path(path)
+    if path.suffix == ".npz":
+        with np.load(path) as f:
+            return PlanCatalog(plans=f["plans"], rates=f["rates"])
+    if path.suffix == ".parquet":
+        return catalog_from_frame(pd.read_parquet(path), costs)
+    return catalog_from_frame(pd.read_csv(path), costs)
+
+
+def save_catalog(catalog: PlanCatalog, path: Path) -> None:
+    np.savez(path, plans=catalog.plans, rates=catalog.rates)
+
+
+DEFAULT_CATALOG = catalog_from_dicts()
+
+_lock = threading.Lock()
+_loaded: Dict[str, tuple] = {}
+
+
+def get_catalog() -> PlanCatalog:
+    # The catalog every pricing path uses: the file named by $TELECOM_PLAN_CATALOG
+    # (re-read when it changes), else the built-in plans
+    path = os.environ.get(CATALOG_ENV)
+    if not path:
+        return DEFAULT_CATALOG
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _loaded.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, load_catalog(Path(path)))
+            _loaded[path] = cached
+            # memoized recommendations were priced with the previous catalog
+            clear_memo()
+        return cached[1]
@@ -0,0 +1,235 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.services.billing import USAGE_COLUMNS, simulate_plans
+from src.services.fleet_recommendation import CHUNK_CELLS
+from src.services.plan_catalog import PlanCatalog, get_catalog
+from src.services.preprocessing import build_time_series_tensor
+
+# Candidate catalogs are scored as if every customer moved to their cheapest
+# stable plan (recommend_plans_churn_rule_based) and kept their real monthly
+# usage. Bills follow simulate_bill and the stability rule follows
+# unexpected_bill_increase_metrics, computed for all customers and plans at once.
+INCREASE_PCT = 0.25
+MAX_UNEXPECTED_INCREASE_RATE = 0.10
+MIN_MONTHS = 3
+
+
+@dataclass(frozen=True)
+class Candidate:
+    label: str
+    plan: str            # plan that was changed, "all" for the whole catalog
+    limit_scale: float
+    price_scale: float
+    catalog: PlanCatalog
+
+
+def scaled_catalog(
+    catalog: PlanCatalog,
+    limit_scale: float = 1.0,
+    price_scale: float = 1.0,
+    plans: Optional[Sequence[str]] = None,
+) -> PlanCatalog:
+    # limits and base price of `plans` (default: all) multiplied by the scales
+    out = catalog.plans.copy()
+    rows = np.arange(len(out)) if plans is None else catalog.positions(plans)
+    if (rows < 0).any():
+        raise KeyError(f"Unknown plans: {[p for p, r in zip(plans, rows) if r < 0]}")
+    out["limits"][rows] *= limit_scale
+    out["base_price_eur"][rows] *= price_scale
+    return PlanCatalog(plans=out, rates=catalog.rates)
+
+
+def candidate_grid(
+    catalog: PlanCatalog,
+    limit_scales: Sequence[float],
+    price_scales: Sequence[float],
+    plans: Optional[Sequence[str]] = None,
+    joint: bool = False,
+) -> List[Candidate]:
+    # One candidate per plan (or for all plans together with joint=True) and
+    # limit x price scale; the unchanged catalog is always the first, "base"
+    targets = ["all"] if joint else list(plans if plans is not None else catalog.names)
+    out = [Candidate("base", "all", 1.0, 1.0, catalog)]
+    for plan in targets:
+        for ls in limit_scales:
+            for ps in price_scales:
+                if ls == 1.0 and ps == 1.0:
+                    continue
+                out.append(Candidate(
+                    label=f"{plan} limits x{ls:g} price x{ps:g}",
+                    plan=plan,
+                    limit_scale=float(ls),
+                    price_scale=float(ps),
+                    catalog=scaled_catalog(catalog, ls, ps, None if plan == "all" else [plan]),
+                ))
+    return out
+
+
+def _changed_plans(base: PlanCatalog, candidate: PlanCatalog) -> Optional[np.ndarray]:
+    # plan rows that differ from the base catalog, None if everything must be re-priced
+    if len(base) != len(candidate) or not np.array_equal(base.rates, candidate.rates) \
+            or base.names != candidate.names:
+        return None
+    same = (base.limits == candidate.limits).all(axis=1) & (base.base == candidate.base)
+    return np.flatnonzero(~same)
+
+
+def plan_metrics(usage: np.ndarray, catalog: PlanCatalog, increase_pct: float) -> Dict[str, np.ndarray]:
+    # usage (n, T, 5) left-aligned records, NaN padding -> per customer and plan (n, P):
+    # bill total / mean / std, unexpected increases and overuse months
+    sim = simulate_plans(usage, catalog=catalog)
+    bills = sim["expected_bill_eur"]
+    valid = ~np.isnan(usage[:, :, 0])
+    months = valid.sum(axis=1)[:, None]
+
+    total = np.nansum(bills, axis=1)
+    mean = total / np.maximum(months, 1)
+    std = np.sqrt(np.nansum((bills - mean[:, None, :]) ** 2, axis=1) / np.maximum(months, 1))
+
+    prev, curr = bills[:, :-1], bills[:, 1:]
+    pairs = (valid[:, :-1] & valid[:, 1:])[:, :, None]
+    unexpected = ((curr - prev) / np.maximum(prev, 1e-6) > increase_pct) & pairs
+
+    return {
+        "total": total,
+        "mean": mean,
+        "std": std,
+        "increases": unexpected.sum(axis=1),
+        "overuse": sim["overuse_flag"].sum(axis=1),
+    }
+
+
+def _lex_argmin(keys: List[np.ndarray], allowed: np.ndarray) -> np.ndarray:
+    # per row: first column with the smallest keys[0], then keys[1], ... among `allowed`
+    keep = allowed.copy()
+    for key in keys:
+        k = np.where(keep, key, np.inf)
+        keep &= k == k.min(axis=1, keepdims=True)
+    return keep.argmax(axis=1)
+
+
+def choose_plans(
+    metrics: Dict[str, np.ndarray],
+    months: np.ndarray,
+    max_unexpected_increase_rate: float = MAX_UNEXPECTED_INCREASE_RATE,
+    min_months: int = MIN_MONTHS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Column of each customer's cheapest stable plan, in the order of
+    # recommend_plans_churn_rule_based (rounded the same way), and whether the
+    # customer has any stable plan at all
+    months = months[:, None]
+    has_rate = months >= min_months
+    avg = np.round(metrics["mean"], 2)
+    std = np.round(np.where(has_rate & (months >= 2), metrics["std"], 0.0), 2)
+    rate = np.round(metrics["increases"] / np.maximum(months - 1, 1), 3)
+    stable = has_rate & (rate <= max_unexpected_increase_rate)
+
+    any_stable = stable.any(axis=1)
+    cheapest_stable = _lex_argmin([avg, std, metrics["increases"]], stable)
+    fallback = _lex_argmin([np.where(has_rate, rate, np.inf), avg, std], np.ones_like(stable))
+    return np.where(any_stable, cheapest_stable, fallback), any_stable
+
+
+def evaluate_candidates(
+    df: pd.DataFrame,
+    candidates: List[Candidate],
+    increase_pct: float = INCREASE_PCT,
+    max_unexpected_increase_rate: float = MAX_UNEXPECTED_INCREASE_RATE,
+    min_months: int = MIN_MONTHS,
+    chunk_cells: int = CHUNK_CELLS,
+) -> pd.DataFrame:
+    # One row per candidate catalog: revenue, overuse and unexpected-increase
+    # exposure once every customer is on their chosen plan, and the plan mix.
+    # Customers are processed in blocks; within a block the first candidate is
+    # priced in full and the others only re-price the plans they change.
+    ts = build_time_series_tensor(df, features=USAGE_COLUMNS, align="left", dtype=float)
+    usage = ts.values
+    n_customers, T = usage.shape[:2]
+    base = candidates[0].catalog
+
+    sums = np.zeros((len(candidates), 6))  # revenue, months, overuse, increases, transitions, unstable
+    mix = [np.zeros(len(c.catalog), dtype=np.int64) for c in candidates]
+    chunk = max(1, chunk_cells // max(T * len(base), 1))
+
+    for start in range(0, n_customers, chunk):
+        block = usage[start:start + chunk]
+        months = (~np.isnan(block[:, :, 0])).sum(axis=1)
+        rows = np.arange(len(block))
+        base_metrics = plan_metrics(block, base, increase_pct)
+
+        for i, cand in enumerate(candidates):
+            changed = _changed_plans(base, cand.catalog)
+            if changed is None:
+                metrics = plan_metrics(block, cand.catalog, increase_pct)
+            elif len(changed) == 0:
+                metrics = base_metrics
+            else:
+                part = PlanCatalog(plans=cand.catalog.plans[changed], rates=cand.catalog.rates)
+                redone = plan_metrics(block, part, increase_pct)
+                metrics = {k: v.copy() for k, v in base_metrics.items()}
+                for k, v in redone.items():
+                    metrics[k][:, changed] = v
+
+            best, stable = choose_plans(metrics, months, max_unexpected_increase_rate, min_months)
+            sums[i] += [
+                metrics["total"][rows, best].sum(),
+                months.sum(),
+                metrics["overuse"][rows, best].sum(),
+                metrics["increases"][rows, best].sum(),
+                np.maximum(months - 1, 0).sum(),
+                (~stable).sum(),
+            ]
+            mix[i] += np.bincount(best, minlength=len(cand.catalog))
+
+    revenue, months, overuse, increases, transitions, unstable = sums.T
+    out = pd.DataFrame({
+        "candidate": [c.label for c in candidates],
+        "plan": [c.plan for c in candidates],
+        "limit_scale": [c.limit_scale for c in candidates],
+        "price_scale": [c.price_scale for c in candidates],
+        "revenue_eur": np.round(revenue, 2),
+        "avg_monthly_bill_eur": np.round(revenue / np.maximum(months, 1), 2),
+        "overuse_rate": overuse / np.maximum(months, 1),
+        "unexpected_increase_rate": increases / np.maximum(transitions, 1),
+        "unstable_customer_share": unstable / max(n_customers, 1),
+        "plan_mix": [
+            {name: int(n) for name, n in zip(c.catalog.names, counts) if n}
+            for c, counts in zip(candidates, mix)
+        ],
+    })
+    out.insert(5, "revenue_change_pct", np.round(100 * (revenue / max(revenue[0], 1e-9) - 1), 2))
+    return out
+
+
+def optimize_portfolio(
+    df: pd.DataFrame,
+    limit_scales: Sequence[float] = (0.8, 1.0, 1.25, 1.5),
+    price_scales: Sequence[float] = (0.9, 1.0, 1.1),
+    plans: Optional[Sequence[str]] = None,
+    joint: bool = False,
+    catalog: Optional[PlanCatalog] = None,
+    min_revenue_change_pct: float = 0.0,
+    increase_pct: float = INCREASE_PCT,
+    max_unexpected_increase_rate: float = MAX_UNEXPECTED_INCREASE_RATE,
+    min_months: int = MIN_MONTHS,
+) -> pd.DataFrame:
+    # Candidates ranked by unexpected-increase exposure; the ones whose revenue
+    # falls below `min_revenue_change_pct` against the base catalog go last
+    catalog = catalog or get_catalog()
+    results = evaluate_candidates(
+        df,
+        candidate_grid(catalog, limit_scales, price_scales, plans, joint),
+        increase_pct=increase_pct,
+        max_unexpected_increase_rate=max_unexpected_increase_rate,
+        min_months=min_months,
+    )
+    results["keeps_revenue"] = results["revenue_change_pct"] >= min_revenue_change_pct
+    return results.sort_values(
+        ["keeps_revenue", "unexpected_increase_rate", "unstable_customer_share", "revenue_change_pct"],
+        ascending=[False, True, True, False],
+        kind="stable",
+    ).reset_index(drop=True)
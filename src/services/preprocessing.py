@@ -1,31 +1,87 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
 import numpy as np
+import pandas as pd
 from tslearn.preprocessing import TimeSeriesScalerMeanVariance
 
-def build_time_series(df):
-    time_series_list = []
-    customer_ids = []
+TIME_SERIES_FEATURES = [
+    "data_usage_mb",
+    "voice_minutes",
+    "roaming_data_mb",
+    "bill_amount_eur",
+]
+
+
+@dataclass(frozen=True)
+class TimeSeriesTensor:
+    values: np.ndarray                  # (customers, steps, features), NaN where no record
+    mask: np.ndarray                    # (customers, steps), True where a record exists
+    customer_ids: np.ndarray            # customer id of each row of `values`
+    months: Optional[pd.DatetimeIndex]  # calendar month of each step ("calendar" layout only)
+
+
+def _month_number(df: pd.DataFrame) -> np.ndarray:
+    dates = pd.DatetimeIndex(df["date"])
+    return (dates.year * 12 + dates.month - 1).to_numpy()
 
-    for customer_id, customer_df in df.groupby("customer_id"):
-        # Ensure chronological order
-        customer_df = customer_df.sort_values("date")
 
-        customer_time_series = customer_df[[
-            "data_usage_mb",
-            "voice_minutes",
-            "roaming_data_mb",
-            "bill_amount_eur"
-        ]].values
+def build_time_series_tensor(
+    df: pd.DataFrame,
+    features: List[str] = TIME_SERIES_FEATURES,
+    align: str = "calendar",
+    dtype=np.float32,
+) -> TimeSeriesTensor:
+    # Scatter the long table straight into a padded tensor with index arithmetic.
+    #   align="calendar": step t is the t-th calendar month of the dataset, gaps stay NaN
+    #   align="left":     step t is the customer's t-th record, NaN padding at the end
+    #                     (the variable-length layout tslearn expects)
+    codes, customer_ids = pd.factorize(df["customer_id"], sort=True)
+    month = _month_number(df)
+    feats = np.column_stack([df[c].to_numpy(dtype=dtype) for c in features])
 
-        time_series_list.append(customer_time_series)
-        customer_ids.append(customer_id)
+    if align == "calendar":
+        first = int(month.min()) if len(month) else 0
+        step = month - first
+        n_steps = int(step.max()) + 1 if len(step) else 0
+        months = pd.date_range(
+            start=pd.Timestamp(year=first // 12, month=first % 12 + 1, day=1),
+            periods=n_steps,
+            freq="MS",
+        )
+    elif align == "left":
+        # single sort by (customer, month); position inside each customer block
+        order = np.lexsort((month, codes))
+        codes, feats = codes[order], feats[order]
+        starts = np.r_[0, np.flatnonzero(codes[1:] != codes[:-1]) + 1]
+        block_start = np.repeat(starts, np.diff(np.r_[starts, len(codes)]))
+        step = np.arange(len(codes)) - block_start
+        n_steps = int(step.max()) + 1 if len(step) else 0
+        months = None
+    else:
+        raise ValueError(f"Unknown align mode: {align!r}")
 
-    #Shape: (customers, time_steps, features)
-    time_series_data = np.array(time_series_list)
+    values = np.full((len(customer_ids), n_steps, len(features)), np.nan, dtype=dtype)
+    mask = np.zeros((len(customer_ids), n_steps), dtype=bool)
+    values[codes, step] = feats
+    mask[codes, step] = True
+
+    return TimeSeriesTensor(
+        values=values,
+        mask=mask,
+        customer_ids=np.asarray(customer_ids),
+        months=months,
+    )
+
+
+def build_time_series(df):
+    #Shape: (customers, time_steps, features), ragged customers NaN-padded at the end
+    ts = build_time_series_tensor(df, align="left")
 
     #normalize each customers time series (mean=0, variance=1)
     time_series_data = (
         TimeSeriesScalerMeanVariance()
-        .fit_transform(time_series_data)
+        .fit_transform(ts.values)
     )
 
-    return time_series_data, customer_ids
+    return time_series_data, list(ts.customer_ids)
@@ -0,0 +1,115 @@
+import multiprocessing
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Process-wide registry: every Streamlit session runs in a thread of the same
+# server process, so identical requests from different sessions meet here.
+_flights: Dict[str, "Flight"] = {}
+_lock = threading.Lock()
+
+
+@dataclass
+class Flight:
+    key: str
+    description: str = ""
+    started_at: float = field(default_factory=time.time)
+    progress: float = 0.0
+    status: str = "Queued"
+    result: Any = None
+    error: Optional[BaseException] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+    def report(self, progress: float, status: str) -> None:
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.status = status
+
+    @property
+    def running(self) -> bool:
+        return not self.done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+
+def _run(flight: Flight, fn: Callable[[Callable[[float, str], None]], Any]) -> None:
+    try:
+        flight.result = fn(flight.report)
+        flight.report(1.0, "Done")
+    except BaseException as e:
+        flight.error = e
+        flight.status = f"Failed: {e}"
+    finally:
+        flight.done.set()
+
+
+def _child(fn: Callable, args: tuple, messages) -> None:
+    try:
+        result = fn(*args, report=lambda progress, status: messages.put(("progress", progress, status)))
+        messages.put(("done", result))
+    except BaseException as e:
+        messages.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def in_worker_process(fn: Callable, *args) -> Callable[[Callable[[float, str], None]], Any]:
+    # fn(*args, report=...) run in a child process, for start(): the server process
+    # (and with it every session) stays responsive while it computes, and the
+    # child's progress reports are relayed to the flight. fn, args and the result
+    # must be picklable. The child is not a daemon, so fn may start its own
+    # process pool (the k-sweep does).
+    def run(report: Callable[[float, str], None]) -> Any:
+        ctx = multiprocessing.get_context("spawn")
+        messages = ctx.Queue()
+        process = ctx.Process(target=_child, args=(fn, args, messages))
+        process.start()
+        try:
+            while True:
+                try:
+                    message = messages.get(timeout=0.5)
+                except queue.Empty:
+                    if process.is_alive():
+                        continue
+                    try:
+                        message = messages.get(timeout=0.5)
+                    except queue.Empty:
+                        raise RuntimeError(f"Worker process exited with code {process.exitcode}")
+                if message[0] == "progress":
+                    report(message[1], message[2])
+                elif message[0] == "done":
+                    return message[1]
+                else:
+                    raise RuntimeError(message[1])
+        finally:
+            process.join(timeout=5)
+
+    return run
+
+
+def start(
+    key: str,
+    fn: Callable[[Callable[[float, str], None]], Any],
+    description: str = "",
+) -> Tuple[Flight, bool]:
+    # Start fn(report) in a background thread, or attach to the identical request
+    # already in flight. Returns the flight and whether this call started it.
+    with _lock:
+        flight = _flights.get(key)
+        if flight is not None and flight.running:
+            return flight, False
+        flight = Flight(key=key, description=description)
+        _flights[key] = flight
+
+    threading.Thread(target=_run, args=(flight, fn), daemon=True, name=f"flight-{key}").start()
+    return flight, True
+
+
+def get(key: str) -> Optional[Flight]:
+    with _lock:
+        return _flights.get(key)
+
+
+def running() -> List[Flight]:
+    with _lock:
+        return [f for f in _flights.values() if f.running]
@@ -0,0 +1,196 @@
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.dataset import write_dataset_chunks
+from src.services.billing import USAGE_COLUMNS, simulate_plans
+from src.services.plan_catalog import LIMIT_KEYS, PlanCatalog, get_catalog
+
+# Monthly records shaped like data/telecom_original.csv, with distributions
+# fitted on it: plan shares, per-customer usage levels (log-normal, data and
+# roaming correlated), month-of-year seasonality, month-to-month noise, one
+# churn event for about a fifth of the customers (more likely with frequent
+# overuse). Bills and overuse flags are priced with the plan catalog.
+COLUMNS = [
+    "customer_id", "date", "year", "month", "current_plan_type", "base_price_eur",
+    *LIMIT_KEYS, *USAGE_COLUMNS, "bill_amount_eur", "overuse_flag", "churn_event",
+]
+
+PLAN_SHARES = {
+    "Standard": 0.257,
+    "Basic": 0.239,
+    "Premium": 0.211,
+    "SuperPremium": 0.146,
+    "Youth": 0.098,
+    "Business": 0.049,
+}
+
+# per customer: mean and std of log monthly usage (data, voice, SMS, roaming MB)
+LOG_MEAN = np.array([8.71, 5.68, 4.66, 6.14])
+LOG_STD = np.array([0.59, 0.59, 0.52, 0.67])
+DATA_ROAMING_CORR = 0.32
+ROAMING_MIN_PER_MB = 0.02
+# month-to-month noise (log scale) per usage column
+MONTH_NOISE = np.array([0.22, 0.19, 0.21, 0.40, 0.44])
+# usage relative to the yearly mean per calendar month (rows) and usage column
+SEASONALITY = np.array([
+    [0.86, 0.99, 1.01, 0.86, 0.86],
+    [0.92, 0.98, 1.01, 0.93, 0.92],
+    [1.03, 1.00, 1.01, 1.03, 1.03],
+    [1.00, 0.99, 1.00, 1.00, 0.99],
+    [0.93, 0.99, 1.00, 0.93, 0.93],
+    [1.04, 1.03, 1.00, 1.04, 1.03],
+    [1.08, 1.03, 1.01, 1.07, 1.07],
+    [1.14, 1.03, 1.00, 1.14, 1.14],
+    [1.03, 0.99, 0.99, 1.05, 1.05],
+    [1.00, 0.98, 1.00, 1.00, 1.00],
+    [0.93, 0.98, 0.99, 0.92, 0.92],
+    [1.04, 1.01, 0.99, 1.04, 1.05],
+])
+# voice and SMS drift down by about 4% a year
+YEARLY_TREND = np.array([-0.01, -0.04, -0.04, -0.01, -0.02])
+CHURN_BASE = 0.16
+CHURN_PER_OVERUSE = 0.10
+DECIMALS = [2, 1, 0, 2, 1]
+
+DEFAULT_MONTHS = 36
+DEFAULT_START = "2022-01-01"
+CHUNK_CUSTOMERS = 50_000
+
+
+def customer_ids(start: int, stop: int, total: int) -> np.ndarray:
+    # C00001 ... zero-padded to the width of the largest id
+    width = max(5, len(str(total)))
+    return np.array([f"C{i:0{width}d}" for i in range(start + 1, stop + 1)], dtype=object)
+
+
+def generate_chunk(
+    first: int,
+    n: int,
+    total: int,
+    months: int = DEFAULT_MONTHS,
+    start: str = DEFAULT_START,
+    seed: int = 0,
+    catalog: Optional[PlanCatalog] = None,
+) -> pd.DataFrame:
+    # Customers first+1 .. first+n, every month; the same (seed, first, n)
+    # always gives the same rows
+    catalog = catalog or get_catalog()
+    rng = np.random.default_rng([seed, first])
+    dates = pd.date_range(start, periods=months, freq="MS")
+    month_of_year = dates.month.to_numpy() - 1
+    years = (np.arange(months) / 12.0)[:, None]
+
+    # plans in the catalog, weighted by the observed shares (unknown plans get the mean share)
+    shares = np.array([PLAN_SHARES.get(p, np.mean(list(PLAN_SHARES.values()))) for p in catalog.names])
+    plan = rng.choice(len(catalog), size=n, p=shares / shares.sum())
+
+    cov = np.diag(LOG_STD ** 2)
+    cov[0, 3] = cov[3, 0] = DATA_ROAMING_CORR * LOG_STD[0] * LOG_STD[3]
+    level = np.exp(rng.multivariate_normal(LOG_MEAN, cov, size=n))
+    level = np.column_stack([level, level[:, 3] * ROAMING_MIN_PER_MB])       # (n, 5)
+
+    usage = (
+        level[:, None, :]
+        * SEASONALITY[month_of_year][None]
+        * np.exp(YEARLY_TREND * years)[None]
+        * np.exp(rng.normal(0.0, MONTH_NOISE, size=(n, months, len(USAGE_COLUMNS))) - MONTH_NOISE ** 2 / 2)
+    )
+    for j, d in enumerate(DECIMALS):
+        usage[:, :, j] = np.round(usage[:, :, j], d)
+
+    # each customer priced under their own plan only
+    bill = np.zeros((n, months))
+    overuse = np.zeros((n, months), dtype=bool)
+    for p in np.unique(plan):
+        on_plan = plan == p
+        sim = simulate_plans(usage[on_plan], catalog=PlanCatalog(plans=catalog.plans[[p]], rates=catalog.rates))
+        bill[on_plan] = sim["expected_bill_eur"][:, :, 0]
+        overuse[on_plan] = sim["overuse_flag"][:, :, 0]
+
+    churn = np.zeros((n, months), dtype=np.int8)
+    churned = rng.random(n) < CHURN_BASE + CHURN_PER_OVERUSE * overuse.mean(axis=1)
+    churn[churned, rng.integers(0, months, size=churned.sum())] = 1
+
+    out = pd.DataFrame({
+        "customer_id": np.repeat(customer_ids(first, first + n, total), months),
+        "date": np.tile(dates.to_numpy(), n),
+        "year": np.tile(dates.year.to_numpy(), n),
+        "month": np.tile(dates.month.to_numpy(), n),
+        "current_plan_type": np.repeat(np.asarray(catalog.names, dtype=object)[plan], months),
+        "base_price_eur": np.repeat(catalog.base[plan], months),
+    })
+    for j, key in enumerate(LIMIT_KEYS):
+        out[key] = np.repeat(catalog.limits[plan, j], months).astype(np.int64)
+    for j, col in enumerate(USAGE_COLUMNS):
+        out[col] = usage[:, :, j].ravel()
+    out["sms_count"] = out["sms_count"].astype(np.int64)
+    out["bill_amount_eur"] = bill.ravel()
+    out["overuse_flag"] = overuse.ravel().astype(np.int8)
+    out["churn_event"] = churn.ravel()
+    return out[COLUMNS]
+
+
+def generate_chunks(
+    customers: int,
+    months: int = DEFAULT_MONTHS,
+    start: str = DEFAULT_START,
+    seed: int = 0,
+    chunk_customers: int = CHUNK_CUSTOMERS,
+    catalog: Optional[PlanCatalog] = None,
+) -> Iterator[pd.DataFrame]:
+    catalog = catalog or get_catalog()
+    for first in range(0, customers, chunk_customers):
+        n = min(chunk_customers, customers - first)
+        yield generate_chunk(first, n, customers, months, start, seed, catalog)
+
+
+def write_synthetic(
+    output: Path,
+    customers: int,
+    months: int = DEFAULT_MONTHS,
+    start: str = DEFAULT_START,
+    seed: int = 0,
+    chunk_customers: int = CHUNK_CUSTOMERS,
+    fmt: str = "parquet",
+    report=None,
+) -> int:
+    # Streams the records to disk one chunk of customers at a time:
+    #   fmt="parquet": typed, year-partitioned dataset (like `python ingest.py`)
+    #   fmt="csv":     one CSV in the format of data/telecom_original.csv
+    # Returns rows written.
+    output = Path(output)
+    chunks = generate_chunks(customers, months, start, seed, chunk_customers)
+
+    def counted(chunks):
+        rows = 0
+        for chunk in chunks:
+            rows += len(chunk)
+            if report is not None:
+                report(rows)
+            yield chunk
+
+    if fmt == "parquet":
+        return write_dataset_chunks(counted(chunks), output)
+    if fmt != "csv":
+        raise ValueError(f"Unknown format: {fmt!r}")
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(f".{output.name}.tmp")
+    rows = 0
+    try:
+        for i, chunk in enumerate(counted(chunks)):
+            # 1/1/2022, like the export
+            d = chunk["date"].dt
+            chunk = chunk.assign(
+                date=d.month.astype(str) + "/" + d.day.astype(str) + "/" + d.year.astype(str)
+            )
+            chunk.to_csv(tmp, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            rows += len(chunk)
+        tmp.replace(output)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return rows
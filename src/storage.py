@@ -1,49 +1,315 @@
+import hashlib
 import json
-from typing import Optional, Tuple, Dict, Any
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple, Dict, Any
 
 import numpy as np
 import pandas as pd
 
-from .config import AppPaths
+from .config import AppPaths, DTWSettings
+from .dataset import (
+    append_dataset, apply_schema, available_columns, merge_records, read_csv_records, read_dataset, swap_dir,
+    write_dataset,
+)
+from .services.perf import timed
 
 
-def load_raw(paths: AppPaths) -> pd.DataFrame:
-    df = pd.read_csv(paths.raw_data)
-    df["date"] = pd.to_datetime(df["date"])
-    return df
+def _temp_path(path: Path) -> Path:
+    return path.with_name(f".{path.stem}.{uuid.uuid4().hex}{path.suffix}")
 
 
-def save_enriched(df: pd.DataFrame, paths: AppPaths) -> Tuple[str, str]:
-    #Save enriched dataset. Tries parquet first, falls back to CSV.
+def atomic_write(path: Path, write: Callable[[Path], None]) -> None:
+    # Write to a temp file in the same directory, then rename over the target:
+    # readers (other sessions, other processes) see either the old or the new file.
+    path = Path(path)
+    tmp = _temp_path(path)
     try:
-        df.to_parquet(paths.enriched_parquet, index=False)
-        return "parquet", str(paths.enriched_parquet)
-    except Exception:
-        df.to_csv(paths.enriched_csv, index=False)
-        return "csv", str(paths.enriched_csv)
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _write_json(path: Path, obj: Any) -> None:
+    atomic_write(path, lambda p: p.write_text(json.dumps(obj)))
+
+
+def _mtime(path: Path) -> int:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _prune_oldest(entries: Iterable[Path], keep: int) -> None:
+    # Remove all but the `keep` most recently modified files or directories
+    entries = sorted(entries, key=_mtime)
+    for p in entries[:max(len(entries) - keep, 0)]:
+        if p.is_dir():
+            shutil.rmtree(p, ignore_errors=True)
+            continue
+        try:
+            p.unlink(missing_ok=True)
+        except OSError:
+            pass  # still open elsewhere (Windows); removed on a later save
+
+
+def fingerprint(sources: Iterable[Path]) -> str:
+    # Changes whenever one of the files (or parquet files under a directory) is
+    # added, replaced or removed
+    h = hashlib.sha1()
+    for p in sources:
+        p = Path(p)
+        files = sorted(p.rglob("*.parquet")) if p.is_dir() else [p] if p.exists() else []
+        for f in files:
+            stat = f.stat()
+            h.update(f"{f}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return h.hexdigest()[:20]
+
+
+@timed
+def data_version(paths: AppPaths) -> str:
+    # Changes whenever a data file the app loads is added, replaced or removed
+    return fingerprint([
+        paths.enriched_dataset,
+        paths.enriched_parquet,
+        paths.enriched_csv,
+        paths.customer_state,
+        paths.raw_dataset,
+        paths.raw_data,
+    ])
+
+
+def _select_years(df: pd.DataFrame, years: Optional[Iterable[int]]) -> pd.DataFrame:
+    if years is None:
+        return df
+    keep = df["date"].dt.year.isin(list(years))
+    return df[keep].reset_index(drop=True)
+
+
+def _with_date(columns: Optional[List[str]]) -> Optional[List[str]]:
+    # the date is always loaded: year filters and every time axis need it
+    if columns is None or "date" in columns:
+        return columns
+    return ["date"] + list(columns)
+
+
+@timed
+def load_raw(
+    paths: AppPaths,
+    columns: Optional[List[str]] = None,
+    years: Optional[Iterable[int]] = None,
+) -> pd.DataFrame:
+    # the typed dataset written by `python ingest.py`, when there is one
+    if paths.raw_dataset.is_dir():
+        return read_dataset(paths.raw_dataset, columns=_with_date(columns), years=years)
+    df = read_csv_records(paths.raw_data, columns=_with_date(columns))
+    return _select_years(df, years)
+
+
+def append_raw(rows: pd.DataFrame, paths: AppPaths) -> None:
+    # Add new monthly records to the raw dataset the clustering is built from,
+    # creating it from the CSV export first when nothing was ingested yet
+    rows = rows.drop(columns="dtw_cluster", errors="ignore")
+    if paths.raw_dataset.is_dir():
+        append_dataset(rows, paths.raw_dataset)
+    else:
+        write_dataset(merge_records(load_raw(paths), rows), paths.raw_dataset)
+
+
+def upsert_raw(rows: pd.DataFrame, paths: AppPaths) -> None:
+    # Replace the raw (customer, month) records that `rows` has and add the new ones
+    rows = rows.drop(columns="dtw_cluster", errors="ignore")
+    write_dataset(merge_records(load_raw(paths), rows), paths.raw_dataset)
 
 
-def load_enriched(paths: AppPaths) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+def _remove_parquet_layouts(paths: AppPaths) -> None:
+    # load_enriched prefers the parquet layouts: a CSV written instead supersedes them
+    if paths.enriched_dataset.is_dir():
+        shutil.rmtree(paths.enriched_dataset)
     if paths.enriched_parquet.exists():
-        df = pd.read_parquet(paths.enriched_parquet)
-        return df, "parquet"
-    if paths.enriched_csv.exists():
-        df = pd.read_csv(paths.enriched_csv)
-        return df, "csv"
-    return None, None
+        paths.enriched_parquet.unlink()
+
+
+@timed
+def save_enriched(df: pd.DataFrame, paths: AppPaths) -> Tuple[str, str]:
+    #Save enriched dataset. Partitioned parquet first, falls back to CSV without pyarrow.
+    # A full write supersedes the incremental customer state built on the old data;
+    # the state is cleared only once the new data is on disk.
+    try:
+        write_dataset(df, paths.enriched_dataset)
+        fmt, target = "parquet", paths.enriched_dataset
+    except ImportError:
+        atomic_write(paths.enriched_csv, lambda p: df.to_csv(p, index=False))
+        _remove_parquet_layouts(paths)
+        fmt, target = "csv", paths.enriched_csv
+    clear_customer_state(paths)
+    return fmt, str(target)
+
+
+@timed
+def load_enriched(
+    paths: AppPaths,
+    columns: Optional[List[str]] = None,
+    years: Optional[Iterable[int]] = None,
+) -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    columns = _with_date(columns)
+    if paths.enriched_dataset.is_dir():
+        df, fmt = read_dataset(paths.enriched_dataset, columns=columns, years=years), "parquet"
+    # single-file layouts written by older versions
+    elif paths.enriched_parquet.exists():
+        columns = available_columns(paths.enriched_parquet, columns)
+        df = apply_schema(pd.read_parquet(paths.enriched_parquet, columns=columns))
+        df, fmt = _select_years(df, years), "parquet"
+    elif paths.enriched_csv.exists():
+        df = read_csv_records(paths.enriched_csv, columns=columns)
+        df, fmt = _select_years(df, years), "csv"
+    else:
+        return None, None
+
+    # months appended incrementally re-assign customers without rewriting their
+    # older records: the customer state holds the current labels
+    if "dtw_cluster" in df.columns and paths.customer_state.exists():
+        state = load_customer_state(paths, columns=["customer_id", "dtw_cluster"])
+        labels = pd.Series(state["dtw_cluster"].to_numpy(), index=state["customer_id"].astype(str))
+        current = df["customer_id"].astype(str).map(labels)
+        df["dtw_cluster"] = current.fillna(df["dtw_cluster"]).astype(df["dtw_cluster"].dtype)
+    return df, fmt
+
+
+def ensure_enriched_dataset(paths: AppPaths) -> bool:
+    # Convert an older single-file enriched dataset to the partitioned layout
+    # (once), so that new months can be appended to it
+    if paths.enriched_dataset.is_dir():
+        return True
+    existing, _ = load_enriched(paths)
+    if existing is None:
+        return False
+    fmt, _ = save_enriched(existing, paths)
+    return fmt == "parquet"
+
+
+def append_enriched(rows: pd.DataFrame, paths: AppPaths) -> None:
+    # Add new monthly records without touching the ones already stored
+    append_dataset(rows, paths.enriched_dataset)
+
+
+def save_customer_state(
+    state: pd.DataFrame,
+    paths: AppPaths,
+    series: Optional[np.ndarray] = None,
+) -> None:
+    # Row i of the state describes row i of the series tensor. The series goes
+    # first and the state last: the state says which customers and steps are valid.
+    if series is not None:
+        atomic_write(paths.series_file, lambda p: np.save(p, series))
+    atomic_write(paths.customer_state, lambda p: state.to_parquet(p, index=False))
+
+
+@timed
+def load_customer_state(paths: AppPaths, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    if not paths.customer_state.exists():
+        return None
+    return pd.read_parquet(paths.customer_state, columns=columns)
+
+
+@timed
+def load_series(paths: AppPaths, writable: bool = False) -> Optional[np.ndarray]:
+    # (customers, steps, features) raw usage, memory-mapped; "r+" lets the
+    # appender write new months in place
+    if not paths.series_file.exists():
+        return None
+    return np.load(paths.series_file, mmap_mode="r+" if writable else "r")
+
+
+def clear_customer_state(paths: AppPaths) -> None:
+    for p in [paths.customer_state, paths.series_file]:
+        if p.exists():
+            p.unlink()
+
+
+def upsert_enriched(rows: pd.DataFrame, paths: AppPaths) -> Tuple[str, str]:
+    # Replace the stored (customer, month) records that `rows` has, add the new
+    # ones and save; the other months of those customers are kept
+    existing, _ = load_enriched(paths)
+    return save_enriched(merge_records(existing, rows), paths)
 
 
-def save_centers(centers: np.ndarray, k: int, paths: AppPaths) -> None:
-    np.save(paths.centers_file, centers)
-    paths.meta_file.write_text(json.dumps({"k": int(k)}))
+def save_centers(
+    centers: np.ndarray,
+    k: int,
+    paths: AppPaths,
+    settings: Optional[DTWSettings] = None,
+    cluster_sizes: Optional[np.ndarray] = None,
+) -> None:
+    # centers first, meta last: meta never describes centers that are not on disk yet
+    atomic_write(paths.centers_file, lambda p: np.save(p, centers))
+    _write_json(paths.meta_file, _centers_meta(k, settings, cluster_sizes))
 
 
+def _centers_meta(k: int, settings: Optional[DTWSettings], cluster_sizes: Optional[np.ndarray]) -> Dict[str, Any]:
+    meta = {"k": int(k), "dtw": (settings or DTWSettings()).to_meta()}
+    if cluster_sizes is not None:
+        meta["cluster_sizes"] = [int(n) for n in cluster_sizes]
+    return meta
+
+
+@timed
+def save_clustering(
+    df: pd.DataFrame,
+    centers: np.ndarray,
+    k: int,
+    paths: AppPaths,
+    settings: Optional[DTWSettings] = None,
+    cluster_sizes: Optional[np.ndarray] = None,
+) -> Tuple[str, str]:
+    # Enriched dataset, centers and meta of a new clustering. All three are
+    # written aside first and then renamed into place back to back, so readers
+    # keep the previous clustering until the new one is complete on disk.
+    staged_dataset = paths.enriched_dataset.with_name(f".{paths.enriched_dataset.name}.{uuid.uuid4().hex}")
+    staged_csv = _temp_path(paths.enriched_csv)
+    staged_centers = _temp_path(paths.centers_file)
+    staged_meta = _temp_path(paths.meta_file)
+    try:
+        try:
+            write_dataset(df, staged_dataset)
+            fmt, target = "parquet", paths.enriched_dataset
+        except ImportError:
+            df.to_csv(staged_csv, index=False)
+            fmt, target = "csv", paths.enriched_csv
+        np.save(staged_centers, centers)
+        staged_meta.write_text(json.dumps(_centers_meta(k, settings, cluster_sizes)))
+
+        # a full write supersedes the incremental customer state built on the old data
+        clear_customer_state(paths)
+        if fmt == "parquet":
+            swap_dir(staged_dataset, paths.enriched_dataset)
+        else:
+            os.replace(staged_csv, paths.enriched_csv)
+            _remove_parquet_layouts(paths)
+        os.replace(staged_centers, paths.centers_file)
+        os.replace(staged_meta, paths.meta_file)
+    finally:
+        if staged_dataset.exists():
+            shutil.rmtree(staged_dataset)
+        for p in [staged_csv, staged_centers, staged_meta]:
+            if p.exists():
+                p.unlink()
+    return fmt, str(target)
+
+
+@timed
 def load_centers(paths: AppPaths) -> Optional[np.ndarray]:
     if not paths.centers_file.exists():
         return None
     return np.load(paths.centers_file, allow_pickle=False)
 
 
+@timed
 def load_meta(paths: AppPaths) -> Optional[Dict[str, Any]]:
     if not paths.meta_file.exists():
         return None
@@ -53,12 +319,179 @@ def load_meta(paths: AppPaths) -> Optional[Dict[str, Any]]:
         return None
 
 
+def dtw_cache_key(time_series_data: np.ndarray, settings: DTWSettings, *extra: np.ndarray) -> str:
+    # Hash of the normalized tensor, the DTW window and any extra arrays (e.g. centers)
+    h = hashlib.sha1()
+    for arr in (time_series_data,) + extra:
+        arr = np.ascontiguousarray(arr)
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    h.update(json.dumps(settings.metric_params(), sort_keys=True).encode())
+    return h.hexdigest()[:20]
+
+
+def _distance_cache_file(kind: str, key: str, paths: AppPaths) -> Path:
+    return paths.distance_cache_dir / f"{kind}_{key}.npy"
+
+
+def load_distance_cache(kind: str, key: str, paths: AppPaths) -> Optional[np.ndarray]:
+    # Read-only memmap, so callers read distances without copying the file
+    path = _distance_cache_file(kind, key, paths)
+    try:
+        # a file that is still read is among the newest when the cache is pruned
+        os.utime(path)
+        return np.load(path, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+
+
+def save_distance_cache(
+    kind: str,
+    key: str,
+    shape: Tuple[int, ...],
+    fill: Callable[[np.ndarray], None],
+    paths: AppPaths,
+    dtype=np.float32,
+    keep: int = 4,
+) -> np.ndarray:
+    # `fill` writes into a disk-backed array (so large matrices never sit in RAM);
+    # the file only appears under its final name once it is complete. Only the
+    # `keep` most recently used files of this kind are kept.
+    paths.distance_cache_dir.mkdir(parents=True, exist_ok=True)
+    path = _distance_cache_file(kind, key, paths)
+    tmp = _temp_path(path)
+    try:
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=shape)
+        fill(out)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    _prune_oldest(paths.distance_cache_dir.glob(f"{kind}_*.npy"), keep)
+    return np.load(path, mmap_mode="r")
+
+
+def save_sweep_result(
+    version: str,
+    k: int,
+    cluster_df: pd.DataFrame,
+    centers: np.ndarray,
+    paths: AppPaths,
+) -> None:
+    out_dir = paths.sweep_dir / version
+    out_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(out_dir / f"k{int(k)}_labels.parquet", lambda p: cluster_df.to_parquet(p, index=False))
+    atomic_write(out_dir / f"k{int(k)}_centers.npy", lambda p: np.save(p, centers))
+
+
+def save_sweep_summary(
+    version: str,
+    summary: list,
+    settings: DTWSettings,
+    paths: AppPaths,
+    keep: int = 4,
+) -> None:
+    # Written last: a sweep only becomes visible once all its k results are on disk.
+    # Only the most recent `keep` sweeps are kept; this one is the newest.
+    out_dir = paths.sweep_dir / version
+    _write_json(out_dir / "summary.json", {"dtw": settings.to_meta(), "results": summary})
+    _write_json(paths.sweep_dir / "latest.json", {"version": version})
+    _prune_oldest([p for p in paths.sweep_dir.iterdir() if p.is_dir() and p != out_dir], keep - 1)
+
+
+@timed
+def load_sweep_summary(paths: AppPaths) -> Optional[pd.DataFrame]:
+    latest = paths.sweep_dir / "latest.json"
+    if not latest.exists():
+        return None
+    try:
+        version = json.loads(latest.read_text())["version"]
+        summary = json.loads((paths.sweep_dir / version / "summary.json").read_text())
+    except Exception:
+        return None
+    out = pd.DataFrame(summary["results"]).sort_values("k").reset_index(drop=True)
+    out.attrs["version"] = version
+    out.attrs["dtw"] = summary["dtw"]
+    return out
+
+
+@timed
+def load_sweep_result(k: int, paths: AppPaths) -> Optional[Tuple[pd.DataFrame, np.ndarray]]:
+    summary = load_sweep_summary(paths)
+    if summary is None or int(k) not in set(summary["k"]):
+        return None
+    out_dir = paths.sweep_dir / summary.attrs["version"]
+    cluster_df = pd.read_parquet(out_dir / f"k{int(k)}_labels.parquet")
+    centers = np.load(out_dir / f"k{int(k)}_centers.npy", allow_pickle=False)
+    return cluster_df, centers
+
+
+def save_backtest(errors: pd.DataFrame, timings: pd.DataFrame, paths: AppPaths) -> None:
+    paths.backtest_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(paths.backtest_dir / "timings.parquet", lambda p: timings.to_parquet(p, index=False))
+    atomic_write(paths.backtest_dir / "errors.parquet", lambda p: errors.to_parquet(p, index=False))
+
+
+@timed
+def load_backtest(paths: AppPaths) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+    errors = paths.backtest_dir / "errors.parquet"
+    timings = paths.backtest_dir / "timings.parquet"
+    if not (errors.exists() and timings.exists()):
+        return None
+    return pd.read_parquet(errors), pd.read_parquet(timings)
+
+
+def aggregates_file(key: str, paths: AppPaths) -> Path:
+    return paths.aggregates_dir / f"cube-{key}.parquet"
+
+
+@timed
+def save_aggregates(table: pd.DataFrame, key: str, paths: AppPaths, keep: int = 4) -> None:
+    # one cube per dataset version; only the most recent `keep` are kept
+    paths.aggregates_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(aggregates_file(key, paths), lambda p: table.to_parquet(p, index=False))
+    _prune_oldest(paths.aggregates_dir.glob("cube-*.parquet"), keep)
+
+
+@timed
+def load_aggregates(key: str, paths: AppPaths) -> Optional[pd.DataFrame]:
+    path = aggregates_file(key, paths)
+    if not path.exists():
+        return None
+    return pd.read_parquet(path)
+
+
+def load_pipeline_state(paths: AppPaths) -> Dict[str, Any]:
+    path = paths.pipeline_dir / "state.json"
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text())
+    except Exception:
+        return {}
+
+
+def save_pipeline_state(state: Dict[str, Any], paths: AppPaths) -> None:
+    paths.pipeline_dir.mkdir(parents=True, exist_ok=True)
+    _write_json(paths.pipeline_dir / "state.json", state)
+
+
 def reset_artifacts(paths: AppPaths) -> None:
     for p in [
         paths.enriched_parquet,
         paths.enriched_csv,
         paths.centers_file,
         paths.meta_file,
+        paths.customer_state,
+        paths.series_file,
     ]:
         if p.exists():
             p.unlink()
+    for d in [
+        paths.enriched_dataset, paths.distance_cache_dir, paths.sweep_dir,
+        paths.backtest_dir, paths.aggregates_dir, paths.pipeline_dir,
+    ]:
+        if d.exists():
+            shutil.rmtree(d)
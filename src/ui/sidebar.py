@@ -1,42 +1,226 @@
 from typing import Optional, Tuple
+import pandas as pd
 import streamlit as st
 
-from src.config import AppPaths
+from src.config import AppPaths, DTWSettings
 from src.storage import reset_artifacts
+from src.services import single_flight
+from src.services.memo import clear_memo, memo_nbytes, memo_stats
+from src.services import perf
+from src.services.indexing import CustomerIndex
 
 
-def sidebar_clustering_controls(paths: AppPaths, saved_k: Optional[int]) -> int:
+def sidebar_clustering_controls(
+    paths: AppPaths,
+    saved_k: Optional[int],
+    sweep_summary: Optional[pd.DataFrame] = None,
+) -> int:
     st.sidebar.subheader("Clustering")
     k = st.sidebar.slider("Number of clusters", 3, 10, 6)
 
-    if saved_k is not None and int(saved_k) != int(k):
+    precomputed = sweep_summary is not None and int(k) in set(sweep_summary["k"])
+    if saved_k is not None and int(saved_k) != int(k) and not precomputed:
         st.sidebar.warning(
             f"Saved clusters were computed with k={saved_k}. "
-            f"Slider is k={k}. Re-run DTW to update."
+            f"Slider is k={k}. Re-run DTW (or the k-sweep) to update."
         )
 
     if st.sidebar.button("Reset saved DTW + enriched data"):
         reset_artifacts(paths)
         st.cache_data.clear()
+        clear_memo()
         st.rerun()
 
     return int(k)
 
 
-def sidebar_customer_controls(df) -> Tuple[int, Optional[int]]:
+def sidebar_k_sweep_controls(sweep_summary: Optional[pd.DataFrame], running: bool = False) -> bool:
+    # Elbow / silhouette chart of the last k-sweep; returns True when a new sweep is requested
+    with st.sidebar.expander("Choose k (k-sweep)"):
+        if sweep_summary is None:
+            st.caption("No k-sweep yet. It fits every k on the slider in parallel.")
+        else:
+            chart = sweep_summary.set_index("k")
+            st.caption("Inertia (elbow)")
+            st.line_chart(chart["inertia"], height=150)
+            if "dtw_silhouette" in chart.columns and chart["dtw_silhouette"].notna().all():
+                st.caption("Silhouette over all customer pairs (higher is better)")
+                st.line_chart(chart["dtw_silhouette"], height=150)
+            else:
+                st.caption("Center-based silhouette (higher is better)")
+                st.line_chart(chart["silhouette"], height=150)
+        if running:
+            st.caption("The k-sweep is running in a worker process.")
+        return st.button("Run k-sweep (k = 3…10)", disabled=running)
+
+
+WINDOW_OPTIONS = {
+    "None (full DTW)": None,
+    "Sakoe-Chiba band": "sakoe_chiba",
+    "Itakura parallelogram": "itakura",
+}
+
+
+def sidebar_dtw_controls(saved_settings: Optional[DTWSettings] = None) -> DTWSettings:
+    saved = saved_settings or DTWSettings()
+
+    with st.sidebar.expander("DTW settings"):
+        labels = list(WINDOW_OPTIONS.keys())
+        saved_label = next(l for l, v in WINDOW_OPTIONS.items() if v == saved.global_constraint)
+        window = st.selectbox("Warping window", labels, index=labels.index(saved_label))
+        constraint = WINDOW_OPTIONS[window]
+
+        radius = saved.sakoe_chiba_radius
+        slope = saved.itakura_max_slope
+        if constraint == "sakoe_chiba":
+            radius = st.slider("Sakoe-Chiba radius (months)", 1, 12, int(saved.sakoe_chiba_radius))
+        elif constraint == "itakura":
+            slope = st.slider("Itakura max slope", 1.0, 6.0, float(saved.itakura_max_slope), 0.5)
+
+        n_jobs = st.number_input(
+            "Parallel jobs (0 = all cores)", min_value=0, max_value=64,
+            value=0 if saved.n_jobs == -1 else int(saved.n_jobs or 1),
+        )
+
+    settings = DTWSettings(
+        global_constraint=constraint,
+        sakoe_chiba_radius=int(radius),
+        itakura_max_slope=float(slope),
+        n_jobs=-1 if n_jobs == 0 else int(n_jobs),
+    )
+
+    if saved_settings is not None and settings.metric_params() != saved.metric_params():
+        st.sidebar.warning("DTW window differs from the saved clusters. Re-run DTW to update.")
+
+    return settings
+
+
+def sidebar_customer_controls(index: CustomerIndex) -> Tuple[int, Optional[int]]:
     st.sidebar.header("Controls")
 
-    customer_ids = df["customer_id"].unique()
+    customer_ids = index.customer_ids
     selected_customer = st.sidebar.selectbox("Select customer", customer_ids)
 
     selected_cluster = None
-    if "dtw_cluster" in df.columns:
-        clusters = sorted(df["dtw_cluster"].dropna().unique())
-        selected_cluster = st.sidebar.selectbox("Select cluster", clusters)
+    if len(index.clusters):
+        selected_cluster = st.sidebar.selectbox("Select cluster", index.clusters.tolist())
     else:
         st.sidebar.warning("Run DTW to enable clusters.")
 
+    # one label per customer, aligned with customer_ids
     st.session_state["customer_ids"] = customer_ids
-    st.session_state["labels"] = df["dtw_cluster"].unique() if "dtw_cluster" in df.columns else []
+    st.session_state["labels"] = index.customer_labels if len(index.clusters) else []
 
     return selected_customer, selected_cluster
+
+
+CLUSTERING_JOB = "clustering_job"
+SWEEP_JOB = "sweep_job"
+
+
+def _session_job(state_key: str) -> Optional[single_flight.Flight]:
+    # The job this session started (its key is kept in session state). A finished
+    # one is returned once and forgotten, for the caller to report how it ended.
+    key = st.session_state.get(state_key)
+    flight = single_flight.get(key) if key is not None else None
+    if flight is None:
+        st.session_state.pop(state_key, None)
+        return None
+    if not flight.running:
+        # reported by the caller; the jobs panel must not rerun the app for it again
+        del st.session_state[state_key]
+        st.session_state.get("seen_flights", set()).discard(flight.key)
+    return flight
+
+
+def sidebar_clustering_job() -> Optional[single_flight.Flight]:
+    # The clustering job this session started, while it runs; reports how it
+    # ended once it is done
+    flight = _session_job(CLUSTERING_JOB)
+    if flight is None or flight.running:
+        return flight
+    if flight.error is not None:
+        st.sidebar.error(f"Clustering failed: {flight.error}")
+    else:
+        ran = [f"{r['stage']} {r['seconds']:.1f}s" for r in flight.result if r["status"] == "ran"]
+        st.sidebar.success("DTW complete. Saved enriched dataset ✅ " + ", ".join(ran))
+    return None
+
+
+def sidebar_sweep_job() -> Optional[single_flight.Flight]:
+    # The k-sweep this session started, while it runs; reports how it ended once it is done
+    flight = _session_job(SWEEP_JOB)
+    if flight is None or flight.running:
+        return flight
+    if flight.error is not None:
+        st.sidebar.error(f"k-sweep failed: {flight.error}")
+    else:
+        fitted = flight.result["k"]
+        st.sidebar.success(f"k-sweep complete: k = {fitted.min()}…{fitted.max()} fitted ✅")
+    return None
+
+
+@st.fragment(run_every=2)
+def _running_jobs_panel():
+    seen = st.session_state.setdefault("seen_flights", set())
+    flights = single_flight.running()
+
+    for flight in flights:
+        seen.add(flight.key)
+        st.caption(f"{flight.description}: {flight.status}")
+        st.progress(flight.progress)
+
+    finished = [key for key in seen if key not in {f.key for f in flights}]
+    if finished:
+        seen.difference_update(finished)
+        st.cache_data.clear()
+        st.rerun()
+
+
+def sidebar_running_jobs() -> None:
+    # Only poll while something is actually running
+    if single_flight.running() or st.session_state.get("seen_flights"):
+        with st.sidebar:
+            _running_jobs_panel()
+
+
+def sidebar_cache_stats() -> None:
+    # Hit / miss counters of the memoized tab computations
+    with st.sidebar.expander("Computation cache"):
+        stats = memo_stats()
+        if stats.empty:
+            st.caption("Nothing computed yet.")
+        else:
+            st.caption(f"{memo_nbytes() / 1e6:.1f} MB cached")
+            st.dataframe(stats.set_index("function"), use_container_width=True)
+        if st.button("Clear computation cache"):
+            clear_memo()
+            st.rerun()
+
+
+def performance_recorder() -> Optional[perf.Recorder]:
+    # The session's span recorder, started for this rerun, while timings are on.
+    # The checkbox lives in the Performance panel at the end of the sidebar; its
+    # value from the previous interaction is already in session state here.
+    if not st.session_state.get("perf_enabled", False):
+        return None
+    recorder = st.session_state.setdefault("perf_recorder", perf.Recorder())
+    recorder.begin_run()
+    return recorder
+
+
+def sidebar_performance_panel(recorder: Optional[perf.Recorder]) -> None:
+    with st.sidebar.expander("Performance"):
+        st.checkbox("Record timings", key="perf_enabled")
+        if recorder is None or not recorder.runs:
+            st.caption("Times storage, service and tab rendering calls on every rerun.")
+            return
+        st.caption("Last rerun")
+        st.dataframe(recorder.last_run().round(1), use_container_width=True)
+        st.caption(f"Per rerun, over the last {len(recorder.runs)} reruns")
+        st.dataframe(recorder.summary().set_index("span").round(1), use_container_width=True)
+        st.download_button("Download JSON", recorder.to_json(), file_name="telecom_timings.json", mime="application/json")
+        st.download_button(
+            "Download Chrome trace", recorder.to_chrome_trace(),
+            file_name="telecom_trace.json", mime="application/json",
+        )
@@ -1,58 +1,124 @@
+from typing import Optional
+
 import pandas as pd
 import numpy as np
 
-def unexpected_bill_increase_rate_for_customer(
-    cust_df: pd.DataFrame,
-    increase_pct: float = 0.25
-) -> float:
-    g = cust_df.sort_values("date")
-    bills = g["bill_amount_eur"].to_numpy()
+from src.services.memo import memoize
+from src.services.perf import timed
+
+# Thresholds offered by the dashboard slider; the incremental customer state
+# keeps one unexpected-increase count per threshold
+INCREASE_THRESHOLDS = [round(0.05 * i, 2) for i in range(1, 17)]
+
+
+def increase_count_column(increase_pct: float) -> str:
+    return f"increases_over_{int(round(increase_pct * 100))}pct"
+
+@timed
+def customer_bill_metrics(
+    df: pd.DataFrame,
+    increase_pct: float = 0.25,
+    cluster_col: str = "dtw_cluster",
+) -> pd.DataFrame:
+    # One sort by (customer, date), then every metric is a segmented reduction
+    # over the contiguous customer blocks (no per-customer Python loop).
+    codes, customer_ids = pd.factorize(df["customer_id"], sort=True)
+    order = np.lexsort((df["date"].to_numpy(), codes))
+    codes = codes[order]
+    n_customers = len(customer_ids)
+
+    bills = df["bill_amount_eur"].to_numpy(dtype=float)[order]
+    overuse = df["overuse_flag"].to_numpy(dtype=float)[order]
+    churn = df["churn_event"].to_numpy(dtype=int)[order]
 
-    if len(bills) < 2:
-        return 0.0
+    months = np.bincount(codes, minlength=n_customers)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
 
+    # month-to-month % change, ignoring transitions across customer boundaries
     prev = bills[:-1]
     curr = bills[1:]
     pct_increase = (curr - prev) / np.maximum(prev, 1e-6)
+    unexpected = (pct_increase > increase_pct) & (codes[1:] == codes[:-1])
 
-    unexpected = pct_increase > increase_pct
-    return float(np.mean(unexpected))
+    transitions = months - 1
+    unexpected_counts = np.bincount(codes[1:], weights=unexpected, minlength=n_customers)
+    unexpected_rate = np.divide(
+        unexpected_counts,
+        transitions,
+        out=np.zeros(n_customers),
+        where=transitions > 0,
+    )
+
+    out = pd.DataFrame({
+        "customer_id": customer_ids,
+        "customer_churned": np.maximum.reduceat(churn, starts),
+        "unexpected_increase_rate": unexpected_rate,
+        "avg_bill": np.bincount(codes, weights=bills, minlength=n_customers) / months,
+        "overuse_rate": np.bincount(codes, weights=overuse, minlength=n_customers) / months,
+    })
+    if cluster_col in df.columns:
+        out[cluster_col] = df[cluster_col].to_numpy()[order][starts]
+    return out
 
 
+def customer_metrics_from_state(state: pd.DataFrame, increase_pct: float) -> Optional[pd.DataFrame]:
+    # Same columns as customer_bill_metrics, from the running totals kept by
+    # the incremental appender; None when the threshold has no stored count
+    col = increase_count_column(increase_pct)
+    if col not in state.columns or abs(increase_pct * 100 - round(increase_pct * 100)) > 1e-9:
+        return None
+
+    months = state["months"].to_numpy(dtype=float)
+    transitions = months - 1
+    return pd.DataFrame({
+        "customer_id": state["customer_id"].to_numpy(),
+        "customer_churned": state["churned"].to_numpy(dtype=int),
+        "unexpected_increase_rate": np.divide(
+            state[col].to_numpy(dtype=float),
+            transitions,
+            out=np.zeros(len(state)),
+            where=transitions > 0,
+        ),
+        "avg_bill": state["bill_sum"].to_numpy(dtype=float) / months,
+        "overuse_rate": state["overuse_months"].to_numpy(dtype=float) / months,
+    })
+
+
+def _metrics_with_labels(
+    df: pd.DataFrame,
+    customer_state: pd.DataFrame,
+    increase_pct: float,
+    cluster_col: str,
+) -> Optional[pd.DataFrame]:
+    cust = customer_metrics_from_state(customer_state, increase_pct)
+    if cust is None or cluster_col not in df.columns:
+        return None
+    # labels come from df, which may show another clustering than the saved one
+    labels = df.drop_duplicates("customer_id")[["customer_id", cluster_col]]
+    if len(labels) != len(cust):
+        return None
+    labels = labels.assign(customer_id=labels["customer_id"].astype(str))
+    cust = cust.assign(customer_id=cust["customer_id"].astype(str)).merge(labels, on="customer_id")
+    return cust if len(cust) == len(labels) else None
+
+
+@timed
+@memoize
 def cluster_churn_dashboard(
     df: pd.DataFrame,
     cluster_col: str = "dtw_cluster",
-    increase_pct: float = 0.25
+    increase_pct: float = 0.25,
+    customer_state: Optional[pd.DataFrame] = None,
 ) -> pd.DataFrame:
-    #customer-level churn flag
-    churn_by_customer = (
-        df.groupby("customer_id")["churn_event"]
-        .max()
-        .rename("customer_churned")
-        .reset_index()
-    )
-
-    # Customer -> cluster mapping
-    cust_cluster = (
-        df[["customer_id", cluster_col]]
-        .drop_duplicates()
-        .merge(churn_by_customer, on="customer_id", how="left")
-    )
-
-    # Customer level unexpected bill incrase rate (uses actual bill series)
-    metrics = []
-    for cid, g in df.groupby("customer_id"):
-        metrics.append({
-            "customer_id": cid,
-            "unexpected_increase_rate": unexpected_bill_increase_rate_for_customer(
-                g, increase_pct=increase_pct
-            ),
-            "avg_bill": float(g["bill_amount_eur"].mean()),
-            "overuse_rate": float(g["overuse_flag"].mean()),
-        })
-    metrics = pd.DataFrame(metrics)
-
-    cust_cluster = cust_cluster.merge(metrics, on="customer_id", how="left")
+    # Customer level churn flag, unexpected bill increase rate (uses actual
+    # bill series), avg bill and overuse rate, all customers at once.
+    # With an up-to-date customer state the history is not re-scanned.
+    cust_cluster = None
+    if customer_state is not None:
+        cust_cluster = _metrics_with_labels(df, customer_state, increase_pct, cluster_col)
+    if cust_cluster is None:
+        cust_cluster = customer_bill_metrics(df, increase_pct=increase_pct, cluster_col=cluster_col)
+    cust_cluster["has_unexpected_increase"] = cust_cluster["unexpected_increase_rate"] > 0.0
 
     # Aggregat to cluster level
     out = (
@@ -64,7 +130,7 @@ def cluster_churn_dashboard(
             avg_bill=("avg_bill", "mean"),
             avg_overuse_rate=("overuse_rate", "mean"),
             avg_unexpected_increase_rate=("unexpected_increase_rate", "mean"),
-            pct_customers_with_unexpected_increase=("unexpected_increase_rate", lambda x: float(np.mean(x > 0.0))),
+            pct_customers_with_unexpected_increase=("has_unexpected_increase", "mean"),
         )
         .reset_index()
         .rename(columns={cluster_col: "cluster"})
@@ -1,8 +1,10 @@
 import streamlit as st
+from src.services.perf import timed
 from src.ui.tabs.churn_dashboard import cluster_churn_dashboard
 
 
-def render_churn_tab(df):
+@timed(name="render.churn_tab")
+def render_churn_tab(df, customer_state=None):
     st.header("Churn Dashboard by Cluster")
 
     if "dtw_cluster" not in df.columns:
@@ -18,7 +20,8 @@ def render_churn_tab(df):
     dash = cluster_churn_dashboard(
         df,
         cluster_col="dtw_cluster",
-        increase_pct=increase_pct
+        increase_pct=increase_pct,
+        customer_state=customer_state,
     )
 
     st.subheader("Cluster risk table (customer-level churn + unexpected bill increases)")
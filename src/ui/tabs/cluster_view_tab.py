@@ -1,38 +1,33 @@
 import pandas as pd
 import streamlit as st
 
+from src.services.perf import timed
+from src.ui.views import view_fragment, view_selector
 from src.ui.tabs.churn_tab import render_churn_tab
 from src.ui.tabs.cluster_summary_tab import render_cluster_summary_tab
 
 
-def month_index_for_centers(df: pd.DataFrame, T: int) -> pd.DatetimeIndex:
-    d = df.copy()
-    d["date"] = pd.to_datetime(d["date"])
-
-    month_index = (
-        d["date"]
-        .dt.to_period("M")
-        .drop_duplicates()
-        .sort_values()
-        .iloc[-T:]
-        .dt.to_timestamp()
-    )
-    return pd.DatetimeIndex(month_index)
+def month_index_for_centers(cube, T: int) -> pd.DatetimeIndex:
+    # the last T months of the dataset
+    return cube.months()[-T:]
 
 
-def render_cluster_view_tab(df: pd.DataFrame, centers, selected_cluster):
+@view_fragment
+@timed(name="render.cluster_view_tab")
+def render_cluster_view_tab(df: pd.DataFrame, centers, selected_cluster, customer_state, index, cube):
 
     st.header("Cluster Dashboard")
 
-    tab_cluster, tab_summary, tab_churn = st.tabs(
+    view = view_selector(
         [
             "Cluster View",
             "Cluster Summary",
             "Churn Dashboard",
-        ]
+        ],
+        key="cluster_view",
     )
 
-    with tab_cluster:
+    if view == "Cluster View":
         st.subheader("Average cluster behavior")
 
         if selected_cluster is None:
@@ -55,7 +50,7 @@ def render_cluster_view_tab(df: pd.DataFrame, centers, selected_cluster):
         )
 
         T = len(center_df)
-        center_df.index = month_index_for_centers(df, T)
+        center_df.index = month_index_for_centers(cube, T)
         center_df.index.name = "Month"
 
         st.line_chart(center_df)
@@ -64,9 +59,9 @@ def render_cluster_view_tab(df: pd.DataFrame, centers, selected_cluster):
             "Positive values indicate above-average usage relative to the all clients."
         )
 
-    with tab_summary:
-        render_cluster_summary_tab(df, selected_cluster)
+    elif view == "Cluster Summary":
+        render_cluster_summary_tab(df, selected_cluster, index, cube)
 
-    with tab_churn:
-        render_churn_tab(df)
+    else:
+        render_churn_tab(df, customer_state)
 
@@ -1,22 +1,30 @@
+from typing import Optional
+
+import pandas as pd
 import streamlit as st
 
+from src.services.perf import timed
+from src.ui.views import view_fragment, view_selector
 from src.ui.tabs.evaluation_tab import render_evaluation_tab
 from src.ui.tabs.recommendation_tab import render_recommendation_tab
 
 
-def render_customer_tab(cust_df, selected_customer: int):
+@view_fragment
+@timed(name="render.customer_tab")
+def render_customer_tab(cust_df, selected_customer: int, similar: Optional[pd.DataFrame] = None):
 
     st.header("Customer Dashboard")
 
-    tab_customer, tab_reco, tab_eval = st.tabs(
+    view = view_selector(
         [
             "Customer view",
             "Recommendation",
             "Evaluation"
-        ]
+        ],
+        key="customer_view",
     )
 
-    with tab_customer:
+    if view == "Customer view":
         st.subheader(f"Customer {selected_customer}")
         st.write(cust_df[["current_plan_type", "base_price_eur"]].iloc[0])
 
@@ -34,10 +42,16 @@ def render_customer_tab(cust_df, selected_customer: int):
 
         st.write("Overuse months:", cust_df[cust_df["overuse_flag"] == 1].shape[0])
         st.write("Churned:", "Yes" if cust_df["churn_event"].sum() > 0 else "No")
-        
-    with tab_reco:
+
+        st.subheader("Similar customers (DTW)")
+        if similar is None:
+            st.caption("Run the k-sweep to compute customer-to-customer DTW distances for this data and window.")
+        else:
+            st.dataframe(similar, use_container_width=True, hide_index=True)
+
+    elif view == "Recommendation":
         render_recommendation_tab(cust_df)
 
-    with tab_eval:
+    else:
         render_evaluation_tab(cust_df, selected_customer)
 
@@ -1,52 +1,26 @@
+from typing import Optional
+
 import pandas as pd
 
+from src.services.billing import simulate_customer_bills  # vectorized cost model
+from src.services.memo import memoize
+from src.services.perf import timed
+from src.services.plan_catalog import PlanCatalog, get_catalog
 from src.ui.tabs.recommendation import (
-    PLAN_LIMITS,
-    simulate_bill,                     # uses the cost model
     unexpected_bill_increase_metrics,  # percentage-only, new churn-aware metric
 )
 
-def month_overuse(row: pd.Series, plan: dict) -> int:
-    return int(
-        (row["data_usage_mb"] > plan["data_limit_mb"]) or
-        (row["voice_minutes"] > plan["voice_limit_min"]) or
-        (row["sms_count"] > plan["sms_limit"]) or
-        (row["roaming_data_mb"] > plan["roaming_limit_mb"]) or
-        (row["roaming_minutes"] > plan["roaming_limit_min"])
-    )
-
-def simulate_monthly_bills_under_plan(cust_df: pd.DataFrame, plan_name: str) -> pd.Series:
-    plan = PLAN_LIMITS[plan_name]
-    g = cust_df.sort_values("date")
-
-    bills = g.apply(
-        lambda r: simulate_bill({
-            "data_usage_mb": float(r["data_usage_mb"]),
-            "voice_minutes": float(r["voice_minutes"]),
-            "sms_count": float(r["sms_count"]),
-            "roaming_data_mb": float(r["roaming_data_mb"]),
-            "roaming_minutes": float(r["roaming_minutes"]),
-        }, plan)["expected_bill_eur"],
-        axis=1
-    )
-
-    bills.index = g["date"].values
-    return bills
-
-def overuse_rate_under_plan(cust_df: pd.DataFrame, plan_name: str) -> float:
-    plan = PLAN_LIMITS[plan_name]
-    g = cust_df.sort_values("date")
-    flags = g.apply(lambda r: month_overuse(r, plan), axis=1)
-    return float(flags.mean()) if len(flags) else 0.0
-
 def evaluate_plan(
     cust_df: pd.DataFrame,
     plan_name: str,
     increase_pct: float = 0.25,
+    catalog: Optional[PlanCatalog] = None,
 ) -> dict:
-    bills = simulate_monthly_bills_under_plan(cust_df, plan_name)
-    metrics = unexpected_bill_increase_metrics(bills, increase_pct=increase_pct)
-    overuse_rate = overuse_rate_under_plan(cust_df, plan_name)
+    # bills and overuse flags come from the same simulation pass
+    bills, overuse = simulate_customer_bills(cust_df, [plan_name], catalog=catalog)
+    metrics = unexpected_bill_increase_metrics(bills[plan_name], increase_pct=increase_pct)
+    flags = overuse[plan_name]
+    overuse_rate = float(flags.mean()) if len(flags) else 0.0
 
     return {
         "plan": plan_name,
@@ -57,14 +31,17 @@ def evaluate_plan(
         "overuse_rate": round(overuse_rate, 3),
     }
 
+@timed
+@memoize(resolve={"catalog": get_catalog})
 def evaluate_before_after(
     cust_df: pd.DataFrame,
     current_plan: str,
     recommended_plan: str,
     increase_pct: float = 0.25,
+    catalog: Optional[PlanCatalog] = None,
 ) -> pd.DataFrame:
-    before = evaluate_plan(cust_df, current_plan, increase_pct=increase_pct)
-    after = evaluate_plan(cust_df, recommended_plan, increase_pct=increase_pct)
+    before = evaluate_plan(cust_df, current_plan, increase_pct=increase_pct, catalog=catalog)
+    after = evaluate_plan(cust_df, recommended_plan, increase_pct=increase_pct, catalog=catalog)
 
     out = pd.DataFrame([before, after])
 
@@ -1,9 +1,12 @@
 import streamlit as st
 
+from src.services.perf import timed
+from src.services.plan_catalog import get_catalog
 from src.ui.tabs.recommendation import recommend_plans, recommend_plans_churn_rule_based
 from src.ui.tabs.evaluation import evaluate_before_after
 
 
+@timed(name="render.evaluation_tab")
 def render_evaluation_tab(cust_df, selected_customer: int):
     st.header("Evaluation: Current Plan vs Recommended Plan")
 
@@ -37,6 +40,13 @@ def render_evaluation_tab(cust_df, selected_customer: int):
     st.write(f"Current plan: **{current_plan}**")
     st.write(f"Recommended plan: **{recommended_plan}**")
 
+    if current_plan not in get_catalog().names:
+        st.warning(
+            f"The current plan (**{current_plan}**) is not in the plan catalog, "
+            "so its bills cannot be simulated for the before/after comparison."
+        )
+        return
+
     eval_df = evaluate_before_after(
         cust_df,
         current_plan=current_plan,
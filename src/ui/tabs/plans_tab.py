@@ -1,33 +1,23 @@
 import pandas as pd
 import streamlit as st
-from src.ui.tabs.plans import PLAN_LIMITS, COSTS
+from src.services.perf import timed
+from src.services.plan_catalog import get_catalog
+from src.ui.views import view_fragment
 
 
+@view_fragment
+@timed(name="render.plans_tab")
 def render_plans_tab():
     st.header("Plans & Costs Catalog")
+    catalog = get_catalog()
 
     st.subheader("Plan limits and base prices")
-    plans_df = (
-        pd.DataFrame.from_dict(PLAN_LIMITS, orient="index")
-        .reset_index()
-        .rename(columns={"index": "plan"})
-    )
-
-    col_order = [
-        "plan",
-        "base_price_eur",
-        "data_limit_mb",
-        "voice_limit_min",
-        "sms_limit",
-        "roaming_limit_mb",
-        "roaming_limit_min",
-    ]
-    plans_df = plans_df[col_order]
-    st.dataframe(plans_df, use_container_width=True)
+    st.caption(f"{len(catalog)} plans in the catalog.")
+    st.dataframe(catalog.to_frame(), use_container_width=True)
 
     st.subheader("Overusage costs (billing rules)")
     costs_df = (
-        pd.DataFrame([COSTS])
+        pd.DataFrame([catalog.costs()])
         .T.reset_index()
         .rename(columns={"index": "cost_type", 0: "cost_value"})
     )
@@ -2,51 +2,16 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
-
-def make_monthly_series(df_in: pd.DataFrame, customer_ids_set: set) -> pd.Series:
-    tmp = df_in[df_in["customer_id"].isin(customer_ids_set)].copy()
-    tmp["date"] = pd.to_datetime(tmp["date"])
-    tmp["month"] = tmp["date"].dt.to_period("M").dt.to_timestamp()  # month start
-    s = tmp.groupby("month")["data_usage_mb"].mean().sort_index()
-    return s
+from src.services.backtest import summarize_backtest
+from src.services.forecasting import fit_seasonal_trend_batch
+from src.services.memo import memoize
+from src.services.perf import timed
 
 
 def filter_years(s: pd.Series, years: list[int]) -> pd.Series:
     return s[s.index.year.isin(years)]
 
 
-def fit_seasonal_trend_model(y: pd.Series):
-    y = y.dropna()
-    if len(y) < 6:
-        return None
-
-    t = np.arange(len(y), dtype=float)
-    X = np.column_stack(
-        [
-            np.ones_like(t),
-            t,
-            np.sin(2 * np.pi * t / 12.0),
-            np.cos(2 * np.pi * t / 12.0),
-        ]
-    )
-    beta, *_ = np.linalg.lstsq(X, y.values, rcond=None)
-    return {"beta": beta, "n": len(y)}
-
-
-def predict_seasonal_trend(model, steps: int) -> np.ndarray:
-    n = model["n"]
-    t_future = np.arange(n, n + steps, dtype=float)
-    Xf = np.column_stack(
-        [
-            np.ones_like(t_future),
-            t_future,
-            np.sin(2 * np.pi * t_future / 12.0),
-            np.cos(2 * np.pi * t_future / 12.0),
-        ]
-    )
-    return Xf @ model["beta"]
-
-
 def metrics(y_true: np.ndarray, y_pred: np.ndarray) -> dict:
     err = y_true - y_pred
     mae = float(np.mean(np.abs(err)))
@@ -54,7 +19,49 @@ def metrics(y_true: np.ndarray, y_pred: np.ndarray) -> dict:
     return {"MAE": mae, "RMSE": rmse}
 
 
-def render_prediction_tab(df: pd.DataFrame, centers: np.ndarray | None) -> None:
+@timed
+@memoize
+def prediction_comparison(cube, cluster: int, train_years: list, target_year: int) -> dict:
+    # Cluster-only vs global forecast of the cluster's monthly usage in target_year,
+    # from the monthly means of the aggregate cube.
+    # Returns {"plot", "cluster", "global"} or {"error"}.
+    cluster_monthly = cube.series("data_usage_mb", cluster)
+    global_monthly = cube.series("data_usage_mb")
+
+    cluster_train = filter_years(cluster_monthly, train_years)
+    global_train = filter_years(global_monthly, train_years)
+
+    cluster_real_target = filter_years(cluster_monthly, [target_year])
+    if len(cluster_real_target) == 0:
+        return {"error": f"No real data found for target year {target_year} for this cluster."}
+
+    steps = len(cluster_real_target)
+
+    # Fit and predict both models in one batched solve
+    train = pd.concat([cluster_train, global_train], axis=1).sort_index().T.to_numpy(dtype=float)
+    fit = fit_seasonal_trend_batch(train, steps=steps)
+
+    if np.isnan(fit.coef[:, 0]).any():
+        return {"error": "Not enough training data to fit one of the models. Add more training years."}
+
+    pred_cluster, pred_global = fit.forecast
+
+    y_true = cluster_real_target.values.astype(float)
+
+    plot_df = pd.DataFrame(
+        {
+            "Real (cluster)": y_true,
+            "Prediction Cluster-only": pred_cluster,
+            "Prediction Global (no clustering)": pred_global,
+        },
+        index=cluster_real_target.index,
+    )
+    plot_df.index.name = "Month"
+    return {"plot": plot_df, "cluster": metrics(y_true, pred_cluster), "global": metrics(y_true, pred_global)}
+
+
+@timed(name="render.prediction_tab")
+def render_prediction_tab(centers: np.ndarray | None, cube, backtest=None) -> None:
     st.subheader("Cluster data-usage prediction (and whether clustering helps)",
                  help=("The prediction uses a regression-based time-series forecasting model. "
                         "Monthly data usage is modeled as a combination of a linear trend and a "
@@ -71,15 +78,6 @@ def render_prediction_tab(df: pd.DataFrame, centers: np.ndarray | None) -> None:
         st.info("No saved cluster centers found yet. Run DTW once to generate clusters/centers.")
         return
 
-    if "customer_ids" not in st.session_state or "labels" not in st.session_state:
-        st.error("Clustering results not found. Please run clustering first (Cluster View tab).")
-        return
-
-    customer_ids = st.session_state["customer_ids"]
-    labels = st.session_state["labels"]
-
-    cid_to_cluster = dict(zip(customer_ids, labels))
-
     # UI controls
     k_centers = centers.shape[0]
     selected_cluster = st.selectbox(
@@ -89,9 +87,7 @@ def render_prediction_tab(df: pd.DataFrame, centers: np.ndarray | None) -> None:
         key="pred_selected_cluster",
     )
 
-    df_local = df.copy()
-    df_local["date"] = pd.to_datetime(df_local["date"])
-    years_available = sorted(df_local["date"].dt.year.unique().tolist())
+    years_available = sorted(cube.months().year.unique().tolist())
 
     # Default: train 2022+2023, predict 2024
     default_train = [y for y in [2022, 2023] if y in years_available]
@@ -121,55 +117,20 @@ def render_prediction_tab(df: pd.DataFrame, centers: np.ndarray | None) -> None:
         st.warning("Target year should not be inside training years (otherwise you’re predicting data you trained on).")
         return
 
-    # Build the series
-    cluster_customers = {cid for cid, c in cid_to_cluster.items() if c == selected_cluster}
-    if len(cluster_customers) == 0:
+    if selected_cluster not in cube.clusters():
         st.error("No customers found for this cluster.")
         return
 
-    all_customers = set(df_local["customer_id"].unique().tolist())
-
-    cluster_monthly = make_monthly_series(df_local, cluster_customers)
-    global_monthly = make_monthly_series(df_local, all_customers)
-
-    cluster_train = filter_years(cluster_monthly, train_years)
-    global_train = filter_years(global_monthly, train_years)
-
-    cluster_real_target = filter_years(cluster_monthly, [target_year])
-    if len(cluster_real_target) == 0:
-        st.error(f"No real data found for target year {target_year} for this cluster.")
+    # Fit and predict (memoized per dataset version, cluster and year selection)
+    result = prediction_comparison(cube, int(selected_cluster), sorted(train_years), int(target_year))
+    if "error" in result:
+        st.error(result["error"])
         return
-
-    steps = len(cluster_real_target)
-
-    # Fit and predict
-    model_cluster = fit_seasonal_trend_model(cluster_train)
-    model_global = fit_seasonal_trend_model(global_train)
-
-    if model_cluster is None or model_global is None:
-        st.error("Not enough training data to fit one of the models. Add more training years.")
-        return
-
-    pred_cluster = predict_seasonal_trend(model_cluster, steps=steps)
-    pred_global = predict_seasonal_trend(model_global, steps=steps)
-
-    y_true = cluster_real_target.values.astype(float)
-
-    m_cluster = metrics(y_true, pred_cluster)
-    m_global = metrics(y_true, pred_global)
+    m_cluster = result["cluster"]
+    m_global = result["global"]
 
     #Display
-    plot_df = pd.DataFrame(
-        {
-            "Real (cluster)": y_true,
-            "Prediction Cluster-only": pred_cluster,
-            "Prediction Global (no clustering)": pred_global,
-        },
-        index=cluster_real_target.index,
-    )
-    plot_df.index.name = "Month"
-
-    st.line_chart(plot_df)
+    st.line_chart(result["plot"])
 
     st.subheader(
         "Prediction Error Metrics",
@@ -197,3 +158,28 @@ def render_prediction_tab(df: pd.DataFrame, centers: np.ndarray | None) -> None:
         "Cluster only method trains on the selected cluster’s monthly average usage; "
         "Global method trains on all customers’ monthly average usage (ignoring clusters)."
     )
+
+    if backtest is None:
+        st.caption("Run `python backtest.py` to compare the models over every rolling origin and horizon.")
+        return
+
+    st.subheader(
+        "Backtest over all rolling origins",
+        help=(
+            "From backtest.py: the models are re-fitted at every month with enough history and "
+            "scored 1–12 months ahead, so the comparison does not depend on one train/target split. "
+            "Per-customer forecasts are averaged over the cluster."
+        )
+    )
+    errors, _ = backtest
+    cluster_errors = errors[
+        (errors["cluster"] == selected_cluster)
+        & (errors["metric"] == "data_usage_mb")
+        & (errors["target"] == "cluster_mean")
+    ]
+    if cluster_errors.empty:
+        st.info("No backtest results for this cluster. Re-run backtest.py after re-clustering.")
+        return
+    by_horizon = summarize_backtest(cluster_errors, by=["horizon", "model"])
+    st.line_chart(by_horizon.pivot(index="horizon", columns="model", values="RMSE"))
+    st.caption("RMSE of the cluster's monthly data usage by forecast horizon (months ahead).")
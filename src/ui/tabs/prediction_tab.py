@@ -1,14 +1,18 @@
 import pandas as pd
 import streamlit as st
+from src.services.perf import timed
+from src.ui.views import view_fragment, view_selector
 from src.ui.tabs.prediction_system import render_prediction_tab
 
 
-def render_prediction_system_tab(df: pd.DataFrame, centers):
+@view_fragment
+@timed(name="render.prediction_system_tab")
+def render_prediction_system_tab(centers, cube, backtest=None):
     st.header("Prediction System (Data Usage)")
 
-    sub_overview, sub_prediction = st.tabs(["Data Usage overview", "Prediction"])
+    view = view_selector(["Data Usage overview", "Prediction"], key="prediction_view")
 
-    with sub_overview:
+    if view == "Data Usage overview":
         st.subheader("Data usage overview between clusters")
 
         if centers is None:
@@ -17,8 +21,7 @@ def render_prediction_system_tab(df: pd.DataFrame, centers):
             k_centers = centers.shape[0]
             t_steps = centers.shape[1]
 
-            min_date = pd.to_datetime(df["date"]).min()
-            start_month = min_date.to_period("M").to_timestamp()
+            start_month = cube.months()[0]
             x_dates = pd.date_range(start=start_month, periods=t_steps, freq="MS")
 
             usage_lines = {f"Cluster {c}": centers[c, :, 0] for c in range(k_centers)}
@@ -32,5 +35,11 @@ def render_prediction_system_tab(df: pd.DataFrame, centers):
                 "Values are z-scores (above 0 = above-average usage)."
             )
 
-    with sub_prediction:
-        render_prediction_tab(df, centers)
+            actual_df = pd.DataFrame({f"Cluster {c}": cube.series("data_usage_mb", c) for c in cube.clusters()})
+            actual_df["All customers"] = cube.series("data_usage_mb")
+            actual_df.index.name = "Month"
+            st.line_chart(actual_df)
+            st.caption("Average monthly data usage (MB) per cluster, from the precomputed aggregates.")
+
+    else:
+        render_prediction_tab(centers, cube, backtest)
@@ -1,7 +1,13 @@
+from typing import Optional
+
 import pandas as pd
 import numpy as np
 
-from src.ui.tabs.plans import PLAN_LIMITS, COSTS
+from src.services.billing import USAGE_COLUMNS, simulate_customer_bills, simulate_plans
+from src.services.fleet_recommendation import forecast_plan_bills, forecast_usage
+from src.services.memo import memoize
+from src.services.perf import timed
+from src.services.plan_catalog import PlanCatalog, get_catalog
 
 def expected_usage_last_months(cust_df: pd.DataFrame, months: int = 6) -> dict:
     g = cust_df.sort_values("date").tail(months)
@@ -13,68 +19,93 @@ def expected_usage_last_months(cust_df: pd.DataFrame, months: int = 6) -> dict:
         "roaming_minutes": float(g["roaming_minutes"].mean()),
     }
 
-def simulate_bill(usage: dict, plan: dict) -> dict:
-    base = plan["base_price_eur"]
-
-    extra_data = max(usage["data_usage_mb"] - plan["data_limit_mb"], 0) * COSTS["extra_data_per_mb"]
-    extra_voice = max(usage["voice_minutes"] - plan["voice_limit_min"], 0) * COSTS["extra_voice_per_min"]
-    extra_sms = max(usage["sms_count"] - plan["sms_limit"], 0) * COSTS["extra_sms_per_unit"]
-
-    extra_roam_mb = max(usage["roaming_data_mb"] - plan["roaming_limit_mb"], 0) * COSTS["extra_roaming_mb"]
-    extra_roam_min = max(usage["roaming_minutes"] - plan["roaming_limit_min"], 0) * COSTS["extra_roaming_min"]
-
-    total = base + extra_data + extra_voice + extra_sms + extra_roam_mb + extra_roam_min
-    overusage = extra_data + extra_voice + extra_sms + extra_roam_mb + extra_roam_min
+def usage_vector(usage: dict) -> np.ndarray:
+    # (5,) in USAGE_COLUMNS order
+    return np.array([usage[c] for c in USAGE_COLUMNS], dtype=float)
 
+def simulate_bill(usage: dict, plan_name: str, catalog: Optional[PlanCatalog] = None) -> dict:
+    catalog = (catalog or get_catalog()).subset([plan_name])
+    sim = simulate_plans(usage_vector(usage), catalog=catalog)
     return {
-        "expected_bill_eur": float(round(total, 2)),
-        "expected_overusage_eur": float(round(overusage, 2)),
-        "base_price_eur": float(base),
+        "expected_bill_eur": float(sim["expected_bill_eur"][0]),
+        "expected_overusage_eur": float(sim["expected_overusage_eur"][0]),
+        "base_price_eur": float(catalog.base[0]),
     }
 
-def recommend_plans(cust_df: pd.DataFrame, months: int = 6):
+def rank_plans(usage: dict, catalog: Optional[PlanCatalog] = None) -> pd.DataFrame:
+    # every plan of the catalog priced in one pass, cheapest first
+    catalog = catalog or get_catalog()
+    sim = simulate_plans(usage_vector(usage), catalog=catalog)
+    return (
+        pd.DataFrame({
+            "plan": catalog.names,
+            "expected_bill_eur": sim["expected_bill_eur"],
+            "expected_overusage_eur": sim["expected_overusage_eur"],
+            "base_price_eur": catalog.base,
+        })
+        .sort_values(["expected_bill_eur", "expected_overusage_eur"], ascending=True)
+        .reset_index(drop=True)
+    )
+
+@timed
+@memoize(resolve={"catalog": get_catalog})
+def recommend_plans(cust_df: pd.DataFrame, months: int = 6, catalog: Optional[PlanCatalog] = None):
     usage = expected_usage_last_months(cust_df, months=months)
+    return rank_plans(usage, catalog), usage
 
-    rows = []
-    for plan_name, plan in PLAN_LIMITS.items():
-        sim = simulate_bill(usage, plan)
-        rows.append({"plan": plan_name, **sim})
+@timed
+@memoize(resolve={"catalog": get_catalog})
+def recommend_plans_forecast(cust_df: pd.DataFrame, horizon: int = 12, catalog: Optional[PlanCatalog] = None):
+    # Rank plans by the bill over the next `horizon` months of forecast usage
+    # (trend + seasonality), instead of one month of average usage
+    catalog = catalog or get_catalog()
+    _, usage, _ = forecast_usage(cust_df, horizon)
+    bills, overusage, overuse_months = forecast_plan_bills(usage, catalog)
 
     ranked = (
-        pd.DataFrame(rows)
-        .sort_values(["expected_bill_eur", "expected_overusage_eur"], ascending=True)
+        pd.DataFrame({
+            "plan": catalog.names,
+            "forecast_bill_eur": np.round(bills[0], 2),
+            "avg_monthly_bill_eur": np.round(bills[0] / horizon, 2),
+            "forecast_overusage_eur": np.round(overusage[0], 2),
+            "overuse_months": overuse_months[0],
+        })
+        .sort_values(["forecast_bill_eur", "forecast_overusage_eur"], ascending=True, kind="stable")
         .reset_index(drop=True)
     )
-    return ranked, usage
+    return ranked, dict(zip(USAGE_COLUMNS, usage[0].mean(axis=0).tolist()))
 
-def compute_overusage(usage: dict, plan: dict) -> dict:
-    return {
-        "data_over_mb": max(usage["data_usage_mb"] - plan["data_limit_mb"], 0),
-        "voice_over_min": max(usage["voice_minutes"] - plan["voice_limit_min"], 0),
-        "sms_over": max(usage["sms_count"] - plan["sms_limit"], 0),
-        "roam_data_over_mb": max(usage["roaming_data_mb"] - plan["roaming_limit_mb"], 0),
-        "roam_min_over": max(usage["roaming_minutes"] - plan["roaming_limit_min"], 0),
-    }
+# keys of compute_overusage / compute_underuse, in USAGE_COLUMNS order
+OVER_KEYS = ["data_over_mb", "voice_over_min", "sms_over", "roam_data_over_mb", "roam_min_over"]
+UNUSED_KEYS = ["data_unused_mb", "voice_unused_min", "sms_unused", "roam_data_unused_mb", "roam_min_unused"]
+
+def _plan_limits(plan_name: str, catalog: Optional[PlanCatalog] = None) -> np.ndarray:
+    return (catalog or get_catalog()).subset([plan_name]).limits[0]
+
+def compute_overusage(usage: dict, plan_name: str, catalog: Optional[PlanCatalog] = None) -> dict:
+    over = np.maximum(usage_vector(usage) - _plan_limits(plan_name, catalog), 0.0)
+    return dict(zip(OVER_KEYS, over.tolist()))
 
-def compute_underuse(usage: dict, plan: dict) -> dict:
+def compute_underuse(usage: dict, plan_name: str, catalog: Optional[PlanCatalog] = None) -> dict:
     # how much of plan is unused (only meaningful if usage is below limit)
-    return {
-        "data_unused_mb": max(plan["data_limit_mb"] - usage["data_usage_mb"], 0),
-        "voice_unused_min": max(plan["voice_limit_min"] - usage["voice_minutes"], 0),
-        "sms_unused": max(plan["sms_limit"] - usage["sms_count"], 0),
-        "roam_data_unused_mb": max(plan["roaming_limit_mb"] - usage["roaming_data_mb"], 0),
-        "roam_min_unused": max(plan["roaming_limit_min"] - usage["roaming_minutes"], 0),
-    }
+    unused = np.maximum(_plan_limits(plan_name, catalog) - usage_vector(usage), 0.0)
+    return dict(zip(UNUSED_KEYS, unused.tolist()))
 
-def explain_recommendation(current_plan_name: str, recommended_plan_name: str, usage: dict) -> list[str]:
-    cur = PLAN_LIMITS[current_plan_name]
-    rec = PLAN_LIMITS[recommended_plan_name]
+def explain_recommendation(
+    current_plan_name: str,
+    recommended_plan_name: str,
+    usage: dict,
+    catalog: Optional[PlanCatalog] = None,
+) -> list[str]:
+    catalog = catalog or get_catalog()
+    cur = catalog.plan(current_plan_name)
+    rec = catalog.plan(recommended_plan_name)
 
-    cur_bill = simulate_bill(usage, cur)["expected_bill_eur"]
-    rec_bill = simulate_bill(usage, rec)["expected_bill_eur"]
+    cur_bill = simulate_bill(usage, current_plan_name, catalog)["expected_bill_eur"]
+    rec_bill = simulate_bill(usage, recommended_plan_name, catalog)["expected_bill_eur"]
 
-    cur_over = compute_overusage(usage, cur)
-    cur_under = compute_underuse(usage, cur)
+    cur_over = compute_overusage(usage, current_plan_name, catalog)
+    cur_under = compute_underuse(usage, current_plan_name, catalog)
 
     bullets = []
 
@@ -118,63 +149,33 @@ def explain_recommendation(current_plan_name: str, recommended_plan_name: str, u
 
     return bullets
 
-def build_mismatch_table(usage: dict, current_plan_name: str, recommended_plan_name: str) -> pd.DataFrame:
-    cur = PLAN_LIMITS[current_plan_name]
-    rec = PLAN_LIMITS[recommended_plan_name]
-
-    rows = [
-        ("Data (MB)", usage["data_usage_mb"], cur["data_limit_mb"], rec["data_limit_mb"]),
-        ("Voice (min)", usage["voice_minutes"], cur["voice_limit_min"], rec["voice_limit_min"]),
-        ("SMS", usage["sms_count"], cur["sms_limit"], rec["sms_limit"]),
-        ("Roaming data (MB)", usage["roaming_data_mb"], cur["roaming_limit_mb"], rec["roaming_limit_mb"]),
-        ("Roaming minutes", usage["roaming_minutes"], cur["roaming_limit_min"], rec["roaming_limit_min"]),
-    ]
+def build_mismatch_table(
+    usage: dict,
+    current_plan_name: str,
+    recommended_plan_name: str,
+    catalog: Optional[PlanCatalog] = None,
+) -> pd.DataFrame:
+    limits = (catalog or get_catalog()).subset([current_plan_name, recommended_plan_name]).limits
 
-    out = pd.DataFrame(rows, columns=["Metric", "Expected usage", "Current limit", "Recommended limit"])
+    out = pd.DataFrame({
+        "Metric": ["Data (MB)", "Voice (min)", "SMS", "Roaming data (MB)", "Roaming minutes"],
+        "Expected usage": usage_vector(usage),
+        "Current limit": limits[0],
+        "Recommended limit": limits[1],
+    })
 
     # Add status columns
-    out["Current status"] = out.apply(
-        lambda r: "OVER" if r["Expected usage"] > r["Current limit"] else "OK",
-        axis=1
-    )
-    out["Recommended status"] = out.apply(
-        lambda r: "OVER" if r["Expected usage"] > r["Recommended limit"] else "OK",
-        axis=1
-    )
+    out["Current status"] = np.where(out["Expected usage"] > out["Current limit"], "OVER", "OK")
+    out["Recommended status"] = np.where(out["Expected usage"] > out["Recommended limit"], "OVER", "OK")
 
     #Round for better display
     out["Expected usage"] = out["Expected usage"].round(1)
     return out
 
-def recommend_plans_from_usage(usage: dict) -> pd.DataFrame:
-    rows = []
-    for plan_name, plan in PLAN_LIMITS.items():
-        sim = simulate_bill(usage, plan)
-        rows.append({"plan": plan_name, **sim})
-
-    ranked = (
-        pd.DataFrame(rows)
-        .sort_values(["expected_bill_eur", "expected_overusage_eur"], ascending=True)
-        .reset_index(drop=True)
-    )
-    return ranked
-
-def simulate_bill_from_row(row: pd.Series, plan: dict) -> float:
-    usage = {
-        "data_usage_mb": float(row["data_usage_mb"]),
-        "voice_minutes": float(row["voice_minutes"]),
-        "sms_count": float(row["sms_count"]),
-        "roaming_data_mb": float(row["roaming_data_mb"]),
-        "roaming_minutes": float(row["roaming_minutes"]),
-    }
-    return simulate_bill(usage, plan)["expected_bill_eur"]
-
-def simulate_monthly_bills(cust_df: pd.DataFrame, plan_name: str) -> pd.Series:
-    plan = PLAN_LIMITS[plan_name]
-    g = cust_df.sort_values("date")
-    bills = g.apply(lambda r: simulate_bill_from_row(r, plan), axis=1)
-    bills.index = g["date"].values
-    return bills
+@timed
+@memoize(resolve={"catalog": get_catalog})
+def recommend_plans_from_usage(usage: dict, catalog: Optional[PlanCatalog] = None) -> pd.DataFrame:
+    return rank_plans(usage, catalog)
 
 def unexpected_bill_increase_metrics(
     bills: pd.Series,
@@ -202,40 +203,42 @@ def unexpected_bill_increase_metrics(
         "unexpected_increase_count": int(np.sum(unexpected)),
     }
 
+@timed
+@memoize(resolve={"catalog": get_catalog})
 def recommend_plans_churn_rule_based(
     cust_df: pd.DataFrame,
     increase_pct: float = 0.25,
     max_unexpected_increase_rate: float = 0.10,
     min_months: int = 3,
+    catalog: Optional[PlanCatalog] = None,
 ) -> pd.DataFrame:
-    rows = []
-
-    for plan_name in PLAN_LIMITS.keys():
-        bills = simulate_monthly_bills(cust_df, plan_name)
-
-        if len(bills) < min_months:
-            metrics = {
-                "avg_bill": float(np.mean(bills)) if len(bills) else 0.0,
-                "std_bill": 0.0,
-                "unexpected_increase_rate": None,
-                "unexpected_increase_count": 0,
-            }
-        else:
-            m = unexpected_bill_increase_metrics(bills, increase_pct=increase_pct)
-            metrics = m
-
-        rows.append({
-            "plan": plan_name,
-            "avg_bill_eur": round(metrics["avg_bill"], 2),
-            "bill_std_eur": round(metrics["std_bill"], 2),
-            "unexpected_increase_rate": (
-                None if metrics["unexpected_increase_rate"] is None
-                else round(metrics["unexpected_increase_rate"], 3)
-            ),
-            "unexpected_increase_count": metrics["unexpected_increase_count"],
-        })
+    # all plans priced in one pass, one column per plan; the metrics of
+    # unexpected_bill_increase_metrics are computed for every column at once
+    all_bills, _ = simulate_customer_bills(cust_df, catalog=catalog)
+    b = all_bills.to_numpy()
+    n_plans = b.shape[1]
 
-    df = pd.DataFrame(rows)
+    avg = b.mean(axis=0) if len(b) else np.zeros(n_plans)
+    if len(b) < 2:
+        std = np.zeros(n_plans)
+        counts = np.zeros(n_plans, dtype=int)
+        rates = np.zeros(n_plans)
+    else:
+        prev = b[:-1]
+        pct_increase = (b[1:] - prev) / np.maximum(prev, 1e-6)
+        unexpected = pct_increase > increase_pct
+        std = b.std(axis=0)
+        counts = unexpected.sum(axis=0)
+        rates = unexpected.mean(axis=0)
+
+    short = len(b) < min_months
+    df = pd.DataFrame({
+        "plan": list(all_bills.columns),
+        "avg_bill_eur": np.round(avg, 2),
+        "bill_std_eur": 0.0 if short else np.round(std, 2),
+        "unexpected_increase_rate": [None] * n_plans if short else np.round(rates, 3),
+        "unexpected_increase_count": 0 if short else counts,
+    })
 
     df["stable"] = df["unexpected_increase_rate"].apply(
         lambda x: (x is not None) and (x <= max_unexpected_increase_rate)
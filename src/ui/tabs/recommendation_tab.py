@@ -1,18 +1,29 @@
 import pandas as pd
 import streamlit as st
 
+from src.services.perf import timed
+from src.services.plan_catalog import get_catalog
 from src.ui.tabs.recommendation import (
     recommend_plans,
     explain_recommendation,
     build_mismatch_table,
     recommend_plans_churn_rule_based,
+    recommend_plans_forecast,
     expected_usage_last_months,
 )
 
+FORECAST_MONTHS = 12
 
+
+@timed(name="render.recommendation_tab")
 def render_recommendation_tab(cust_df):
     st.subheader("Recommendation mode")
     use_churn_aware = st.toggle("Churn-aware (avoid unexpected bill increases)", value=True)
+    use_forecast = False
+    if not use_churn_aware:
+        use_forecast = st.toggle(
+            f"Forecast the next {FORECAST_MONTHS} months (trend + seasonality)", value=False
+        )
 
     if use_churn_aware:
         increase_pct = st.slider(
@@ -36,7 +47,9 @@ def render_recommendation_tab(cust_df):
             "base price + extra charges if usage exceeds plan limits. Plans are ranked by lowest "
             "estimated cost (and lowest overusage cost as a tie-breaker). "
             "If churn-aware mode is enabled, we instead simulate bills month-by-month and exclude plans "
-            "that show frequent unexpected bill jumps (above a chosen % threshold), then recommend the cheapest stable plan."
+            "that show frequent unexpected bill jumps (above a chosen % threshold), then recommend the cheapest stable plan. "
+            "In forecast mode, usage of the next 12 months is forecast per metric (linear trend + 12-month seasonality) "
+            "and plans are ranked by the total simulated bill over those months."
         )
     )
 
@@ -51,6 +64,9 @@ def render_recommendation_tab(cust_df):
         )
         usage = expected_usage_last_months(cust_df, months=months)
         bill_col = "avg_bill_eur"
+    elif use_forecast:
+        ranked, usage = recommend_plans_forecast(cust_df, horizon=FORECAST_MONTHS)
+        bill_col = "avg_monthly_bill_eur"
     else:
         ranked, usage = recommend_plans(cust_df, months=months)
         bill_col = "expected_bill_eur"
@@ -72,6 +88,8 @@ def render_recommendation_tab(cust_df):
         st.caption(
             "Rule: exclude plans with frequent unexpected bill increases, then choose the cheapest stable plan."
         )
+    elif use_forecast:
+        st.subheader(f"Plan ranking (forecast bill, next {FORECAST_MONTHS} months)")
     else:
         st.subheader("Plan ranking (expected monthly bill)")
 
@@ -80,10 +98,18 @@ def render_recommendation_tab(cust_df):
     best_plan = ranked.iloc[0]["plan"]
     best_bill = float(ranked.iloc[0][bill_col])
 
-    label = "avg bill" if use_churn_aware else "expected bill"
+    label = "avg bill" if use_churn_aware else "avg forecast bill" if use_forecast else "expected bill"
     extra = " (churn-aware: stable billing)" if use_churn_aware else ""
     st.success(f"Recommended plan: **{best_plan}** — {label}: **€{best_bill:.2f}**{extra}")
 
+    # e.g. a $TELECOM_PLAN_CATALOG without the customer's plan: nothing to compare against
+    if current_plan not in get_catalog().names:
+        st.warning(
+            f"The current plan (**{current_plan}**) is not in the plan catalog, "
+            "so it cannot be compared with the recommendation."
+        )
+        return
+
     st.subheader("Why this plan?")
     explanations = explain_recommendation(current_plan, best_plan, usage)
     for e in explanations:
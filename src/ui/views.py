@@ -0,0 +1,35 @@
+import functools
+
+import streamlit as st
+
+from src.services import perf
+from src.ui.sidebar import performance_recorder
+
+
+def view_selector(options, key: str) -> str:
+    # Stands in for st.tabs, which runs the code of every tab on each rerun:
+    # a row of options of which only the chosen view is rendered.
+    # Wrap the view in st.fragment so its own widgets rerun only that view.
+    return st.radio("View", options, key=key, horizontal=True, label_visibility="collapsed")
+
+
+def view_fragment(fn):
+    # st.fragment for a main view. A rerun of the fragment alone skips main(),
+    # so the view then records its own run into the session's recorder.
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        if perf.active() is not None:
+            # part of a full rerun, recorded by main()
+            return fn(*args, **kwargs)
+        recorder = performance_recorder()
+        if recorder is None:
+            return fn(*args, **kwargs)
+        perf.activate(recorder)
+        try:
+            with perf.span("app.fragment_rerun"):
+                return fn(*args, **kwargs)
+        finally:
+            perf.activate(None)
+            recorder.end_run()
+
+    return st.fragment(run)
@@ -0,0 +1,14 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# the app's modules are imported as `src....` from the project root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.config import get_paths  # noqa: E402
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return get_paths(tmp_path)
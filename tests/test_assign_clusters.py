@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+from src.config import DTWSettings
+from src.dataset import apply_schema
+from src.storage import load_enriched, save_centers, upsert_enriched
+from src.services.clustering_service import (
+    apply_cluster_labels,
+    assign_to_saved_centers,
+    changed_customers,
+    customer_history,
+    stored_labels,
+    update_centers_minibatch,
+)
+from src.services.dtw_clustering import dtw_cluster
+from src.services.preprocessing import build_time_series
+from src.services.synthetic import generate_chunk
+
+CUSTOMERS = 12
+MONTHS = 36
+
+
+def _stored(paths):
+    # a clustered history of CUSTOMERS x MONTHS records, saved like a full run
+    history = apply_schema(generate_chunk(0, CUSTOMERS, CUSTOMERS, months=MONTHS, seed=1))
+    series, customer_ids = build_time_series(history)
+    labels, model = dtw_cluster(series, k=3, settings=DTWSettings())
+    labeled = apply_cluster_labels(history, pd.DataFrame({"customer_id": customer_ids, "dtw_cluster": labels}))
+    upsert_enriched(labeled, paths)
+    save_centers(model.cluster_centers_, 3, paths, settings=DTWSettings())
+    return load_enriched(paths)[0], model.cluster_centers_
+
+
+def _assign(new_df, paths, centers):
+    # the steps of `python assign_clusters.py --input ...`
+    enriched, _ = load_enriched(paths)
+    to_label = changed_customers(new_df, enriched)
+    rows = customer_history(new_df, enriched, to_label)
+    cluster_df, series = assign_to_saved_centers(rows, centers, DTWSettings())
+    upsert_enriched(apply_cluster_labels(rows, cluster_df), paths)
+    return to_label, cluster_df, series
+
+
+def test_new_month_keeps_customer_history(paths):
+    enriched, centers = _stored(paths)
+    last = enriched[enriched["date"] == enriched["date"].max()]
+    new_month = last[last["customer_id"].isin(["C00001", "C00002", "C00003"])].drop(columns="dtw_cluster")
+    new_month = new_month.assign(date=new_month["date"] + pd.DateOffset(months=1), month=new_month["month"] % 12 + 1)
+
+    to_label, cluster_df, series = _assign(new_month, paths, centers)
+
+    after, _ = load_enriched(paths)
+    assert sorted(to_label) == ["C00001", "C00002", "C00003"]
+    assert len(after) == CUSTOMERS * MONTHS + 3
+    counts = after.groupby("customer_id", observed=True).size()
+    assert (counts[["C00001", "C00002", "C00003"]] == MONTHS + 1).all()
+    # labeled from the whole merged series, not from the new month alone
+    assert series.shape[1] == MONTHS + 1
+    expected, _ = assign_to_saved_centers(after[after["customer_id"].isin(to_label)], centers)
+    assert cluster_df["dtw_cluster"].tolist() == expected["dtw_cluster"].tolist()
+    # each customer keeps one label over all of their records
+    assert (after.groupby("customer_id", observed=True)["dtw_cluster"].nunique() == 1).all()
+
+
+def test_corrected_month_replaces_only_that_record(paths):
+    enriched, centers = _stored(paths)
+    fix = enriched[(enriched["customer_id"] == "C00004") & (enriched["date"] == enriched["date"].min())]
+    fix = fix.drop(columns="dtw_cluster").assign(data_usage_mb=np.float32(12345.0))
+
+    to_label, _, _ = _assign(fix, paths, centers)
+
+    after, _ = load_enriched(paths)
+    assert list(to_label) == ["C00004"]
+    assert len(after) == CUSTOMERS * MONTHS
+    customer = after[after["customer_id"] == "C00004"]
+    assert len(customer) == MONTHS
+    assert customer["data_usage_mb"].iloc[0] == 12345.0
+    assert customer["data_usage_mb"].iloc[1:].tolist() == \
+        enriched[enriched["customer_id"] == "C00004"]["data_usage_mb"].iloc[1:].tolist()
+
+
+def test_unchanged_records_are_not_relabeled(paths):
+    enriched, _ = _stored(paths)
+    same = enriched[enriched["customer_id"] == "C00005"].drop(columns="dtw_cluster")
+    assert len(changed_customers(same, enriched)) == 0
+
+
+def test_center_update_counts_each_customer_once(paths):
+    enriched, centers = _stored(paths)
+    sizes = np.bincount(enriched.drop_duplicates("customer_id")["dtw_cluster"], minlength=3)
+    # two customers of different clusters swap their corrected usage, so both
+    # move, and one new customer joins
+    first = enriched.drop_duplicates("customer_id").drop_duplicates("dtw_cluster")["customer_id"].astype(str)
+    a, b = first.iloc[0], first.iloc[1]
+    records = {c: enriched[enriched["customer_id"] == c].drop(columns="dtw_cluster").reset_index(drop=True)
+               for c in (a, b)}
+    usage = ["data_usage_mb", "voice_minutes", "sms_count", "roaming_data_mb", "roaming_minutes"]
+    swapped = [records[a].assign(**records[b][usage]), records[b].assign(**records[a][usage])]
+    new = apply_schema(generate_chunk(CUSTOMERS, 1, CUSTOMERS + 1, months=MONTHS, seed=2))
+    new_df = pd.concat(swapped + [new], ignore_index=True)
+
+    to_label, cluster_df, series = _assign(new_df, paths, centers)
+    previous = stored_labels(enriched, cluster_df["customer_id"])
+    labels = cluster_df["dtw_cluster"].to_numpy()
+    assert previous[-1] == -1
+    assert (previous[:2] == labels[:2][::-1]).all() and (previous[:2] != labels[:2]).all()
+
+    _, updated = update_centers_minibatch(
+        centers, series, labels, sizes, DTWSettings(),
+        previous_labels=previous,
+    )
+    after, _ = load_enriched(paths)
+    assert updated.tolist() == np.bincount(after.drop_duplicates("customer_id")["dtw_cluster"], minlength=3).tolist()
+    assert updated.sum() == CUSTOMERS + 1
@@ -0,0 +1,63 @@
+import pandas as pd
+
+from batch_recommend import BATCH_COLUMNS, run_batch
+from src.dataset import apply_schema
+from src.services.memo import clear_memo
+from src.services.synthetic import generate_chunk
+from src.ui.tabs.evaluation import evaluate_before_after
+from src.ui.tabs.recommendation import recommend_plans, recommend_plans_churn_rule_based
+
+PARAMS = {"months": 6, "increase_pct": 0.25, "max_unexpected_increase_rate": 0.10, "min_months": 3}
+
+
+def _history():
+    # 60 customers with 1 to 24 months of history; a few moved plan last month
+    df = generate_chunk(0, 60, 60, months=24, seed=3)
+    n_months = {c: 1 + i % 24 for i, c in enumerate(df["customer_id"].unique())}
+    rank = df.groupby("customer_id").cumcount(ascending=False)
+    df = df[rank < df["customer_id"].map(n_months)].copy()
+    latest = rank.loc[df.index] == 0
+    moved = latest & df["customer_id"].isin(["C00005", "C00020", "C00042"])
+    df.loc[moved, "current_plan_type"] = "SuperPremium"
+    return apply_schema(df)[[c for c in BATCH_COLUMNS if c != "dtw_cluster"]]
+
+
+def _per_customer(g: pd.DataFrame) -> dict:
+    # the same row from the single-customer functions of the app
+    current = g.sort_values("date")["current_plan_type"].iloc[-1]
+    ranked, _ = recommend_plans(g, months=PARAMS["months"])
+    cur_bill = ranked.loc[ranked["plan"] == current, "expected_bill_eur"].iloc[0]
+    churn_plan = recommend_plans_churn_rule_based(g, increase_pct=0.25).iloc[0]["plan"]
+    before, after = evaluate_before_after(g, current, churn_plan, increase_pct=0.25).iloc[:2].to_dict("records")
+    return {
+        "customer_id": g["customer_id"].iloc[0],
+        "current_plan": current,
+        "cost_recommended_plan": ranked.iloc[0]["plan"],
+        "cost_expected_bill_eur": ranked.iloc[0]["expected_bill_eur"],
+        "cost_expected_savings_eur": round(cur_bill - ranked.iloc[0]["expected_bill_eur"], 2),
+        "churn_recommended_plan": churn_plan,
+        "churn_avg_bill_eur": after["avg_bill_eur"],
+        "churn_expected_savings_eur": round(before["avg_bill_eur"] - after["avg_bill_eur"], 2),
+        "bill_std_before_eur": before["bill_std_eur"],
+        "bill_std_after_eur": after["bill_std_eur"],
+        "unexpected_increase_rate_before": before["unexpected_increase_rate"],
+        "unexpected_increase_rate_after": after["unexpected_increase_rate"],
+        "overuse_rate_before": before["overuse_rate"],
+        "overuse_rate_after": after["overuse_rate"],
+    }
+
+
+def test_batch_matches_the_single_customer_functions():
+    clear_memo()
+    df = _history()
+    out = run_batch(df, workers=1, params=PARAMS, chunks_per_worker=3)
+    expected = pd.DataFrame([
+        _per_customer(g) for _, g in df.groupby("customer_id", sort=True, observed=True)
+    ])
+
+    assert len(out) == df["customer_id"].nunique()
+    out = out.assign(customer_id=out["customer_id"].astype(str))
+    expected = expected.assign(customer_id=expected["customer_id"].astype(str))
+    pd.testing.assert_frame_equal(out, expected, check_dtype=False, check_exact=True)
+    moved = out.set_index("customer_id").loc[["C00005", "C00020", "C00042"], "current_plan"]
+    assert (moved == "SuperPremium").all()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from src.services.billing import USAGE_COLUMNS, round_decimal, simulate_plans
+from src.services.synthetic import generate_chunk
+from src.ui.tabs.plans import COSTS, PLAN_LIMITS
+
+
+def _scalar_bill(usage: dict, plan: dict) -> tuple:
+    # the original per-plan formula, term by term
+    extra_data = max(usage["data_usage_mb"] - plan["data_limit_mb"], 0) * COSTS["extra_data_per_mb"]
+    extra_voice = max(usage["voice_minutes"] - plan["voice_limit_min"], 0) * COSTS["extra_voice_per_min"]
+    extra_sms = max(usage["sms_count"] - plan["sms_limit"], 0) * COSTS["extra_sms_per_unit"]
+    extra_roam_mb = max(usage["roaming_data_mb"] - plan["roaming_limit_mb"], 0) * COSTS["extra_roaming_mb"]
+    extra_roam_min = max(usage["roaming_minutes"] - plan["roaming_limit_min"], 0) * COSTS["extra_roaming_min"]
+
+    total = plan["base_price_eur"] + extra_data + extra_voice + extra_sms + extra_roam_mb + extra_roam_min
+    overusage = extra_data + extra_voice + extra_sms + extra_roam_mb + extra_roam_min
+    return float(round(total, 2)), float(round(overusage, 2))
+
+
+def test_tensor_bills_match_the_scalar_formula():
+    df = generate_chunk(0, 200, 200, months=12, seed=7)
+    usage = np.column_stack([df[c].to_numpy(dtype=float) for c in USAGE_COLUMNS])
+    # fractional usage, like the trailing means the recommendation prices
+    usage = np.vstack([usage, usage * 1.0371, usage / 3.0])
+    sim = simulate_plans(usage)
+
+    for i, row in enumerate(usage):
+        values = dict(zip(USAGE_COLUMNS, row.tolist()))
+        for p, plan in enumerate(PLAN_LIMITS.values()):
+            bill, overusage = _scalar_bill(values, plan)
+            assert sim["expected_bill_eur"][i, p] == bill
+            assert sim["expected_overusage_eur"][i, p] == overusage
+
+
+def test_round_decimal_rounds_like_python():
+    values = np.array([2.675, 1.005, 0.125, 0.135, -2.675, 15.955, 1e6 + 0.005, 3.0, np.nan])
+    out = round_decimal(values, 2)
+    assert out[:-1].tolist() == [round(v, 2) for v in values[:-1].tolist()]
+    assert np.isnan(out[-1])
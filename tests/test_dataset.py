@@ -0,0 +1,17 @@
+import pandas as pd
+
+from src.dataset import SCHEMA, read_csv_records
+from src.services.synthetic import write_synthetic
+
+MONEY_COLUMNS = ["base_price_eur", "bill_amount_eur"]
+
+
+def test_money_columns_keep_the_exported_values(tmp_path):
+    path = tmp_path / "records.csv"
+    write_synthetic(path, 20, months=12, fmt="csv")
+
+    typed = read_csv_records(path)
+    plain = pd.read_csv(path)
+    for col in MONEY_COLUMNS:
+        assert SCHEMA[col] == "float64"
+        assert typed[col].tolist() == plain[col].tolist()
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.metrics import silhouette_score
+from tslearn.metrics import cdist_dtw
+
+from src.config import DTWSettings
+from src.services.clustering_service import customer_pairwise_distances, similar_customer_table
+from src.services.dtw_clustering import dtw_silhouette_score
+from src.storage import load_distance_cache, save_distance_cache
+
+
+def _series(n=30, steps=12, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, steps, 2))
+
+
+def test_pairwise_cache_matches_full_matrix(paths):
+    X = _series()
+    full = cdist_dtw(X)
+    condensed = customer_pairwise_distances(X, DTWSettings(), paths)
+    assert np.allclose(condensed, full[np.triu_indices(len(X), k=1)], atol=1e-5)
+    # the second call reads the cached file
+    assert customer_pairwise_distances(X, DTWSettings(), paths).filename == condensed.filename
+
+
+def test_lookups_read_cached_distances(paths):
+    X = _series()
+    full = cdist_dtw(X)
+    condensed = customer_pairwise_distances(X, DTWSettings(), paths)
+    ids = np.array([f"C{i:05d}" for i in range(len(X))], dtype=object)
+
+    similar = similar_customer_table(condensed, ids, "C00007", top=3)
+    nearest = np.argsort(np.where(np.arange(len(X)) == 7, np.inf, full[7]))[:3]
+    assert similar["customer_id"].tolist() == ids[nearest].tolist()
+
+    labels = np.arange(len(X)) % 3
+    expected = silhouette_score(full, labels, metric="precomputed")
+    assert np.isclose(dtw_silhouette_score(condensed, labels), expected, atol=1e-5)
+
+
+def _fill_with(value):
+    def fill(out):
+        out[:] = value
+    return fill
+
+
+def test_failed_fill_leaves_no_file(paths):
+    def fill(out):
+        out[:2] = 1.0
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        save_distance_cache("pairwise", "broken", (4,), fill, paths)
+    assert list(paths.distance_cache_dir.iterdir()) == []
+    assert load_distance_cache("pairwise", "broken", paths) is None
+
+
+def test_only_the_most_recently_used_files_are_kept(paths):
+    for i in range(3):
+        save_distance_cache("pairwise", f"key{i}", (4,), _fill_with(i), paths, keep=3)
+        # spread the modification times, oldest first
+        path = paths.distance_cache_dir / f"pairwise_key{i}.npy"
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    save_distance_cache("centers", "other", (4,), _fill_with(9), paths, keep=3)
+
+    # reading key0 makes it the most recently used one
+    assert load_distance_cache("pairwise", "key0", paths)[0] == 0
+    save_distance_cache("pairwise", "key3", (4,), _fill_with(3), paths, keep=3)
+
+    assert sorted(p.name for p in paths.distance_cache_dir.iterdir()) == [
+        "centers_other.npy", "pairwise_key0.npy", "pairwise_key2.npy", "pairwise_key3.npy",
+    ]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from tslearn.clustering import TimeSeriesKMeans
+
+from src.config import DTWSettings
+from src.services.dtw_clustering import MAX_ITER, dtw_cluster
+
+
+def _series(n=40, steps=24, seed=0):
+    # a few noisy shapes, so that the clusters are not arbitrary
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0, 2 * np.pi, steps)
+    shapes = np.stack([np.sin(t), np.cos(t), t / t.max(), -t / t.max()])
+    X = shapes[rng.integers(0, len(shapes), n)] + rng.normal(0, 0.3, (n, steps))
+    return np.stack([X, 0.5 * X + rng.normal(0, 0.1, (n, steps))], axis=2)
+
+
+@pytest.mark.parametrize("settings", [
+    DTWSettings(),
+    DTWSettings(global_constraint="sakoe_chiba", sakoe_chiba_radius=2),
+    DTWSettings(global_constraint="itakura", itakura_max_slope=2.0),
+])
+def test_pruned_kmeans_matches_stock_tslearn(settings):
+    # PrunedTimeSeriesKMeans overrides tslearn's private _assign: the results
+    # must stay those of TimeSeriesKMeans
+    X = _series()
+    labels, model = dtw_cluster(X, k=4, settings=settings)
+
+    stock = TimeSeriesKMeans(
+        n_clusters=4,
+        metric="dtw",
+        max_iter=MAX_ITER,
+        random_state=42,
+        metric_params=settings.metric_params() or None,
+    )
+    expected = stock.fit_predict(X)
+
+    assert labels.tolist() == expected.tolist()
+    assert np.isclose(model.inertia_, stock.inertia_)
+    assert np.allclose(model.cluster_centers_, stock.cluster_centers_)
+    assert model.dtw_computed_ < model.dtw_candidates_
@@ -0,0 +1,46 @@
+from src.dataset import apply_schema
+from src.services.memo import clear_memo, memoize, versioned
+from src.services.plan_catalog import CATALOG_ENV, DEFAULT_CATALOG
+from src.services.synthetic import generate_chunk
+from src.ui.tabs.evaluation import evaluate_before_after
+from src.ui.tabs.recommendation import recommend_plans
+
+
+def _customer():
+    df = apply_schema(generate_chunk(0, 1, 1, months=12))
+    return versioned(df, "test-version", ("customer", "C00001"))
+
+
+def test_memoized_calls_follow_the_catalog_file(tmp_path, monkeypatch):
+    clear_memo()
+    cust_df = _customer()
+    before, _ = recommend_plans(cust_df, months=6)
+    evaluation = evaluate_before_after(cust_df, "Basic", "Premium")
+
+    plans = DEFAULT_CATALOG.to_frame()
+    plans["base_price_eur"] += 100.0
+    path = tmp_path / "plans.csv"
+    plans.to_csv(path, index=False)
+    monkeypatch.setenv(CATALOG_ENV, str(path))
+
+    after, _ = recommend_plans(cust_df, months=6)
+    assert (after["base_price_eur"] == before["base_price_eur"] + 100.0).all()
+    changed = evaluate_before_after(cust_df, "Basic", "Premium")
+    assert changed["avg_bill_eur"].iloc[0] == evaluation["avg_bill_eur"].iloc[0] + 100.0
+
+
+def test_resolved_arguments_are_part_of_the_key():
+    calls = []
+    current = {"value": 1}
+
+    @memoize(resolve={"factor": lambda: current["value"]})
+    def scaled(x, factor=None):
+        calls.append(factor)
+        return x * factor
+
+    assert scaled(2) == 2
+    assert scaled(2) == 2
+    current["value"] = 3
+    assert scaled(2) == 6
+    assert scaled(2, factor=1) == 2
+    assert calls == [1, 3]
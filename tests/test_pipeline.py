@@ -0,0 +1,38 @@
+from src.storage import load_enriched, load_raw
+from src.services.incremental import append_month
+from src.services.pipeline import run_pipeline
+from src.services.synthetic import generate_chunk, write_synthetic
+
+CUSTOMERS = 12
+MONTHS = 24
+
+
+def _statuses(results):
+    return {r["stage"]: r["status"] for r in results}
+
+
+def test_rerun_keeps_appended_months(paths):
+    write_synthetic(paths.raw_data, CUSTOMERS, months=MONTHS, fmt="csv")
+    run_pipeline(paths, k=2)
+
+    # one more month of every customer, added without a full run
+    longer = generate_chunk(0, CUSTOMERS, CUSTOMERS, months=MONTHS + 1)
+    append_month(longer[longer["date"] == longer["date"].max()], paths)
+
+    statuses = _statuses(run_pipeline(paths, k=2))
+    assert statuses["ingest"] == "up to date"
+    assert statuses["timeseries"] == "ran"
+
+    enriched, _ = load_enriched(paths)
+    assert len(load_raw(paths)) == len(enriched) == CUSTOMERS * (MONTHS + 1)
+    assert enriched["date"].max() == longer["date"].max()
+    assert set(_statuses(run_pipeline(paths, k=2)).values()) == {"up to date"}
+
+
+def test_changed_export_is_ingested_again(paths):
+    write_synthetic(paths.raw_data, CUSTOMERS, months=MONTHS, fmt="csv")
+    run_pipeline(paths, k=2)
+
+    write_synthetic(paths.raw_data, CUSTOMERS, months=MONTHS, seed=1, fmt="csv")
+    statuses = _statuses(run_pipeline(paths, k=2))
+    assert statuses["ingest"] == "ran"
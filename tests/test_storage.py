@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import storage
+from src.dataset import apply_schema
+from src.config import DTWSettings
+from src.storage import (
+    load_customer_state, load_enriched, load_sweep_result, save_customer_state, save_enriched,
+    save_sweep_result, save_sweep_summary,
+)
+from src.services.synthetic import generate_chunk
+
+
+def _records(months=12):
+    return apply_schema(generate_chunk(0, 5, 5, months=months)).assign(dtw_cluster=1)
+
+
+def test_failed_write_keeps_the_stored_dataset(paths):
+    save_enriched(_records(), paths)
+    broken = _records(months=13).assign(dtw_cluster=np.nan)
+
+    with pytest.raises(ValueError):
+        save_enriched(broken, paths)
+
+    df, fmt = load_enriched(paths)
+    assert fmt == "parquet"
+    assert len(df) == 5 * 12
+    assert not paths.enriched_csv.exists()
+
+
+def test_failed_write_keeps_the_customer_state(paths):
+    save_enriched(_records(), paths)
+    # labels of customers re-assigned by append_month since the last full write
+    ids = [f"C0000{i}" for i in range(1, 6)]
+    save_customer_state(pd.DataFrame({"customer_id": ids, "dtw_cluster": 2}), paths, series=np.zeros((5, 12, 4)))
+
+    with pytest.raises(ValueError):
+        save_enriched(_records(months=13).assign(dtw_cluster=np.nan), paths)
+
+    assert load_customer_state(paths) is not None
+    assert paths.series_file.exists()
+    df, _ = load_enriched(paths)
+    assert (df["dtw_cluster"] == 2).all()
+
+
+def test_csv_fallback_replaces_the_parquet_dataset(paths, monkeypatch):
+    save_enriched(_records(), paths)
+
+    def no_pyarrow(df, root):
+        raise ImportError("pyarrow")
+
+    monkeypatch.setattr(storage, "write_dataset", no_pyarrow)
+    fmt, _ = save_enriched(_records(months=13), paths)
+
+    assert fmt == "csv"
+    assert not paths.enriched_dataset.exists()
+    df, fmt = load_enriched(paths)
+    assert fmt == "csv"
+    assert len(df) == 5 * 13
+
+
+def test_only_the_latest_sweeps_are_kept(paths):
+    labels = pd.DataFrame({"customer_id": ["C00001", "C00002"], "dtw_cluster": [0, 1]})
+    for i in range(6):
+        save_sweep_result(f"v{i}", 2, labels, np.zeros((2, 3, 1)), paths)
+        save_sweep_summary(f"v{i}", [{"k": 2}], DTWSettings(), paths, keep=3)
+        # spread the modification times, oldest first
+        os.utime(paths.sweep_dir / f"v{i}", ns=(i * 10**9, i * 10**9))
+
+    assert sorted(p.name for p in paths.sweep_dir.iterdir() if p.is_dir()) == ["v3", "v4", "v5"]
+    assert load_sweep_result(2, paths)[0].equals(labels)